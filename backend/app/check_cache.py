@@ -0,0 +1,117 @@
+"""簡化版檢測（/api/check）的判定結果緩存"""
+import asyncio
+import time
+from collections import OrderedDict
+from typing import Awaitable, Callable, Dict, Optional, Tuple
+from . import config
+
+# 檢測結果：_check_fields 的輸出（dns_ok/http_ok/latency_ms/status_code）加上 status
+CheckFields = Dict
+# 結果來源
+SOURCE_PROBE = "probe"
+SOURCE_CACHE = "cache"
+SOURCE_STORE = "store"
+
+
+class CheckCache:
+    """
+    按網域緩存檢測結果
+
+    - 結果保存探測完成時間（time.time），讀取時按調用方的 max_age 判斷是否可用，超過 max_entries 時淘汰最久未使用的項
+    - 同一網域的並發檢測共享同一個進行中的探測，單個調用方被取消不影響其他等待者
+    - 探測異常不緩存，由當次所有等待者一同收到
+    """
+
+    def __init__(self, max_entries: int):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[str, Tuple[float, CheckFields]]" = OrderedDict()
+        self._inflight: Dict[str, asyncio.Task] = {}
+        self.hits = 0
+        self.store_hits = 0
+        self.coalesced = 0
+        self.misses = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def lookup(self, domain: str, max_age: float) -> Optional[Tuple[CheckFields, float]]:
+        """返回 (結果, 已過秒數)；不存在或超過 max_age 時返回 None"""
+        entry = self._entries.get(domain)
+        if entry is None:
+            return None
+        age = time.time() - entry[0]
+        if age > max_age:
+            return None
+        self._entries.move_to_end(domain)
+        return entry[1], age
+
+    def put(self, domain: str, fields: CheckFields, probed_at: Optional[float] = None):
+        probed_at = probed_at if probed_at is not None else time.time()
+        old = self._entries.get(domain)
+        if old is not None and old[0] > probed_at:
+            return
+        self._entries[domain] = (probed_at, fields)
+        self._entries.move_to_end(domain)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    async def get(
+        self,
+        domain: str,
+        max_age: float,
+        probe: Callable[[str], Awaitable[CheckFields]],
+        fallback: Optional[Callable[[str, float], Optional[Tuple[CheckFields, float]]]] = None
+    ) -> Tuple[CheckFields, float, str]:
+        """
+        獲取檢測結果：緩存 → fallback（如後台探測結果）→ 進行中的探測 → 新探測
+
+        Returns:
+            (結果, 已過秒數, 來源 probe|cache|store)
+        """
+        if max_age > 0:
+            cached = self.lookup(domain, max_age)
+            if cached is not None:
+                self.hits += 1
+                return cached[0], cached[1], SOURCE_CACHE
+            if fallback is not None:
+                found = fallback(domain, max_age)
+                if found is not None:
+                    self.store_hits += 1
+                    fields, age = found
+                    self.put(domain, fields, time.time() - age)
+                    return fields, age, SOURCE_STORE
+
+        task = self._inflight.get(domain)
+        if task is None:
+            self.misses += 1
+            task = asyncio.ensure_future(self._probe(domain, probe))
+            # 無人等待時（調用方均被取消）也取出異常，避免未處理異常警告
+            task.add_done_callback(lambda t: t.cancelled() or t.exception())
+            self._inflight[domain] = task
+        else:
+            self.coalesced += 1
+        return await asyncio.shield(task), 0.0, SOURCE_PROBE
+
+    async def _probe(self, domain: str, probe: Callable[[str], Awaitable[CheckFields]]) -> CheckFields:
+        try:
+            fields = await probe(domain)
+            self.put(domain, fields)
+            return fields
+        finally:
+            self._inflight.pop(domain, None)
+
+    def stats(self) -> Dict:
+        total = self.hits + self.store_hits + self.coalesced + self.misses
+        return {
+            "entries": len(self._entries),
+            "in_flight": len(self._inflight),
+            "hits": self.hits,
+            "store_hits": self.store_hits,
+            "coalesced": self.coalesced,
+            "misses": self.misses,
+            "hit_rate": round((total - self.misses) / total, 4) if total else 0.0
+        }
+
+
+# 全局檢測結果緩存
+check_cache = CheckCache(config.CHECK_CACHE_MAX_ENTRIES)
@@ -21,10 +21,42 @@ BLOCK_PAGE_IPS = {
     "0.0.0.0",
 }
 
+# 黑名单主机名（CNAME / HTTPS / SVCB 目标命中即判定为已封锁）
+BLOCK_PAGE_HOSTS = set()
+
+# 查询计划：每个解析器并发查询的记录类型（首个类型的超时/错误决定解析器状态）
+DEFAULT_QUERY_PLAN = ["A", "AAAA"]
+
+# 按解析器覆盖查询计划，如 {"168.95.1.1": ["A", "AAAA", "CNAME", "HTTPS"]}
+RESOLVER_QUERY_PLANS = {}
+
 # 超时配置（秒）
 BASELINE_TIMEOUT = 3
 TW_TIMEOUT = 4
 
+# 基准解析器答案缓存（遵循记录 TTL，并限制在 [MIN_TTL, MAX_TTL] 秒内）
+BASELINE_CACHE_MAX_ENTRIES = 200000
+BASELINE_CACHE_MIN_TTL = 60
+BASELINE_CACHE_MAX_TTL = 3600
+
+# 否定答案（NXDOMAIN / 无记录）缓存时间，取 SOA minimum 语义并限制在此范围内
+NEGATIVE_CACHE_MIN_TTL = 30
+NEGATIVE_CACHE_MAX_TTL = 3600
+
+# 失效网域（所有解析器均返回 NXDOMAIN/SERVFAIL）的退避：间隔按倍数增长直到上限（秒）
+DEAD_DOMAIN_BACKOFF_FACTOR = 2
+DEAD_DOMAIN_MAX_INTERVAL = 86400
+
+# DNS 查询引擎："dnspython"（每次查询新建 Resolver）或 "udp"（每个解析器复用 UDP 套接字多路复用）
+DNS_ENGINE = os.environ.get("DNS_ENGINE", "dnspython")
+
+# 上游 DNS 端口
+DNS_PORT = int(os.environ.get("DNS_PORT", 53))
+
+# UDP 引擎：每个解析器的套接字数量，以及超时内的重传次数
+DNS_UDP_SOCKETS_PER_RESOLVER = 2
+DNS_UDP_RETRIES = 1
+
 # 探测间隔（秒）
 PROBE_INTERVAL = 300
 
@@ -34,6 +66,17 @@ ABNORMAL_PROBE_INTERVAL = 300
 # 并发限制
 MAX_CONCURRENCY = 50
 
+# 每个解析器的自适应并发上限（AIMD）：健康时加性增长，逾时率过高时乘性下降
+RESOLVER_CONCURRENCY_INITIAL = 0  # 0 表示按 MAX_CONCURRENCY × 查询计划类型数设置
+RESOLVER_CONCURRENCY_MIN = 2
+RESOLVER_CONCURRENCY_MAX = 200
+AIMD_WINDOW = 50  # 每完成多少次查询评估一次
+AIMD_INCREASE = 2  # 加性增长步长
+AIMD_DECREASE_FACTOR = 0.5  # 乘性下降系数
+AIMD_TIMEOUT_RATE_THRESHOLD = 0.05  # 窗口内逾时率超过此值即下降
+AIMD_LATENCY_HEALTHY_MS = 800  # 窗口平均延迟低于此值才增长
+THROTTLED_RETRY_INTERVAL = 30  # 等待解析器槽位超时（本机限流）的探测不保存结果，在此秒数后重新探测
+
 # HTTP 重定向追踪最大跳转次数
 MAX_REDIRECTS = 10
 
@@ -45,3 +88,89 @@ DOMAINS_FILE = os.environ.get("DOMAINS_FILE", str(BASE_DIR / "Domains.txt"))
 import logging
 LOG_LEVEL = logging.WARNING
 LOG_FILE = "probe_debug.log"
+
+# domains.json 写后延迟持久化（秒）：同一窗口内的修改合并为一次写入
+DOMAINS_WRITE_DELAY = 2.0
+
+# 存储后端："json"（domains.json / domain_groups.json）或 "sqlite"
+# 切换到 sqlite 前先执行 python migrate_to_sqlite.py 迁移现有数据
+STORAGE_BACKEND = os.environ.get("STORAGE_BACKEND", "json")
+SQLITE_PATH = os.environ.get("SQLITE_PATH", str(Path(__file__).resolve().parent.parent / "dnsrpz.db"))
+
+# 探测历史（仅记录状态变化与定期心跳，二进制追加写入）
+HISTORY_DIR = os.environ.get("HISTORY_DIR", str(Path(__file__).resolve().parent.parent))
+HISTORY_HEARTBEAT_INTERVAL = 86400  # 状态未变化时的心跳间隔（秒）
+HISTORY_DOWNSAMPLE_AFTER_DAYS = 30  # 超过此天数的心跳降采样
+HISTORY_DOWNSAMPLE_INTERVAL = 7 * 86400  # 降采样后的心跳间隔（秒）
+HISTORY_RETENTION_DAYS = 400  # 超过此天数的记录删除
+HISTORY_COMPACT_INTERVAL = 86400  # 压缩（降采样）执行间隔（秒）
+
+# 探测结果增量持久化：累积 N 条或经过 T 秒（先到者）即写入 domains.json
+STORE_FLUSH_BATCH = 500
+STORE_FLUSH_INTERVAL = 5.0
+# 未持久化的记录超过此数时探测暂停等待写入（背压）
+STORE_MAX_UNPERSISTED = 5000
+
+# domains.json 外部修改检测间隔（秒），用于感知 import_domains.py 等外部写入
+DOMAINS_STAT_INTERVAL = 1.0
+
+# 调度器与网域列表同步间隔（秒）：新增/删除的网域最迟在此时间后生效
+SCHEDULER_SYNC_INTERVAL = 30
+
+# 重定向追踪共享 HTTP 连接池
+HTTP_MAX_CONNECTIONS = 200  # 最大连接数
+HTTP_MAX_KEEPALIVE = 50  # 最大保持连接数
+HTTP_KEEPALIVE_EXPIRY = 30.0  # 空闲连接保持时间（秒）
+HTTP2_ENABLED = False  # 启用 HTTP/2（需安装 h2：pip install httpx[http2]）
+
+# 列表增量同步：保留最近变更的网域数，?since= 早于此范围时返回全量
+CHANGE_LOG_MAX_ENTRIES = 100000
+
+# SSE 推送（/api/events）
+EVENTS_CLIENT_BUFFER = 5000  # 单个客户端待推送网域上限，超过时通知客户端全量重新同步
+EVENTS_KEEPALIVE_INTERVAL = 15  # 无事件时的心跳间隔（秒）
+
+# 列表分页：仅指定过滤/排序而未指定 limit 时的每页数量
+LIST_PAGE_SIZE = 100
+
+# 跳转链发现网域的自动收录（准入控制）
+AUTO_ENROL_MAX_PER_CYCLE = 200  # 每个探测循环最多收录的网域数
+AUTO_ENROL_MAX_PER_SOURCE = 10  # 单个来源网域每个循环最多贡献的网域数
+AUTO_ENROL_SEEN_MAX = 100000  # 已检查过的网域记忆上限（LRU）
+
+# 跳转追踪单跳缓存（每个探测循环清空）：同一集群的多个网域跳转到同一落地页时只请求一次
+HOP_CACHE_MAX_ENTRIES = 50000
+HOP_CACHE_TTL = PROBE_INTERVAL  # 条目有效期（秒），探测子进程与远端节点不按循环清空，依赖此过期
+HOP_CACHE_ERROR_TTL = 10  # 连接失败、超时等错误结果的有效期（秒）
+
+# 跳转追踪复用：DNS 答案与上次追踪结果均未变化时，沿用不超过此时长（秒）的追踪结果；0 表示每次都追踪
+TRACE_MAX_AGE = 3600
+
+# 多进程探测：>0 时由 N 个子进程按网域哈希分片执行探测，主进程只负责调度与存储（0 表示在 API 进程内探测）
+PROBE_WORKERS = int(os.environ.get("PROBE_WORKERS", "0"))
+PROBE_WORKER_TIMEOUT = 120  # 单个网域在子进程中的探测超时（秒）
+
+# 分布式探测：开启后探测任务由远端探测节点（probe_worker.py）通过 /api/jobs/lease 领取，本进程不再自行探测
+DISTRIBUTED_PROBING = os.environ.get("DISTRIBUTED_PROBING", "0") == "1"
+WORKER_TOKEN = os.environ.get("WORKER_TOKEN", "")  # 节点须在 X-Worker-Token 请求头中携带；分布式模式下必须设置，否则拒绝启动
+JOB_MAX_OUTSTANDING = 2000  # 待领取与已租出任务总数上限（即调度器并发数）
+JOB_LEASE_SECONDS = 120  # 默认租约时长（秒），过期未回传的任务重新分发
+JOB_LEASE_MAX_SECONDS = 900
+JOB_LEASE_MAX_BATCH = 500  # 单次领取任务数上限
+JOB_LEASE_MAX_WAIT = 30  # 长轮询最长等待（秒）
+JOB_LEASE_MAX_ATTEMPTS = 3  # 同一任务最多分发次数，超过后本轮放弃，按正常间隔重新排程
+
+# 批量检测（POST /api/check/batch）
+CHECK_BATCH_MAX_DOMAINS = 10000  # 单次请求网域数上限
+CHECK_BATCH_CONCURRENCY = 50  # 所有批量检测请求共享的并发探测上限
+CHECK_BATCH_DEADLINE = 120  # 默认截止时间（秒），到期未完成的网域返回 deadline 错误
+CHECK_BATCH_MAX_DEADLINE = 600
+
+# 简化版检测结果缓存（/api/check、/api/check/batch）：同一网域在此时长（秒）内的检测结果或后台探测结果直接返回
+CHECK_CACHE_MAX_AGE = 60  # 默认值，调用方可用 max_age 参数覆盖（0 表示强制重新探测）
+CHECK_CACHE_MAX_AGE_LIMIT = 3600  # 调用方 max_age 上限
+CHECK_CACHE_MAX_ENTRIES = 50000
+
+# 探测循环分阶段耗时统计（/api/debug/cycles）
+CYCLE_HISTORY = 50  # 保留最近的循环汇总数
+CYCLE_SAMPLE_MAX = 20000  # 单个循环每个阶段保留的样本数上限（超出后均匀抽样）
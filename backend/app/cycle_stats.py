@@ -0,0 +1,117 @@
+"""探測循環的分階段耗時統計"""
+import random
+from collections import deque
+from datetime import datetime, timezone
+from typing import Deque, Dict, List, Optional
+from . import config
+
+# 統計的階段（對應 timings 中的 <階段>_ms；trace_hop 取自 trace_hops_ms 的每一跳）
+PHASES = ("total", "probe", "dns", "baseline", "tw", "classify", "trace", "trace_hop", "store", "group")
+PERCENTILES = (50, 90, 99)
+
+
+def _percentile(sorted_values: List[float], p: float) -> float:
+    """最近秩（nearest-rank）百分位"""
+    if not sorted_values:
+        return 0.0
+    rank = max(int(-(-p * len(sorted_values) // 100)), 1)
+    return sorted_values[rank - 1]
+
+
+class _Reservoir:
+    """固定容量的均勻抽樣（Algorithm R），限制單個循環的內存佔用"""
+    __slots__ = ("capacity", "values", "seen", "total", "max")
+
+    def __init__(self, capacity: int):
+        self.capacity = capacity
+        self.values: List[float] = []
+        self.seen = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def add(self, value: float):
+        self.seen += 1
+        self.total += value
+        if value > self.max:
+            self.max = value
+        if len(self.values) < self.capacity:
+            self.values.append(value)
+        else:
+            i = random.randrange(self.seen)
+            if i < self.capacity:
+                self.values[i] = value
+
+    def summary(self) -> Dict[str, float]:
+        values = sorted(self.values)
+        result = {"count": self.seen, "mean": round(self.total / self.seen, 2) if self.seen else 0.0}
+        for p in PERCENTILES:
+            result[f"p{p}"] = round(_percentile(values, p), 2)
+        result["max"] = round(self.max, 2)
+        return result
+
+
+class CycleRecorder:
+    """
+    收集每次探測的分階段耗時，探測循環結束時匯總為各階段百分位並保留最近 history 個循環
+
+    每個階段最多保留 sample_max 個樣本（超出後均勻抽樣），計數、均值與最大值仍基於全部樣本
+    """
+
+    def __init__(self, history: int, sample_max: int):
+        self.sample_max = sample_max
+        self._cycles: Deque[Dict] = deque(maxlen=history)
+        self._phases: Dict[str, _Reservoir] = {}
+        self._statuses: Dict[str, int] = {}
+        self._started_at: Optional[str] = None
+        self._cycle = 0
+
+    def start(self, cycle: int):
+        self._cycle = cycle
+        self._started_at = datetime.now(timezone.utc).isoformat()
+        self._phases = {}
+        self._statuses = {}
+
+    def record(self, timings: Dict, status: Optional[str] = None):
+        """記錄一次探測的 timings（{<階段>_ms: 毫秒, trace_hops_ms: [毫秒...]}）"""
+        for phase in PHASES:
+            value = timings.get(f"{phase}_ms")
+            if value is not None:
+                self._sample(phase, value)
+        for value in timings.get("trace_hops_ms") or ():
+            self._sample("trace_hop", value)
+        if status:
+            self._statuses[status] = self._statuses.get(status, 0) + 1
+
+    def _sample(self, phase: str, value: float):
+        reservoir = self._phases.get(phase)
+        if reservoir is None:
+            reservoir = self._phases[phase] = _Reservoir(self.sample_max)
+        reservoir.add(value)
+
+    def _summary(self) -> Dict:
+        return {
+            "cycle": self._cycle,
+            "started_at": self._started_at,
+            "probes": self._phases["total"].seen if "total" in self._phases else 0,
+            "statuses": dict(self._statuses),
+            "phases_ms": {p: self._phases[p].summary() for p in PHASES if p in self._phases}
+        }
+
+    def finish(self, duration_sec: float, **extra) -> Dict:
+        """結束當前循環並保存匯總，extra 為附加的循環級統計"""
+        summary = {**self._summary(), "duration_sec": round(duration_sec, 3), **extra}
+        self._cycles.append(summary)
+        return summary
+
+    def current(self) -> Dict:
+        """進行中循環的匯總（截至目前）"""
+        return self._summary()
+
+    def recent(self, limit: Optional[int] = None) -> List[Dict]:
+        """最近的循環匯總（新的在前）"""
+        cycles = list(reversed(self._cycles))
+        return cycles[:limit] if limit else cycles
+
+
+# 全局循環統計
+cycle_recorder = CycleRecorder(config.CYCLE_HISTORY, config.CYCLE_SAMPLE_MAX)
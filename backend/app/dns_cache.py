@@ -0,0 +1,120 @@
+"""DNS 答案緩存（遵循 TTL 的 LRU）"""
+import time
+from collections import OrderedDict
+from typing import Dict, Optional, Tuple
+import dns.message
+import dns.rdatatype
+from . import config
+
+# (網域, 記錄類型, 解析器 IP)
+CacheKey = Tuple[str, str, str]
+
+
+# 可作為否定答案緩存的狀態
+NEGATIVE_STATUSES = ("nxdomain", "noanswer")
+
+
+def negative_ttl(response: Optional[dns.message.Message]) -> int:
+    """
+    否定答案的緩存時間（RFC 2308）：權威段 SOA 的 TTL 與 minimum 欄位取較小值
+    無 SOA 時返回 0（不緩存）
+    """
+    if response is None:
+        return 0
+    for rrset in response.authority:
+        if rrset.rdtype == dns.rdatatype.SOA and len(rrset):
+            return min(rrset.ttl, rrset[0].minimum)
+    return 0
+
+
+class DnsAnswerCache:
+    """
+    按 (網域, 記錄類型, 解析器) 緩存單類型查詢結果
+
+    - 成功答案有效期取記錄 TTL，並限制在 [min_ttl, max_ttl] 內
+    - NXDOMAIN / 無記錄按 SOA minimum 緩存，並限制在 [negative_min_ttl, negative_max_ttl] 內
+    - 超過 max_entries 時淘汰最久未使用的項
+    """
+
+    def __init__(
+        self,
+        max_entries: int,
+        min_ttl: float,
+        max_ttl: float,
+        negative_min_ttl: float = 0,
+        negative_max_ttl: float = 0
+    ):
+        self.max_entries = max_entries
+        self.min_ttl = min_ttl
+        self.max_ttl = max_ttl
+        self.negative_min_ttl = negative_min_ttl
+        self.negative_max_ttl = negative_max_ttl
+        # key -> (過期時間, 結果)
+        self._entries: "OrderedDict[CacheKey, Tuple[float, Dict]]" = OrderedDict()
+        self.hits = 0
+        self.negative_hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, key: CacheKey) -> Optional[Dict]:
+        """獲取未過期的結果，未命中返回 None"""
+        entry = self._entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+        expires_at, result = entry
+        if expires_at <= time.monotonic():
+            del self._entries[key]
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        if result.get("status") in NEGATIVE_STATUSES:
+            self.negative_hits += 1
+        return result
+
+    def put(self, key: CacheKey, result: Dict):
+        """緩存結果（成功答案與帶 SOA 的否定答案；逾時/SERVFAIL 不緩存）"""
+        status = result.get("status")
+        ttl = result.get("ttl", 0)
+        if status == "ok":
+            ttl = min(max(ttl, self.min_ttl), self.max_ttl)
+        elif status in NEGATIVE_STATUSES and ttl > 0:
+            ttl = min(max(ttl, self.negative_min_ttl), self.negative_max_ttl)
+        else:
+            return
+        if ttl <= 0:
+            return
+        self._entries[key] = (time.monotonic() + ttl, result)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def clear(self):
+        self._entries.clear()
+
+    def stats(self) -> Dict:
+        """命中/未命中統計"""
+        total = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "hits": self.hits,
+            "negative_hits": self.negative_hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_rate": round(self.hits / total, 4) if total else 0.0
+        }
+
+
+# 基準解析器答案緩存
+baseline_cache = DnsAnswerCache(
+    config.BASELINE_CACHE_MAX_ENTRIES,
+    config.BASELINE_CACHE_MIN_TTL,
+    config.BASELINE_CACHE_MAX_TTL,
+    config.NEGATIVE_CACHE_MIN_TTL,
+    config.NEGATIVE_CACHE_MAX_TTL
+)
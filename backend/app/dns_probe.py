@@ -1,57 +1,185 @@
 """DNS 查询模块"""
 import asyncio
+import hashlib
 import logging
 import time
-from typing import Dict
+from typing import Dict, List, Optional
 import dns.resolver
 import dns.asyncresolver
 from . import config
-from .redirect_trace import trace_redirects
+from . import dns_udp
+from .dns_cache import DnsAnswerCache, baseline_cache, negative_ttl
+from .limiter import get_limiter
+from . import metrics
+from .redirect_trace import TargetState, trace_redirects
 
 logger = logging.getLogger(__name__)
 
 
-async def query_resolver(domain: str, server_ip: str, timeout: float) -> Dict:
-    """向指定 DNS 服务器查询 A/AAAA 记录"""
-    resolver = dns.asyncresolver.Resolver()
-    resolver.nameservers = [server_ip]
-    resolver.lifetime = timeout
-    resolver.timeout = timeout
-    
-    ips = []
-    
-    # 查询 A 记录
+async def _resolve_dnspython(resolver: dns.asyncresolver.Resolver, domain: str, rtype: str) -> Dict:
+    """使用 dnspython 查询单个记录类型，返回与 UDP 引擎相同格式的结果"""
     try:
-        answers = await resolver.resolve(domain, "A")
-        ips.extend(r.to_text() for r in answers)
-    except dns.resolver.NXDOMAIN:
-        return {"status": "nxdomain", "ips": []}
+        answers = await resolver.resolve(domain, rtype)
+        return {"status": "ok", "records": [r.to_text() for r in answers], "ttl": answers.rrset.ttl}
+    except dns.resolver.NXDOMAIN as e:
+        responses = list(e.responses().values())
+        return {"status": "nxdomain", "records": [], "ttl": negative_ttl(responses[0] if responses else None)}
     except dns.resolver.Timeout:
-        return {"status": "timeout", "ips": []}
-    except dns.resolver.NoAnswer:
-        pass
+        return {"status": "timeout", "records": [], "ttl": 0}
+    except dns.resolver.NoAnswer as e:
+        return {"status": "noanswer", "records": [], "ttl": negative_ttl(e.response())}
     except Exception as e:
-        return {"status": "error", "ips": [], "msg": str(e)}
+        return {"status": "error", "records": [], "ttl": 0, "msg": str(e)}
+
+
+def get_query_plan(server_ip: str) -> List[str]:
+    """获取解析器的查询计划（记录类型列表）"""
+    return config.RESOLVER_QUERY_PLANS.get(server_ip) or config.DEFAULT_QUERY_PLAN
+
+
+async def query_resolver(
+    domain: str,
+    server_ip: str,
+    timeout: float,
+    plan: Optional[List[str]] = None,
+    cache: Optional[DnsAnswerCache] = None
+) -> Dict:
+    """
+    向指定 DNS 服务器并发查询查询计划中的所有记录类型（引擎由 config.DNS_ENGINE 选择）
+    
+    - 任一类型返回 NXDOMAIN 即取消其余查询
+    - 首个类型（通常为 A）的超时/错误/本机限流（throttled）决定解析器状态，其余类型失败忽略
+    - ips 为 A/AAAA 记录，answers 保存各类型的原始答案
+    - 传入 cache 时优先使用未过期的缓存答案
+    """
+    plan = plan or get_query_plan(server_ip)
     
-    # 查询 AAAA 记录
+    if config.DNS_ENGINE == "udp":
+        async def resolve(rtype: str) -> Dict:
+            return await dns_udp.resolve(domain, server_ip, rtype, timeout)
+    else:
+        resolver = dns.asyncresolver.Resolver()
+        resolver.nameservers = [server_ip]
+        resolver.port = config.DNS_PORT
+        resolver.lifetime = timeout
+        resolver.timeout = timeout
+        
+        async def resolve(rtype: str) -> Dict:
+            return await _resolve_dnspython(resolver, domain, rtype)
+    
+    limiter = get_limiter(server_ip)
+    
+    async def resolve_limited(rtype: str) -> Dict:
+        # 按解析器自適應並發，逾時反饋給 AIMD；等待槽位最多 timeout 秒，
+        # 超時為本機限流（throttled），與解析器逾時區分，不計入判定
+        async with limiter.slot(timeout) as outcome:
+            if not outcome["acquired"]:
+                metrics.RESOLVER_QUERIES.inc(server_ip, "slot_timeout")
+                return {"status": "throttled", "records": [], "ttl": 0}
+            started = time.perf_counter()
+            res = await resolve(rtype)
+            metrics.RESOLVER_QUERY_SECONDS.observe(time.perf_counter() - started, server_ip)
+            metrics.RESOLVER_QUERIES.inc(server_ip, res["status"])
+            outcome["timed_out"] = res["status"] == "timeout"
+            return res
+    
+    cached_types = set()
+    
+    async def resolve_cached(rtype: str) -> Dict:
+        if cache is None:
+            return await resolve_limited(rtype)
+        key = (domain, rtype, server_ip)
+        res = cache.get(key)
+        if res is not None:
+            cached_types.add(rtype)
+            return res
+        res = await resolve_limited(rtype)
+        cache.put(key, res)
+        return res
+    
+    tasks = {asyncio.ensure_future(resolve_cached(rtype)): rtype for rtype in plan}
+    answers: Dict[str, Dict] = {}
     try:
-        answers = await resolver.resolve(domain, "AAAA")
-        ips.extend(r.to_text() for r in answers)
-    except (dns.resolver.NXDOMAIN, dns.resolver.NoAnswer, dns.resolver.Timeout):
-        pass
-    except Exception:
-        pass
+        pending = set(tasks)
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                res = task.result()
+                if res["status"] == "nxdomain":
+                    return {"status": "nxdomain", "ips": []}
+                answers[tasks[task]] = res
+    finally:
+        for task in tasks:
+            task.cancel()
+    
+    primary = answers[plan[0]]
+    if primary["status"] in ("timeout", "error", "throttled"):
+        result = {"status": primary["status"], "ips": []}
+        if primary["status"] == "error":
+            result["msg"] = primary.get("msg", "")
+        return result
+    
+    ips = []
+    for rtype in ("A", "AAAA"):
+        if rtype in answers and answers[rtype]["status"] == "ok":
+            ips.extend(answers[rtype]["records"])
     
-    return {"status": "ok", "ips": sorted(set(ips))}
+    return {
+        "status": "ok",
+        "ips": sorted(set(ips)),
+        "answers": {rtype: sorted(res["records"]) for rtype, res in answers.items() if res["status"] == "ok"},
+        "cached": len(cached_types) == len(plan)
+    }
+
+
+def _elapsed_ms(start: float) -> float:
+    return round((time.perf_counter() - start) * 1000, 2)
+
 
+def is_dead_result(probe_result: Dict) -> bool:
+    """所有解析器均返回 NXDOMAIN / SERVFAIL 等錯誤（不含逾時）時視為失效網域"""
+    results = probe_result.get("baseline", []) + probe_result.get("tw", [])
+    return bool(results) and all(r.get("status") in ("nxdomain", "error") for r in results)
 
-async def probe_domain(domain: str, with_redirect_trace: bool = True) -> Dict:
+
+def trace_fingerprint(baseline_ips: set, tw_classified: List[Dict], previous_trace_status: Optional[str]) -> str:
+    """跳转追踪输入指纹：基准 IP 集合、各台湾解析器的分类与 IP、上次追踪结果"""
+    tw = sorted((r.get("resolver", ""), r.get("category", ""), tuple(sorted(r.get("ips", [])))) for r in tw_classified)
+    raw = repr((sorted(baseline_ips), tw, previous_trace_status))
+    return hashlib.blake2b(raw.encode(), digest_size=8).hexdigest()
+
+
+def reusable_trace(previous: Optional[Dict], fingerprint: str) -> Optional[Dict]:
+    """
+    上次的追踪结果在以下条件下可直接复用：
+    - 指纹一致（DNS 答案未变，且上次追踪结果与其前一次相同）
+    - 追踪时间未超过 TRACE_MAX_AGE
+    """
+    if config.TRACE_MAX_AGE <= 0:
+        return None
+    if not previous or previous.get("fingerprint") != fingerprint:
+        return None
+    if time.time() - previous.get("traced_at", 0) > config.TRACE_MAX_AGE:
+        return None
+    return {**previous, "reused": True}
+
+
+async def probe_domain(
+    domain: str,
+    with_redirect_trace: bool = True,
+    force_trace: bool = False,
+    previous_trace: Optional[Dict] = None,
+    targets: Optional[Dict[str, TargetState]] = None
+) -> Dict:
     """
     探测单个域名
     
     Args:
         domain: 要探测的域名
         with_redirect_trace: 是否执行重定向追踪（默认 True）
+        force_trace: 忽略可复用的上次追踪结果与单跳缓存，强制重新追踪
+        previous_trace: 上次的追踪结果（由主进程从 store 取出传入；未提供时不复用）
+        targets: 可能的跳转目标的监控状态（由主进程从网域列表取出传入，见 trace_redirects）
     """
     start_time = time.perf_counter()
     tasks = []
@@ -64,23 +192,36 @@ async def probe_domain(domain: str, with_redirect_trace: bool = True) -> Dict:
     
     logger.debug(f"[probe] 開始探測 {domain}，共 {len(tasks)} 個 DNS 服務器")
     
+    # 各階段耗時（毫秒）：基準組與台灣組並發查詢，各自以最後一個解析器應答的時間計
+    timings: Dict = {}
+    
+    async def timed_query(type_: str, ip: str, timeout: float) -> Dict:
+        try:
+            return await query_resolver(domain, ip, timeout, cache=baseline_cache if type_ == "baseline" else None)
+        finally:
+            elapsed = _elapsed_ms(start_time)
+            timings[f"{type_}_ms"] = max(timings.get(f"{type_}_ms", 0.0), elapsed)
+    
     try:
         results = await asyncio.wait_for(
             asyncio.gather(
-                *[query_resolver(domain, ip, timeout) for _, ip, _, timeout in tasks],
+                *[timed_query(type_, ip, timeout) for type_, ip, _, timeout in tasks],
                 return_exceptions=True
             ),
             timeout=30  # 總超時 30 秒
         )
     except asyncio.TimeoutError:
         logger.error(f"[probe] 探測 {domain} 總超時(30秒)")
+        metrics.PROBE_SECONDS.observe(time.perf_counter() - start_time)
         return {
             "domain": domain,
             "baseline": [],
             "tw": [],
             "redirect_trace": None,
-            "latency_ms": 30000
+            "latency_ms": 30000,
+            "timings": {**timings, "dns_ms": 30000.0, "probe_ms": 30000.0}
         }
+    timings["dns_ms"] = _elapsed_ms(start_time)
     
     baseline_results = []
     tw_results = []
@@ -105,7 +246,12 @@ async def probe_domain(domain: str, with_redirect_trace: bool = True) -> Dict:
         if r.get("status") == "ok":
             baseline_ips.update(r.get("ips", []))
     
-    if with_redirect_trace:
+    # 失效網域無需追蹤（HTTP 請求必然解析失敗）
+    is_dead = is_dead_result({"baseline": baseline_results, "tw": tw_results})
+    if is_dead:
+        logger.debug(f"[probe] {domain} 所有解析器均無答案，跳過重定向追蹤")
+    
+    if with_redirect_trace and not is_dead:
         # 先對 tw_results 進行分類，以便傳給 trace_redirects
         from .verdict import classify_tw_result
         
@@ -114,19 +260,33 @@ async def probe_domain(domain: str, with_redirect_trace: bool = True) -> Dict:
             category = classify_tw_result(r, baseline_ips)
             tw_classified.append({**r, "category": category})
         
-        try:
-            redirect_result = await asyncio.wait_for(
-                trace_redirects(domain, current_tw_results=tw_classified),
-                timeout=30  # 重定向追蹤超時
-            )
-        except asyncio.TimeoutError:
-            logger.warning(f"[probe] {domain} 重定向追蹤超時(30秒)")
-            redirect_result = {"success": False, "error": "重定向追蹤超時", "chain": []}
-        except Exception as e:
-            logger.error(f"[probe] {domain} 重定向追蹤異常: {e}")
-            redirect_result = {"success": False, "error": str(e), "chain": []}
-    
-    latency_ms = int((time.perf_counter() - start_time) * 1000)
+        previous = previous_trace or {}
+        fingerprint = trace_fingerprint(baseline_ips, tw_classified, previous.get("trace_status"))
+        redirect_result = None if force_trace else reusable_trace(previous, fingerprint)
+        if redirect_result is not None:
+            logger.debug(f"[probe] {domain} DNS 答案與追蹤結果未變，沿用上次追蹤")
+        else:
+            trace_start = time.perf_counter()
+            try:
+                redirect_result = await asyncio.wait_for(
+                    trace_redirects(domain, current_tw_results=tw_classified, refresh=force_trace, targets=targets),
+                    timeout=30  # 重定向追蹤超時
+                )
+            except asyncio.TimeoutError:
+                logger.warning(f"[probe] {domain} 重定向追蹤超時(30秒)")
+                redirect_result = {"success": False, "error": "重定向追蹤超時", "chain": []}
+            except Exception as e:
+                logger.error(f"[probe] {domain} 重定向追蹤異常: {e}")
+                redirect_result = {"success": False, "error": str(e), "chain": []}
+            redirect_result.update(fingerprint=fingerprint, traced_at=time.time(), reused=False)
+            timings["trace_ms"] = _elapsed_ms(trace_start)
+            # 單跳耗時只記入本次探測的耗時，不隨追蹤結果保存
+            timings["trace_hops_ms"] = redirect_result.pop("hop_ms", [])
+    
+    elapsed = time.perf_counter() - start_time
+    metrics.PROBE_SECONDS.observe(elapsed)
+    latency_ms = int(elapsed * 1000)
+    timings["probe_ms"] = round(elapsed * 1000, 2)
     logger.debug(f"[probe] 探測 {domain} 完成，耗時 {latency_ms}ms")
     
     return {
@@ -135,7 +295,8 @@ async def probe_domain(domain: str, with_redirect_trace: bool = True) -> Dict:
         "baseline_ips": sorted(baseline_ips),  # 預計算的基準 IP
         "tw": tw_results,
         "redirect_trace": redirect_result,
-        "latency_ms": latency_ms
+        "latency_ms": latency_ms,
+        "timings": timings
     }
 
 
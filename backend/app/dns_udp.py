@@ -0,0 +1,194 @@
+"""多路復用 UDP DNS 查詢引擎"""
+import asyncio
+import itertools
+import logging
+from typing import Dict, List, Optional, Tuple
+import dns.asyncquery
+import dns.entropy
+import dns.exception
+import dns.flags
+import dns.message
+import dns.rcode
+import dns.rdatatype
+from . import config
+from .dns_cache import negative_ttl
+
+logger = logging.getLogger(__name__)
+
+
+class _ResolverSocket(asyncio.DatagramProtocol):
+    """
+    連接到單個上游解析器的 UDP 套接字
+
+    所有查詢共用同一個套接字，按事務 ID 分派響應，並校驗問題段與請求一致
+    """
+
+    def __init__(self, server: Tuple[str, int]):
+        self._server = server
+        self._transport: Optional[asyncio.DatagramTransport] = None
+        self._opening: Optional[asyncio.Future] = None
+        # 事務 ID -> (請求報文, 等待響應的 Future)
+        self._pending: Dict[int, Tuple[dns.message.Message, asyncio.Future]] = {}
+
+    async def _ensure_open(self):
+        if self._transport is not None:
+            return
+        if self._opening is None:
+            loop = asyncio.get_running_loop()
+            self._opening = asyncio.ensure_future(
+                loop.create_datagram_endpoint(lambda: self, remote_addr=self._server)
+            )
+        try:
+            await asyncio.shield(self._opening)
+        finally:
+            if self._opening is not None and self._opening.done():
+                self._opening = None
+
+    def _allocate_id(self) -> int:
+        while True:
+            qid = dns.entropy.random_16()
+            if qid not in self._pending:
+                return qid
+
+    # ---------- DatagramProtocol ----------
+
+    def connection_made(self, transport):
+        self._transport = transport
+
+    def datagram_received(self, data: bytes, addr):
+        try:
+            response = dns.message.from_wire(data, ignore_trailing=True)
+        except Exception as e:
+            logger.debug(f"[dns_udp] {self._server[0]} 響應解析失敗: {e}")
+            return
+        entry = self._pending.get(response.id)
+        if entry is None:
+            # 已超時或重複的響應
+            return
+        request, future = entry
+        if not request.is_response(response):
+            # 事務 ID 相同但問題段不符，丟棄
+            logger.debug(f"[dns_udp] {self._server[0]} 響應與請求不符，已丟棄 id={response.id}")
+            return
+        if not future.done():
+            future.set_result(response)
+
+    def error_received(self, exc):
+        # 已連接 UDP 套接字的 ICMP 錯誤無法對應到單個查詢，讓所有等待中的查詢失敗
+        for _, future in self._pending.values():
+            if not future.done():
+                future.set_exception(exc)
+
+    def connection_lost(self, exc):
+        self._transport = None
+        for _, future in self._pending.values():
+            if not future.done():
+                future.set_exception(exc or ConnectionError("套接字已關閉"))
+
+    # ---------- 查詢 ----------
+
+    async def query(self, request: dns.message.Message, timeout: float, retries: int) -> dns.message.Message:
+        """發送查詢並等待響應，在 timeout 內等間隔重傳 retries 次（沿用同一事務 ID）"""
+        await self._ensure_open()
+        request.id = self._allocate_id()
+        wire = request.to_wire()
+        future = asyncio.get_running_loop().create_future()
+        self._pending[request.id] = (request, future)
+        try:
+            attempt_timeout = timeout / (retries + 1)
+            for attempt in range(retries + 1):
+                if self._transport is None:
+                    raise ConnectionError("套接字已關閉")
+                self._transport.sendto(wire)
+                try:
+                    return await asyncio.wait_for(asyncio.shield(future), attempt_timeout)
+                except asyncio.TimeoutError:
+                    continue
+            raise dns.exception.Timeout(timeout=timeout)
+        finally:
+            del self._pending[request.id]
+            if not future.done():
+                future.cancel()
+
+    def close(self):
+        if self._transport is not None:
+            self._transport.close()
+            self._transport = None
+
+
+class UdpResolverClient:
+    """單個上游解析器的套接字池（輪詢使用）"""
+
+    def __init__(self, server_ip: str, port: int, sockets: int):
+        self.server_ip = server_ip
+        self.port = port
+        self._sockets = [_ResolverSocket((server_ip, port)) for _ in range(max(sockets, 1))]
+        self._next = itertools.cycle(self._sockets)
+
+    async def resolve(self, domain: str, rtype: str, timeout: float) -> Dict:
+        """
+        查詢單個記錄類型
+
+        Returns:
+            {"status": ok|noanswer|nxdomain|timeout|error, "records": [...], "ttl": int, "msg"?: str}
+        """
+        request = dns.message.make_query(domain, rtype, use_edns=0, payload=1232)
+        try:
+            response = await next(self._next).query(request, timeout, config.DNS_UDP_RETRIES)
+            if response.flags & dns.flags.TC:
+                # 截斷響應改走 TCP
+                response = await dns.asyncquery.tcp(request, self.server_ip, timeout=timeout, port=self.port)
+        except dns.exception.Timeout:
+            return {"status": "timeout", "records": [], "ttl": 0}
+        except Exception as e:
+            return {"status": "error", "records": [], "ttl": 0, "msg": str(e) or type(e).__name__}
+        return parse_response(response, rtype)
+
+    def close(self):
+        for sock in self._sockets:
+            sock.close()
+
+
+def parse_response(response: dns.message.Message, rtype: str) -> Dict:
+    """將 DNS 響應轉換為引擎無關的單類型結果"""
+    rcode = response.rcode()
+    if rcode == dns.rcode.NXDOMAIN:
+        return {"status": "nxdomain", "records": [], "ttl": negative_ttl(response)}
+    if rcode != dns.rcode.NOERROR:
+        return {"status": "error", "records": [], "ttl": 0, "msg": dns.rcode.to_text(rcode)}
+
+    wanted = dns.rdatatype.from_text(rtype)
+    records: List[str] = []
+    ttls: List[int] = []
+    for rrset in response.answer:
+        if rrset.rdtype == wanted:
+            records.extend(r.to_text() for r in rrset)
+        # CNAME 鏈上的最小 TTL 決定整個答案的有效期
+        ttls.append(rrset.ttl)
+    if not records:
+        return {"status": "noanswer", "records": [], "ttl": negative_ttl(response)}
+    return {"status": "ok", "records": records, "ttl": min(ttls)}
+
+
+# 解析器 IP -> 客戶端
+_clients: Dict[str, UdpResolverClient] = {}
+
+
+def get_client(server_ip: str) -> UdpResolverClient:
+    client = _clients.get(server_ip)
+    if client is None:
+        client = UdpResolverClient(server_ip, config.DNS_PORT, config.DNS_UDP_SOCKETS_PER_RESOLVER)
+        _clients[server_ip] = client
+    return client
+
+
+async def resolve(domain: str, server_ip: str, rtype: str, timeout: float) -> Dict:
+    """透過共享套接字向指定解析器查詢"""
+    return await get_client(server_ip).resolve(domain, rtype, timeout)
+
+
+def close_all():
+    """關閉所有套接字（應用關閉時調用）"""
+    for client in _clients.values():
+        client.close()
+    _clients.clear()
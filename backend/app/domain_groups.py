@@ -1,39 +1,202 @@
 """域名組管理 - 存儲跳轉鏈上互相關聯的域名"""
+import atexit
 import json
+import logging
+import os
+import threading
 from pathlib import Path
-from typing import Dict, Set, List, Optional
+from typing import Dict, Set, List
 from filelock import FileLock
+from . import config
 from .domains import extract_root_domain
 
+logger = logging.getLogger(__name__)
+
 # 域名組 JSON 文件路徑
 DOMAIN_GROUPS_FILE = Path(__file__).parent.parent / "domain_groups.json"
 DOMAIN_GROUPS_LOCK = Path(__file__).parent.parent / "domain_groups.json.lock"
 
 
-def _read_groups() -> Dict[str, Set[str]]:
-    """讀取域名組數據"""
-    if not DOMAIN_GROUPS_FILE.exists():
-        return {}
-    try:
-        with open(DOMAIN_GROUPS_FILE, "r", encoding="utf-8") as f:
-            data = json.load(f)
-            # 將列表轉換為集合
-            return {k: set(v) for k, v in data.items()}
-    except Exception:
-        return {}
+def _sqlite_groups():
+    """SQLite 後端的網域組存儲，使用 JSON 後端時返回 None"""
+    if config.STORAGE_BACKEND != "sqlite":
+        return None
+    from .sqlite_store import SqliteGroupBackend, get_database
+    return SqliteGroupBackend(get_database(config.SQLITE_PATH))
 
 
-def _write_groups(groups: Dict[str, Set[str]]):
-    """寫入域名組數據（帶文件鎖）"""
-    lock = FileLock(str(DOMAIN_GROUPS_LOCK), timeout=5)
+def read_groups_file(path: Path) -> List[Set[str]]:
+    """
+    讀取 domain_groups.json，兼容兩種格式：
+    - 現行格式：{"format": 2, "groups": [[成員...], ...]}（每組保存一次）
+    - 舊格式：{網域: [相關網域...]}（每個成員保存整組）
+    """
+    if not path.exists():
+        return []
     try:
-        with lock:
-            # 將集合轉換為列表以便 JSON 序列化
-            data = {k: sorted(v) for k, v in groups.items()}
-            with open(DOMAIN_GROUPS_FILE, "w", encoding="utf-8") as f:
-                json.dump(data, f, ensure_ascii=False, indent=2)
+        with open(path, "r", encoding="utf-8") as f:
+            data = json.load(f)
     except Exception as e:
-        print(f"寫入域名組失敗: {e}")
+        logger.warning(f"[groups] 讀取 {path.name} 失敗: {e}")
+        return []
+    if data.get("format") == 2:
+        return [set(members) for members in data.get("groups", [])]
+    # 舊格式中同一組重複出現在每個成員下，合併為互不相交的組
+    owner: Dict[str, Set[str]] = {}
+    for domain, related in data.items():
+        group = {domain, *related}
+        for other in {id(owner[d]): owner[d] for d in group if d in owner}.values():
+            group |= other
+        for d in group:
+            owner[d] = group
+    return list({id(g): g for g in owner.values()}.values())
+
+
+class DomainGroupIndex:
+    """
+    網域組的並查集（disjoint-set）索引
+
+    - parent：成員 -> 父節點（根指向自己），查找時路徑壓縮；按組大小合併，小組的根掛到大組的根下
+    - members：根 -> 組成員，列出相關網域無需遍歷
+    - 合併只改動內存，flush 時持久化有變化的部分：
+      JSON 後端每組保存一次，無變化時不寫文件；
+      SQLite 後端每個成員一行 (成員, 父節點)，合併只需寫入新成員與被吸收組的根
+    """
+
+    def __init__(self, path: Path, lock_path: Path):
+        self._path = path
+        self._lock_path = lock_path
+        self._lock = threading.RLock()
+        self._flush_lock = threading.Lock()
+        self._loaded = False
+        self._parent: Dict[str, str] = {}
+        self._members: Dict[str, Set[str]] = {}
+        # 父節點需寫入的成員（SQLite 後端）；非空即表示有待持久化的變更
+        self._dirty: Set[str] = set()
+        self.merges = 0
+
+    # ---------- 載入 ----------
+
+    def _ensure_loaded(self):
+        """首次使用時載入（需持有 _lock）"""
+        if self._loaded:
+            return
+        self._loaded = True
+        backend = _sqlite_groups()
+        if backend is None:
+            for members in read_groups_file(self._path):
+                self._union_all(members)
+            self._dirty.clear()
+            return
+        parents = backend.read_parents()
+        if parents:
+            for domain, parent in parents.items():
+                self._parent[domain] = parent
+                self._parent.setdefault(parent, parent)
+            for domain in self._parent:
+                self._members.setdefault(self._find(domain), set()).add(domain)
+            return
+        # 舊版數據庫：從 domain_groups 表轉換，首次 flush 時寫入新表
+        for domain, related in backend.read_legacy().items():
+            self._union_all({domain, *related})
+
+    # ---------- 並查集 ----------
+
+    def _find(self, domain: str) -> str:
+        root = domain
+        while self._parent[root] != root:
+            root = self._parent[root]
+        # 路徑壓縮
+        while self._parent[domain] != root:
+            self._parent[domain], domain = root, self._parent[domain]
+        return root
+
+    def _add(self, domain: str):
+        self._parent[domain] = domain
+        self._members[domain] = {domain}
+        self._dirty.add(domain)
+
+    def _union(self, a: str, b: str) -> bool:
+        root_a, root_b = self._find(a), self._find(b)
+        if root_a == root_b:
+            return False
+        if len(self._members[root_a]) < len(self._members[root_b]):
+            root_a, root_b = root_b, root_a
+        self._parent[root_b] = root_a
+        self._members[root_a] |= self._members.pop(root_b)
+        self._dirty.add(root_b)
+        return True
+
+    def _union_all(self, domains: Set[str]) -> bool:
+        changed = False
+        first = None
+        for domain in domains:
+            if domain not in self._parent:
+                self._add(domain)
+                changed = True
+            if first is None:
+                first = domain
+            elif self._union(first, domain):
+                changed = True
+        return changed
+
+    # ---------- 公開接口 ----------
+
+    def merge(self, domains: Set[str]) -> bool:
+        """將網域歸入同一組，返回是否有變化"""
+        with self._lock:
+            self._ensure_loaded()
+            changed = self._union_all(domains)
+            if changed:
+                self.merges += 1
+            return changed
+
+    def related(self, domain: str) -> Set[str]:
+        """同組的其他網域"""
+        with self._lock:
+            self._ensure_loaded()
+            if domain not in self._parent:
+                return set()
+            return self._members[self._find(domain)] - {domain}
+
+    def dirty_count(self) -> int:
+        with self._lock:
+            return len(self._dirty)
+
+    def flush(self) -> bool:
+        """持久化有變化的部分，返回是否實際寫入（寫入在鎖外進行，不阻塞合併）"""
+        with self._flush_lock:
+            with self._lock:
+                if not self._dirty:
+                    return False
+                dirty, self._dirty = self._dirty, set()
+                backend = _sqlite_groups()
+                if backend is not None:
+                    payload = {d: self._parent[d] for d in dirty}
+                else:
+                    payload = {"format": 2, "groups": sorted(sorted(m) for m in self._members.values() if len(m) > 1)}
+            try:
+                if backend is not None:
+                    backend.write_parents(payload)
+                else:
+                    lock = FileLock(str(self._lock_path), timeout=5)
+                    with lock:
+                        tmp_path = self._path.with_name(self._path.name + ".tmp")
+                        with open(tmp_path, "w", encoding="utf-8") as f:
+                            json.dump(payload, f, ensure_ascii=False, indent=2)
+                        os.replace(tmp_path, self._path)
+            except Exception:
+                with self._lock:
+                    # 寫入失敗時恢復待寫入標記
+                    self._dirty |= dirty
+                raise
+        logger.debug(f"[groups] 已寫入網域組（變更 {len(dirty)}）")
+        return True
+
+
+# 全局網域組索引
+group_index = DomainGroupIndex(DOMAIN_GROUPS_FILE, DOMAIN_GROUPS_LOCK)
+atexit.register(group_index.flush)
 
 
 def update_domain_group(domains_in_chain: List[str]):
@@ -56,31 +219,8 @@ def update_domain_group(domains_in_chain: List[str]):
     if len(normalized) < 2:
         return
     
-    groups = _read_groups()
-    
-    # 找出這些域名已有的所有組成員
-    merged_set = set(normalized)
-    for domain in normalized:
-        if domain in groups:
-            merged_set.update(groups[domain])
-    
-    # 擴展：檢查 merged_set 中每個域名是否有更多關聯
-    expanded = True
-    while expanded:
-        expanded = False
-        for domain in list(merged_set):
-            if domain in groups:
-                before = len(merged_set)
-                merged_set.update(groups[domain])
-                if len(merged_set) > before:
-                    expanded = True
-    
-    # 更新所有相關域名的組
-    for domain in merged_set:
-        # 每個域名的相關域名 = 組內除自己以外的所有域名
-        groups[domain] = merged_set - {domain}
-    
-    _write_groups(groups)
+    # 只更新內存索引，由背景寫入任務持久化
+    group_index.merge(normalized)
 
 
 def get_related_domains(domain: str) -> List[str]:
@@ -96,10 +236,7 @@ def get_related_domains(domain: str) -> List[str]:
     root = extract_root_domain(domain)
     if not root:
         return []
-    
-    groups = _read_groups()
-    related = groups.get(root, set())
-    return sorted(related)
+    return sorted(group_index.related(root))
 
 
 def extract_domains_from_trace(current_domain: str, redirect_trace: Dict) -> List[str]:
@@ -0,0 +1,398 @@
+"""網域列表的內存二級索引（分頁、過濾、排序、搜尋）"""
+import base64
+import json
+import threading
+from bisect import bisect_left, bisect_right, insort
+from collections import OrderedDict
+from datetime import datetime
+from typing import Any, Callable, Dict, Iterable, List, Optional, Set, Tuple
+
+# 可排序欄位
+SORT_FIELDS = ("domain", "created_at", "last_probe_at")
+# 可過濾欄位（值 -> 網域集合）
+FACET_FIELDS = ("status", "reported", "trace_status")
+
+# 最小候選來源不超過總數的 1/N 時直接排序候選，否則沿排序索引遍歷並逐一校驗
+_SMALL_CANDIDATE_RATIO = 8
+# 需逐一計數的查詢（含搜尋或前綴 + 過濾）緩存的總數條目上限
+_TOTAL_CACHE_SIZE = 64
+
+# 單個網域的列表行：domain/status/reported/polluted/note/created_at/last_probe_at/trace_status
+Row = Dict[str, Any]
+SortEntry = Tuple[Any, str]
+# 候選來源：(網域數, 返回網域迭代器的函數)
+Source = Tuple[int, Callable[[], Iterable[str]]]
+
+
+def _timestamp(value: Optional[str]) -> float:
+    if not value:
+        return 0.0
+    try:
+        return datetime.fromisoformat(value).timestamp()
+    except ValueError:
+        return 0.0
+
+
+def _sort_key(field: str, row: Row) -> Any:
+    if field == "domain":
+        return row["domain"]
+    return _timestamp(row.get(field))
+
+
+def _search_text(row: Row) -> str:
+    """搜尋範圍：網域與備註（小寫）"""
+    return f"{row['domain']}\n{row.get('note') or ''}".lower()
+
+
+def _combo(row: Row) -> Tuple:
+    return tuple(row.get(f) for f in FACET_FIELDS)
+
+
+def _trigrams(text: str) -> Set[str]:
+    return {text[i:i + 3] for i in range(len(text) - 2)}
+
+
+def encode_cursor(entry: SortEntry) -> str:
+    return base64.urlsafe_b64encode(json.dumps(entry, ensure_ascii=False).encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> SortEntry:
+    """解析分頁游標，格式錯誤時拋出 ValueError"""
+    try:
+        key, domain = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+    except Exception:
+        raise ValueError("無效的分頁游標")
+    return key, domain
+
+
+class DomainIndex:
+    """
+    網域列表的二級索引，隨網域變更與探測結果增量更新
+
+    - 每個排序欄位一個有序列表 [(鍵, 網域)]，以 bisect 定位分頁游標
+    - 過濾欄位按值保存網域集合，並按過濾值組合計數，純過濾查詢的總數無需求交集
+    - 子字符串搜尋使用三元組（trigram）倒排索引縮小候選，再逐一校驗
+    - 分頁沿排序索引遍歷並逐一校驗條件，取滿一頁即停止；最小候選來源較小時改為直接排序候選
+    - 讀取網域數據的函數在鎖外調用，避免與網域註冊表的鎖互相等待
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._build_lock = threading.Lock()
+        self._built = False
+        # 建立索引期間到達的變更，建立完成後補處理
+        self._backlog: Optional[Set[str]] = None
+        self._row_loader: Optional[Callable[[str], Optional[Row]]] = None
+        self._rows_loader: Optional[Callable[[], Iterable[Row]]] = None
+        self._rows: Dict[str, Row] = {}
+        self._sorted: Dict[str, List[SortEntry]] = {f: [] for f in SORT_FIELDS}
+        self._facets: Dict[str, Dict[Any, Set[str]]] = {f: {} for f in FACET_FIELDS}
+        self._trigrams: Dict[str, Set[str]] = {}
+        # 過濾值組合（按 FACET_FIELDS 順序）-> 網域數
+        self._combos: Dict[Tuple, int] = {}
+        # 網域集合、過濾值或搜尋文本變化時遞增，使緩存的總數失效
+        self._generation = 0
+        self._totals: "OrderedDict[Tuple, Tuple[int, int]]" = OrderedDict()
+
+    def bind(self, row_loader: Callable[[str], Optional[Row]], rows_loader: Callable[[], Iterable[Row]]):
+        """設置數據來源：單個網域的行（不存在時返回 None）與所有行"""
+        self._row_loader = row_loader
+        self._rows_loader = rows_loader
+
+    def __len__(self) -> int:
+        return len(self._rows)
+
+    # ---------- 建立與增量更新 ----------
+
+    def build(self):
+        """首次使用前建立索引（可在線程中調用）"""
+        if self._built:
+            return
+        with self._build_lock:
+            if self._built:
+                return
+            with self._lock:
+                self._backlog = set()
+            rows = list(self._rows_loader())
+            with self._lock:
+                for row in rows:
+                    self._put(row)
+                backlog, self._backlog = self._backlog, None
+                self._built = True
+        if backlog:
+            self.refresh(0, backlog)
+
+    def refresh(self, version: int, changed: Iterable[str] = (), removed: Iterable[str] = ()):
+        """重新索引變更的網域（Store 變更監聽，可在任意線程調用）"""
+        changed, removed = list(changed), list(removed)
+        with self._lock:
+            if not self._built:
+                if self._backlog is not None:
+                    self._backlog.update(changed)
+                    self._backlog.update(removed)
+                return
+        loaded = [(d, self._row_loader(d)) for d in set(changed) - set(removed)]
+        with self._lock:
+            for domain in removed:
+                self._remove(domain)
+            for domain, row in loaded:
+                if row is None:
+                    self._remove(domain)
+                else:
+                    self._put(row)
+
+    def _put(self, row: Row):
+        """新增或更新一行，只調整值有變化的索引（需持有 _lock）"""
+        domain = row["domain"]
+        old = self._rows.get(domain)
+        self._rows[domain] = row
+        for field in SORT_FIELDS:
+            key = _sort_key(field, row)
+            if old is not None:
+                old_key = _sort_key(field, old)
+                if old_key == key:
+                    continue
+                self._discard_sorted(field, (old_key, domain))
+            insort(self._sorted[field], (key, domain))
+        for field in FACET_FIELDS:
+            value = row.get(field)
+            if old is not None:
+                if old.get(field) == value:
+                    continue
+                self._discard_facet(field, old.get(field), domain)
+            self._facets[field].setdefault(value, set()).add(domain)
+        combo = _combo(row)
+        old_combo = _combo(old) if old is not None else None
+        if combo != old_combo:
+            if old_combo is not None:
+                self._discard_combo(old_combo)
+            self._combos[combo] = self._combos.get(combo, 0) + 1
+            self._generation += 1
+        text = _search_text(row)
+        old_text = _search_text(old) if old is not None else ""
+        if text != old_text:
+            old_grams = _trigrams(old_text)
+            new_grams = _trigrams(text)
+            for gram in old_grams - new_grams:
+                self._discard_gram(gram, domain)
+            for gram in new_grams - old_grams:
+                self._trigrams.setdefault(gram, set()).add(domain)
+            self._generation += 1
+
+    def _remove(self, domain: str):
+        row = self._rows.pop(domain, None)
+        if row is None:
+            return
+        for field in SORT_FIELDS:
+            self._discard_sorted(field, (_sort_key(field, row), domain))
+        for field in FACET_FIELDS:
+            self._discard_facet(field, row.get(field), domain)
+        self._discard_combo(_combo(row))
+        for gram in _trigrams(_search_text(row)):
+            self._discard_gram(gram, domain)
+        self._generation += 1
+
+    def _discard_sorted(self, field: str, entry: SortEntry):
+        entries = self._sorted[field]
+        i = bisect_left(entries, entry)
+        if i < len(entries) and entries[i] == entry:
+            del entries[i]
+
+    def _discard_facet(self, field: str, value: Any, domain: str):
+        members = self._facets[field].get(value)
+        if members is not None:
+            members.discard(domain)
+            if not members:
+                del self._facets[field][value]
+
+    def _discard_combo(self, combo: Tuple):
+        count = self._combos.get(combo, 0) - 1
+        if count > 0:
+            self._combos[combo] = count
+        else:
+            self._combos.pop(combo, None)
+
+    def _discard_gram(self, gram: str, domain: str):
+        members = self._trigrams.get(gram)
+        if members is not None:
+            members.discard(domain)
+            if not members:
+                del self._trigrams[gram]
+
+    # ---------- 查詢 ----------
+
+    def counts(self) -> Dict[str, int]:
+        """全列表統計：總數、已上報數及各狀態數"""
+        self.build()
+        with self._lock:
+            counts = {"total": len(self._rows), "reported": len(self._facets["reported"].get(True, ()))}
+            for status, members in self._facets["status"].items():
+                counts[status] = len(members)
+            return counts
+
+    def query(
+        self,
+        sort: str = "domain",
+        descending: bool = False,
+        filters: Optional[Dict[str, Any]] = None,
+        search: Optional[str] = None,
+        prefix: Optional[str] = None,
+        cursor: Optional[str] = None,
+        limit: int = 100
+    ) -> Tuple[List[Row], int, Optional[str]]:
+        """
+        查詢一頁網域
+
+        Args:
+            sort: 排序欄位（SORT_FIELDS）
+            filters: {過濾欄位: 值}，多個條件取交集
+            search: 網域或備註包含的子字符串（不分大小寫）
+            prefix: 網域前綴
+            cursor: 上一頁返回的 next_cursor
+
+        Returns:
+            (本頁行, 符合條件的總數, 下一頁游標；已是最後一頁時為 None)
+        """
+        if sort not in SORT_FIELDS:
+            raise ValueError(f"不支持的排序欄位: {sort}")
+        after = decode_cursor(cursor) if cursor else None
+        if after is not None and isinstance(after[0], str) != (sort == "domain"):
+            raise ValueError("分頁游標與排序欄位不符")
+        self.build()
+        filters = filters or {}
+        for field in filters:
+            if field not in FACET_FIELDS:
+                raise ValueError(f"不支持的過濾欄位: {field}")
+        search = search.lower() if search else None
+        with self._lock:
+            entries = self._sorted[sort]
+            plan = self._plan(filters, search, prefix)
+            if plan is None:
+                total = len(entries)
+                page = self._page_from_index(entries, None, descending, after, limit + 1, 0, len(entries))
+            else:
+                sources, tests = plan
+                if any(size == 0 for size, _ in sources):
+                    total, page = 0, []
+                else:
+                    def match(domain: str) -> bool:
+                        return all(test(domain) for test in tests)
+                    driver = min(sources, key=lambda source: source[0]) if sources else None
+                    total = self._total(filters, search, prefix, driver, match)
+                    if prefix and sort == "domain":
+                        # 前綴範圍在網域排序索引中本已有序
+                        lo, hi = self._prefix_range(prefix)
+                        page = self._page_from_index(entries, match, descending, after, limit + 1, lo, hi)
+                    elif driver is not None and driver[0] * _SMALL_CANDIDATE_RATIO <= len(entries):
+                        candidates = (d for d in driver[1]() if match(d))
+                        page = self._page_from_candidates(sort, candidates, descending, after, limit + 1)
+                    else:
+                        page = self._page_from_index(entries, match, descending, after, limit + 1, 0, len(entries))
+            next_cursor = encode_cursor(page[limit - 1]) if len(page) > limit else None
+            rows = [dict(self._rows[domain]) for _, domain in page[:limit]]
+        return rows, total, next_cursor
+
+    def _prefix_range(self, prefix: str) -> Tuple[int, int]:
+        """前綴在網域排序索引中的位置範圍 [lo, hi)"""
+        entries = self._sorted["domain"]
+        return bisect_left(entries, (prefix, "")), bisect_left(entries, (prefix + "\U0010ffff", ""))
+
+    def _plan(
+        self, filters: Dict[str, Any], search: Optional[str], prefix: Optional[str]
+    ) -> Optional[Tuple[List[Source], List[Callable[[str], bool]]]]:
+        """
+        將查詢條件轉為 (候選來源, 逐一校驗函數)，均不物化交集；無任何條件時返回 None
+
+        候選來源為已知大小的網域集合（過濾值集合、前綴範圍、最小的三元組集合），
+        過短的搜尋詞無法使用三元組，只作校驗
+        """
+        sources: List[Source] = []
+        tests: List[Callable[[str], bool]] = []
+        for field, value in filters.items():
+            members = self._facets[field].get(value, set())
+            sources.append((len(members), lambda members=members: members))
+            tests.append(members.__contains__)
+        if prefix:
+            lo, hi = self._prefix_range(prefix)
+            entries = self._sorted["domain"]
+            sources.append((hi - lo, lambda: (entries[i][1] for i in range(lo, hi))))
+            tests.append(lambda d: d.startswith(prefix))
+        if search:
+            rows = self._rows
+            if len(search) >= 3:
+                grams = sorted((self._trigrams.get(g, set()) for g in _trigrams(search)), key=len)
+                sources.append((len(grams[0]), lambda: grams[0]))
+                tests.append(lambda d: all(d in g for g in grams) and search in _search_text(rows[d]))
+            else:
+                tests.append(lambda d: search in _search_text(rows[d]))
+        if not tests:
+            return None
+        return sources, tests
+
+    def _total(
+        self, filters: Dict[str, Any], search: Optional[str], prefix: Optional[str],
+        driver: Optional[Source], match: Callable[[str], bool]
+    ) -> int:
+        """
+        符合條件的總數（需持有 _lock）
+
+        - 純過濾：按過濾值組合計數求和
+        - 純前綴：前綴範圍大小
+        - 其他：沿最小候選來源（無來源時為全部網域）逐一計數，按條件緩存到索引下次變化
+        """
+        if not search and not prefix:
+            positions = [(FACET_FIELDS.index(f), v) for f, v in filters.items()]
+            return sum(n for combo, n in self._combos.items() if all(combo[i] == v for i, v in positions))
+        if not search and not filters:
+            lo, hi = self._prefix_range(prefix)
+            return hi - lo
+        key = (tuple(sorted(filters.items())), search, prefix)
+        cached = self._totals.get(key)
+        if cached is not None and cached[0] == self._generation:
+            self._totals.move_to_end(key)
+            return cached[1]
+        domains = driver[1]() if driver is not None else self._rows
+        total = sum(1 for d in domains if match(d))
+        self._totals[key] = (self._generation, total)
+        self._totals.move_to_end(key)
+        while len(self._totals) > _TOTAL_CACHE_SIZE:
+            self._totals.popitem(last=False)
+        return total
+
+    def _page_from_candidates(
+        self, sort: str, candidates: Iterable[str], descending: bool, after: Optional[SortEntry], count: int
+    ) -> List[SortEntry]:
+        """候選來源較小：直接排序候選"""
+        entries = sorted(((_sort_key(sort, self._rows[d]), d) for d in candidates), reverse=descending)
+        if after is not None:
+            if descending:
+                start = len(entries) - bisect_left(entries[::-1], after)
+            else:
+                start = bisect_right(entries, after)
+            entries = entries[start:]
+        return entries[:count]
+
+    @staticmethod
+    def _page_from_index(
+        entries: List[SortEntry], match: Optional[Callable[[str], bool]], descending: bool,
+        after: Optional[SortEntry], count: int, lo: int, hi: int
+    ) -> List[SortEntry]:
+        """沿排序索引 [lo, hi) 從游標處遍歷，跳過不符合的網域，取滿 count 項即停止"""
+        page: List[SortEntry] = []
+        if descending:
+            start = min(bisect_left(entries, after), hi) if after is not None else hi
+            positions = range(start - 1, lo - 1, -1)
+        else:
+            start = max(bisect_right(entries, after), lo) if after is not None else lo
+            positions = range(start, hi)
+        for i in positions:
+            entry = entries[i]
+            if match is None or match(entry[1]):
+                page.append(entry)
+                if len(page) >= count:
+                    break
+        return page
+
+
+# 全局網域索引（數據來源在 main.py 中綁定）
+domain_index = DomainIndex()
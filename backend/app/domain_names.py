@@ -0,0 +1,15 @@
+"""網域名稱處理（不依賴網域註冊表，探測子進程與遠端節點可直接導入）"""
+
+
+def extract_root_domain(domain: str) -> str:
+    """
+    從域名中提取根域名
+    例：www.example.com -> example.com
+    僅處理 www 前綴，其他子域名保持不變
+    """
+    if not domain:
+        return domain
+    parts = domain.lower().split(".")
+    if len(parts) > 2 and parts[0] == "www":
+        return ".".join(parts[1:])
+    return domain
@@ -1,10 +1,20 @@
 """網域列表讀取與管理"""
+import atexit
 import json
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
 from datetime import datetime, timezone, timedelta
 from urllib.parse import urlparse
 from pathlib import Path
-from typing import List, Dict, Optional
+from typing import Any, Callable, Iterable, List, Dict, Optional, Set, Tuple
 from filelock import FileLock
+from . import config
+from .domain_names import extract_root_domain
+
+logger = logging.getLogger(__name__)
 
 # 東八區時區
 TZ_UTC8 = timezone(timedelta(hours=8))
@@ -13,6 +23,26 @@ TZ_UTC8 = timezone(timedelta(hours=8))
 DOMAINS_JSON = Path(__file__).resolve().parent.parent / "domains.json"
 DOMAINS_LOCK = Path(__file__).resolve().parent.parent / "domains.json.lock"
 
+# 變更監聽：callback(changed, removed)，用於列表 API 的版本號與增量同步
+ChangeListener = Callable[[Iterable[str], Iterable[str]], None]
+_change_listeners: List[ChangeListener] = []
+
+
+def add_change_listener(callback: ChangeListener):
+    """註冊網域變更監聽（新增/修改/刪除及外部修改重新載入時調用）"""
+    _change_listeners.append(callback)
+
+
+def _notify_changes(changed: Iterable[str] = (), removed: Iterable[str] = ()):
+    changed, removed = list(changed), list(removed)
+    if not changed and not removed:
+        return
+    for callback in _change_listeners:
+        try:
+            callback(changed, removed)
+        except Exception as e:
+            logger.error(f"[domains] 變更監聽失敗: {e}", exc_info=True)
+
 
 def normalize_domain(raw: str) -> str:
     """規範化網域/URL 輸入，提取純網域名稱"""
@@ -61,20 +91,6 @@ def normalize_domain(raw: str) -> str:
     return s
 
 
-def extract_root_domain(domain: str) -> str:
-    """
-    從域名中提取根域名
-    例：www.example.com -> example.com
-    僅處理 www 前綴，其他子域名保持不變
-    """
-    if not domain:
-        return domain
-    parts = domain.lower().split(".")
-    if len(parts) > 2 and parts[0] == "www":
-        return ".".join(parts[1:])
-    return domain
-
-
 def normalize_www_domain(domain: str) -> str:
     """
     將 www 子域名收斂到根域名後進行規範化
@@ -86,65 +102,390 @@ def normalize_www_domain(domain: str) -> str:
     return normalize_domain(root)
 
 
-def auto_add_domain(domain: str, note: str = "自動收錄") -> bool:
+class DomainRegistry:
     """
-    自動收錄域名（用於跳轉追蹤發現的新域名）
-    如果 www 子域名則收斂到根域名
-    返回是否成功新增
+    進程內網域註冊表
+
+    - 啟動時載入一次 domains.json，之後所有讀取直接走內存
+    - 修改先作用於內存，並在 DOMAINS_WRITE_DELAY 秒內合併為一次寫入（寫後延遲持久化）
+    - 透過 inode/mtime/size 偵測外部修改（如 import_domains.py），自動重新載入並保留未寫入的本地修改
     """
-    normalized = normalize_www_domain(domain)
-    if not normalized:
-        return False
-    
-    data = _read_domains()
-    if normalized in data:
-        return False
-    
-    now = datetime.now(TZ_UTC8).isoformat()
-    data[normalized] = {
+
+    def __init__(self, path: Path, lock_path: Path):
+        self._path = path
+        self._lock_path = lock_path
+        self._mutex = threading.RLock()
+        self._data: Optional[Dict[str, Dict]] = None
+        self._signature: Optional[Tuple[int, int, int]] = None
+        self._last_check = 0.0
+        # 尚未持久化的新增/修改與刪除
+        self._dirty: Set[str] = set()
+        self._deleted: Set[str] = set()
+        self._timer: Optional[threading.Timer] = None
+        # 序列化進程內的並發寫入（延遲寫入線程與背景寫入任務）
+        self._flush_lock = threading.Lock()
+
+    # ---------- 載入與外部修改偵測 ----------
+
+    def _stat_signature(self) -> Optional[Tuple[int, int, int]]:
+        """文件簽名 (inode, mtime_ns, size)，文件不存在時返回 None"""
+        try:
+            st = os.stat(self._path)
+        except FileNotFoundError:
+            return None
+        return (st.st_ino, st.st_mtime_ns, st.st_size)
+
+    def _load_file(self) -> Optional[Dict[str, Dict]]:
+        """讀取磁碟上的 domains.json，解析失敗（如外部寫入中途）返回 None"""
+        if not self._path.exists():
+            return {}
+        try:
+            with open(self._path, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except Exception as e:
+            logger.warning(f"[registry] 讀取 {self._path.name} 失敗: {e}")
+            return None
+
+    def _refresh(self, force: bool = False):
+        """必要時重新載入磁碟內容（需持有 _mutex）"""
+        now = time.monotonic()
+        if self._data is not None and not force and now - self._last_check < config.DOMAINS_STAT_INTERVAL:
+            return
+        self._last_check = now
+        signature = self._stat_signature()
+        if self._data is not None and signature == self._signature:
+            return
+
+        disk = self._load_file()
+        if disk is None:
+            if self._data is None:
+                self._data = {}
+            # 保留舊簽名，下次檢查時重試
+            return
+
+        if self._data is not None:
+            logger.info(f"[registry] 偵測到 {self._path.name} 外部修改，重新載入 {len(disk)} 個網域")
+            # 疊加尚未寫入的本地修改
+            for d in self._deleted:
+                disk.pop(d, None)
+            for d in self._dirty:
+                if d in self._data:
+                    disk[d] = self._data[d]
+            _notify_changes(
+                [d for d, info in disk.items() if self._data.get(d) != info],
+                [d for d in self._data if d not in disk]
+            )
+        self._data = disk
+        self._signature = signature
+
+    # ---------- 持久化 ----------
+
+    def _mark_dirty(self, added: Set[str] = frozenset(), deleted: Set[str] = frozenset()):
+        """記錄待寫入的變更並排程延遲寫入（需持有 _mutex）"""
+        self._dirty |= added
+        self._dirty -= deleted
+        self._deleted |= deleted
+        self._deleted -= added
+        if self._timer is None:
+            self._timer = threading.Timer(config.DOMAINS_WRITE_DELAY, self._timer_flush)
+            self._timer.daemon = True
+            self._timer.start()
+
+    def _timer_flush(self):
+        try:
+            self.flush()
+        except Exception as e:
+            logger.error(f"[registry] 延遲寫入失敗: {e}", exc_info=True)
+
+    def dirty_count(self) -> int:
+        """尚未持久化的變更數"""
+        with self._mutex:
+            return len(self._dirty) + len(self._deleted)
+
+    def flush(self) -> bool:
+        """
+        立即將待寫入的變更持久化
+        返回是否實際寫入了文件
+        """
+        with self._flush_lock:
+            return self._flush()
+
+    def _flush(self) -> bool:
+        with self._mutex:
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+            if not self._dirty and not self._deleted:
+                return False
+
+        lock = FileLock(str(self._lock_path), timeout=5)
+        with lock:
+            with self._mutex:
+                # 寫入前合併外部修改，避免覆蓋 import_domains.py 的結果
+                self._refresh(force=True)
+                snapshot = {k: dict(v) for k, v in self._data.items()}
+                dirty, deleted = self._dirty, self._deleted
+                self._dirty, self._deleted = set(), set()
+
+            try:
+                tmp_path = self._path.with_name(self._path.name + ".tmp")
+                with open(tmp_path, "w", encoding="utf-8") as f:
+                    json.dump(snapshot, f, ensure_ascii=False, indent=2)
+                os.replace(tmp_path, self._path)
+            except Exception:
+                with self._mutex:
+                    # 寫入失敗時恢復待寫入標記
+                    self._dirty |= dirty - self._deleted
+                    self._deleted |= deleted - self._dirty
+                    if self._timer is None:
+                        self._mark_dirty()
+                raise
+
+            with self._mutex:
+                self._signature = self._stat_signature()
+                self._last_check = time.monotonic()
+
+        logger.debug(f"[registry] 已寫入 {len(snapshot)} 個網域（變更 {len(dirty)}，刪除 {len(deleted)}）")
+        return True
+
+    # ---------- 讀取 ----------
+
+    def keys(self) -> List[str]:
+        with self._mutex:
+            self._refresh()
+            return list(self._data.keys())
+
+    def snapshot(self) -> Dict[str, Dict]:
+        """所有網域的淺拷貝（屬性字典為共享引用，調用方不可修改）"""
+        with self._mutex:
+            self._refresh()
+            return dict(self._data)
+
+    def get(self, domain: str) -> Optional[Dict]:
+        with self._mutex:
+            self._refresh()
+            info = self._data.get(domain)
+            return dict(info) if info is not None else None
+
+    def contains(self, domain: str) -> bool:
+        with self._mutex:
+            self._refresh()
+            return domain in self._data
+
+    def count(self) -> int:
+        with self._mutex:
+            self._refresh()
+            return len(self._data)
+
+    # ---------- 修改 ----------
+
+    def insert(self, domain: str, info: Dict) -> bool:
+        """新增網域，已存在時返回 False"""
+        with self._mutex:
+            self._refresh()
+            if domain in self._data:
+                return False
+            self._data[domain] = info
+            self._mark_dirty(added={domain})
+            return True
+
+    def insert_many(self, items: Dict[str, Dict]) -> List[str]:
+        """批量新增網域（跳過已存在者），返回實際新增的網域"""
+        with self._mutex:
+            self._refresh()
+            added = [d for d in items if d not in self._data]
+            for d in added:
+                self._data[d] = items[d]
+            if added:
+                self._mark_dirty(added=set(added))
+            return added
+
+    def update(self, domain: str, **fields: Any) -> Optional[Dict]:
+        """更新單個網域屬性，返回更新後的屬性；網域不存在時返回 None"""
+        with self._mutex:
+            self._refresh()
+            info = self._data.get(domain)
+            if info is None:
+                return None
+            info.update(fields)
+            self._mark_dirty(added={domain})
+            return dict(info)
+
+    def toggle(self, domain: str, field: str) -> Optional[bool]:
+        """在鎖內翻轉布爾屬性，返回新值；網域不存在時返回 None"""
+        with self._mutex:
+            self._refresh()
+            info = self._data.get(domain)
+            if info is None:
+                return None
+            value = info[field] = not info.get(field, False)
+            self._mark_dirty(added={domain})
+            return value
+
+    def update_many(self, updates: Dict[str, Dict[str, Any]]) -> int:
+        """批量更新網域屬性，返回實際更新數量"""
+        with self._mutex:
+            self._refresh()
+            changed = set()
+            for d, fields in updates.items():
+                info = self._data.get(d)
+                if info is not None:
+                    info.update(fields)
+                    changed.add(d)
+            if changed:
+                self._mark_dirty(added=changed)
+            return len(changed)
+
+    def rename(self, old_domain: str, new_domain: str, **fields: Any) -> bool:
+        """重命名網域並保留原屬性，返回是否成功"""
+        with self._mutex:
+            self._refresh()
+            if old_domain not in self._data:
+                return False
+            info = self._data.pop(old_domain)
+            info.update(fields)
+            self._data[new_domain] = info
+            deleted = {old_domain} if old_domain != new_domain else set()
+            self._mark_dirty(added={new_domain}, deleted=deleted)
+            return True
+
+    def delete_many(self, domains: List[str]) -> int:
+        """批量刪除網域，返回實際刪除數量"""
+        with self._mutex:
+            self._refresh()
+            removed = {d for d in domains if d in self._data}
+            for d in removed:
+                del self._data[d]
+            if removed:
+                self._mark_dirty(deleted=removed)
+            return len(removed)
+
+
+def _create_registry():
+    """按 config.STORAGE_BACKEND 創建網域存儲"""
+    if config.STORAGE_BACKEND == "sqlite":
+        from .sqlite_store import SqliteDomainBackend, get_database
+        return SqliteDomainBackend(get_database(config.SQLITE_PATH), _notify_changes)
+    return DomainRegistry(DOMAINS_JSON, DOMAINS_LOCK)
+
+
+# 全局網域註冊表
+registry = _create_registry()
+atexit.register(registry.flush)
+
+
+def _new_domain_info(note: str = "", now: Optional[str] = None) -> Dict:
+    """新網域的初始屬性"""
+    return {
         "reported": False,
         "polluted": False,
         "note": note,
-        "created_at": now
+        "created_at": now or datetime.now(TZ_UTC8).isoformat()
     }
-    _write_domains(data)
-    return True
 
 
-def _read_domains() -> Dict[str, Dict]:
-    """讀取 domains.json"""
-    if not DOMAINS_JSON.exists():
-        return {}
-    try:
-        with open(DOMAINS_JSON, "r", encoding="utf-8") as f:
-            return json.load(f)
-    except Exception:
-        return {}
+def auto_add_domains(domains: Iterable[str], note: str = "自動收錄") -> List[str]:
+    """批量自動收錄（一次寫入），返回實際新增的網域"""
+    now = datetime.now(TZ_UTC8).isoformat()
+    items = {d: _new_domain_info(note, now) for d in domains if not registry.contains(d)}
+    if not items:
+        return []
+    added = registry.insert_many(items)
+    if added:
+        _notify_changes(added)
+    return added
+
 
+class AutoEnrolBuffer:
+    """
+    跳轉鏈發現網域的收錄緩衝（准入控制）
+
+    - 發現的網域先去重放入緩衝，由調用方定期以一次批量寫入提交
+    - 每個循環最多收錄 max_per_cycle 個，單個來源網域最多貢獻 max_per_source 個
+    - 已檢查過的網域（已在列表中或已收錄）記入有上限的 seen 集合，重複出現時無需再查詢
+    """
 
-def _write_domains(data: Dict[str, Dict]):
-    """寫入 domains.json（帶文件鎖）"""
-    lock = FileLock(str(DOMAINS_LOCK), timeout=5)
-    with lock:
-        with open(DOMAINS_JSON, "w", encoding="utf-8") as f:
-            json.dump(data, f, ensure_ascii=False, indent=2)
+    def __init__(self, max_per_cycle: int, max_per_source: int, seen_max: int):
+        self.max_per_cycle = max_per_cycle
+        self.max_per_source = max_per_source
+        self.seen_max = seen_max
+        # 待提交：網域 -> 來源網域
+        self._pending: Dict[str, str] = {}
+        self._per_source: Dict[str, int] = {}
+        self._admitted = 0
+        self._seen: "OrderedDict[str, None]" = OrderedDict()
+        # 本循環統計
+        self.offered = 0
+        self.rejected = 0
+
+    def __len__(self) -> int:
+        return len(self._pending)
+
+    def _mark_seen(self, domain: str):
+        self._seen[domain] = None
+        self._seen.move_to_end(domain)
+        if len(self._seen) > self.seen_max:
+            self._seen.popitem(last=False)
+
+    def offer(self, source: str, hostname: str) -> bool:
+        """提交一個發現的主機名（www 收斂到根域名），返回是否進入緩衝"""
+        domain = normalize_www_domain(hostname)
+        if not domain or domain == source or domain in self._pending:
+            return False
+        if domain in self._seen:
+            self._seen.move_to_end(domain)
+            return False
+        self.offered += 1
+        if registry.contains(domain):
+            self._mark_seen(domain)
+            return False
+        if self._admitted >= self.max_per_cycle or self._per_source.get(source, 0) >= self.max_per_source:
+            # 超出配額不記入 seen，下個循環仍可收錄
+            self.rejected += 1
+            return False
+        self._pending[domain] = source
+        self._per_source[source] = self._per_source.get(source, 0) + 1
+        self._admitted += 1
+        return True
+
+    def commit(self, note: str = "自動收錄") -> List[str]:
+        """批量寫入緩衝中的網域，返回實際新增的網域"""
+        if not self._pending:
+            return []
+        pending, self._pending = self._pending, {}
+        added = auto_add_domains(pending, note)
+        for domain in pending:
+            self._mark_seen(domain)
+        return added
+
+    def reset_cycle(self) -> Tuple[int, int]:
+        """開始新循環：重置配額，返回上一循環的 (候選數, 因配額拒絕數)"""
+        stats = (self.offered, self.rejected)
+        self._per_source.clear()
+        self._admitted = len(self._pending)
+        self.offered = 0
+        self.rejected = 0
+        return stats
 
 
 def load_domains() -> List[str]:
     """載入網域列表（僅網域名稱）"""
-    data = _read_domains()
-    return sorted(data.keys())
+    return sorted(registry.keys())
 
 
 def get_all_domains() -> Dict[str, Dict]:
     """獲取所有網域及其屬性"""
-    return _read_domains()
+    return registry.snapshot()
 
 
 def get_domain(domain: str) -> Optional[Dict]:
     """獲取單個網域屬性"""
-    data = _read_domains()
-    return data.get(domain)
+    return registry.get(domain)
+
+
+def count_domains() -> int:
+    """網域總數"""
+    return registry.count()
 
 
 def add_domain(domain: str, note: str = "") -> tuple[bool, str]:
@@ -156,18 +497,9 @@ def add_domain(domain: str, note: str = "") -> tuple[bool, str]:
     if not normalized:
         return False, "無效的網域格式"
     
-    data = _read_domains()
-    if normalized in data:
+    if not registry.insert(normalized, _new_domain_info(note)):
         return False, "網域已存在"
-    
-    now = datetime.now(TZ_UTC8).isoformat()
-    data[normalized] = {
-        "reported": False,
-        "polluted": False,
-        "note": note,
-        "created_at": now
-    }
-    _write_domains(data)
+    _notify_changes([normalized])
     return True, normalized
 
 
@@ -180,50 +512,35 @@ def update_domain(old_domain: str, new_domain: str) -> tuple[bool, str]:
     if not normalized_new:
         return False, "無效的網域格式"
     
-    data = _read_domains()
-    if old_domain not in data:
+    if not registry.contains(old_domain):
         return False, "原網域不存在"
-    if normalized_new in data and normalized_new != old_domain:
+    if normalized_new != old_domain and registry.contains(normalized_new):
         return False, "新網域已存在"
     
-    # 保留原屬性，但重置 polluted
-    old_info = data.pop(old_domain)
-    old_info["polluted"] = False  # 新網域需重新檢測
-    data[normalized_new] = old_info
-    _write_domains(data)
+    # 保留原屬性，但重置 polluted（新網域需重新檢測）
+    registry.rename(old_domain, normalized_new, polluted=False)
+    _notify_changes([normalized_new], [old_domain] if old_domain != normalized_new else [])
     return True, normalized_new
 
 
 def delete_domain(domain: str) -> bool:
     """刪除單個網域"""
-    data = _read_domains()
-    if domain not in data:
-        return False
-    del data[domain]
-    _write_domains(data)
-    return True
+    return batch_delete_domains([domain]) > 0
 
 
 def batch_delete_domains(domains: List[str]) -> int:
     """批量刪除網域，返回實際刪除數量"""
-    data = _read_domains()
-    deleted = 0
-    for d in domains:
-        if d in data:
-            del data[d]
-            deleted += 1
-    if deleted > 0:
-        _write_domains(data)
+    deleted = registry.delete_many(domains)
+    if deleted:
+        _notify_changes(removed=domains)
     return deleted
 
 
 def update_note(domain: str, note: str) -> bool:
     """更新網域備註"""
-    data = _read_domains()
-    if domain not in data:
+    if registry.update(domain, note=note) is None:
         return False
-    data[domain]["note"] = note
-    _write_domains(data)
+    _notify_changes([domain])
     return True
 
 
@@ -232,12 +549,11 @@ def toggle_reported(domain: str) -> Optional[bool]:
     切換已上報狀態
     返回新狀態，若網域不存在則返回 None
     """
-    data = _read_domains()
-    if domain not in data:
+    reported = registry.toggle(domain, "reported")
+    if reported is None:
         return None
-    data[domain]["reported"] = not data[domain]["reported"]
-    _write_domains(data)
-    return data[domain]["reported"]
+    _notify_changes([domain])
+    return reported
 
 
 def batch_set_reported(domains: List[str], reported: bool) -> int:
@@ -245,31 +561,28 @@ def batch_set_reported(domains: List[str], reported: bool) -> int:
     批量設置上報狀態
     返回實際更新的數量
     """
-    data = _read_domains()
-    updated = 0
-    for d in domains:
-        if d in data:
-            data[d]["reported"] = reported
-            updated += 1
-    if updated > 0:
-        _write_domains(data)
+    updated = registry.update_many({d: {"reported": reported} for d in domains})
+    if updated:
+        _notify_changes(domains)
     return updated
 
+
+def _probe_fields(polluted: bool, trace_status: str = None, last_probe_at: str = None) -> Dict:
+    """探測結果需寫入的屬性"""
+    fields = {"polluted": polluted}
+    if trace_status:
+        fields["trace_status"] = trace_status
+    if last_probe_at:
+        fields["last_probe_at"] = last_probe_at
+    return fields
+
+
 def update_polluted_and_trace(domain: str, polluted: bool, trace_status: str = None, last_probe_at: str = None):
     """更新污染狀態、追蹤狀態和檢測時間（供探測器調用）"""
-    import logging
-    logger = logging.getLogger(__name__)
-    
     try:
-        data = _read_domains()
-        if domain in data:
-            data[domain]["polluted"] = polluted
-            if trace_status:
-                data[domain]["trace_status"] = trace_status
-            if last_probe_at:
-                data[domain]["last_probe_at"] = last_probe_at
-            _write_domains(data)
-            logger.debug(f"[domains] 已更新 {domain}: polluted={polluted}, trace_status={trace_status}, 總域名數={len(data)}")
+        if registry.update(domain, **_probe_fields(polluted, trace_status, last_probe_at)) is not None:
+            _notify_changes([domain])
+            logger.debug(f"[domains] 已更新 {domain}: polluted={polluted}, trace_status={trace_status}")
         else:
             logger.warning(f"[domains] 域名不存在，無法更新: {domain}")
     except Exception as e:
@@ -277,37 +590,27 @@ def update_polluted_and_trace(domain: str, polluted: bool, trace_status: str = N
         raise
 
 
-def batch_update_polluted_and_trace(updates: list):
+def batch_update_polluted_and_trace(updates: list, notify: bool = True):
     """
     批量更新多個域名的污染狀態、追蹤狀態和檢測時間
     
     Args:
         updates: [(domain, polluted, trace_status, last_probe_at), ...]
+        notify: 是否通知變更監聽（Store 落盤時已在探測結果更新時通知過）
     """
-    import logging
-    logger = logging.getLogger(__name__)
-    
     if not updates:
         return
     
     try:
-        data = _read_domains()
-        updated_count = 0
-        
+        fields = {}
         for domain, polluted, trace_status, last_probe_at in updates:
-            if domain in data:
-                data[domain]["polluted"] = polluted
-                if trace_status:
-                    data[domain]["trace_status"] = trace_status
-                if last_probe_at:
-                    data[domain]["last_probe_at"] = last_probe_at
-                updated_count += 1
-            else:
-                logger.warning(f"[domains] 域名不存在，跳過: {domain}")
-        
-        if updated_count > 0:
-            _write_domains(data)
-            logger.debug(f"[domains] 批量更新完成: {updated_count}/{len(updates)} 條記錄")
+            fields[domain] = _probe_fields(polluted, trace_status, last_probe_at)
+        updated_count = registry.update_many(fields)
+        if notify:
+            _notify_changes(fields)
+        if updated_count < len(fields):
+            logger.warning(f"[domains] {len(fields) - updated_count} 個域名不存在，已跳過")
+        logger.debug(f"[domains] 批量更新完成: {updated_count}/{len(updates)} 條記錄")
     except Exception as e:
         logger.error(f"[domains] 批量更新失敗: {e}", exc_info=True)
         raise
@@ -324,8 +627,7 @@ def import_from_file(filepath: str) -> tuple[int, int]:
     從文件批量導入網域
     返回 (成功數, 跳過數)
     """
-    data = _read_domains()
-    added = 0
+    items = {}
     skipped = 0
     now = datetime.now(TZ_UTC8).isoformat()
     
@@ -336,23 +638,19 @@ def import_from_file(filepath: str) -> tuple[int, int]:
                 if not line or line.startswith("#"):
                     continue
                 normalized = normalize_domain(line)
-                if not normalized:
+                if not normalized or normalized in items:
                     skipped += 1
                     continue
-                if normalized in data:
-                    skipped += 1
-                    continue
-                data[normalized] = {
-                    "reported": False,
-                    "polluted": False,
-                    "note": "",
-                    "created_at": now
-                }
-                added += 1
+                items[normalized] = _new_domain_info("", now)
     except Exception:
         pass
     
-    if added > 0:
-        _write_domains(data)
+    added = registry.insert_many(items)
+    skipped += len(items) - len(added)
+    if added:
+        _notify_changes(added)
+    
+    # 導入腳本為獨立進程，立即落盤
+    registry.flush()
     
-    return added, skipped
+    return len(added), skipped
@@ -0,0 +1,101 @@
+"""網域變更推送（Server-Sent Events）"""
+import asyncio
+import threading
+from collections import OrderedDict
+from typing import Iterable, List, Optional, Set, Tuple
+
+# 待推送項：(網域, 版本號, 是否已刪除)
+PendingEvent = Tuple[str, int, bool]
+
+
+class Subscriber:
+    """
+    單個 SSE 客戶端的待推送緩衝
+
+    - 同一網域的多次變更合併為一條（只推送最新狀態）
+    - 緩衝超過 max_pending 時丟棄全部待推送項，改為通知客戶端全量重新同步
+    """
+
+    def __init__(self, max_pending: int):
+        self.max_pending = max_pending
+        self._pending: "OrderedDict[str, Tuple[int, bool]]" = OrderedDict()
+        self._resync = False
+        self._wakeup = asyncio.Event()
+        self.overflows = 0
+
+    def push(self, domain: str, version: int, removed: bool):
+        if self._resync:
+            return
+        self._pending[domain] = (version, removed)
+        self._pending.move_to_end(domain)
+        if len(self._pending) > self.max_pending:
+            self.overflows += 1
+            self.request_resync()
+        self._wakeup.set()
+
+    def request_resync(self):
+        self._resync = True
+        self._pending.clear()
+        self._wakeup.set()
+
+    async def drain(self, timeout: float) -> Tuple[bool, List[PendingEvent]]:
+        """
+        等待並取出待推送項（按版本升序）
+        返回 (是否需全量重新同步, 待推送項)；超時返回 (False, [])
+        """
+        if not self._pending and not self._resync:
+            self._wakeup.clear()
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+        resync, self._resync = self._resync, False
+        items = [(d, v, gone) for d, (v, gone) in self._pending.items()]
+        self._pending.clear()
+        return resync, items
+
+
+class EventHub:
+    """
+    向所有訂閱者分發網域變更
+
+    publish 可在任意線程調用（如網域註冊表的延遲寫入線程），分發總在事件循環中進行
+    """
+
+    def __init__(self):
+        self._subscribers: Set[Subscriber] = set()
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._thread_id: Optional[int] = None
+
+    def __len__(self) -> int:
+        return len(self._subscribers)
+
+    def subscribe(self, max_pending: int) -> Subscriber:
+        """創建訂閱者（需在事件循環中調用）"""
+        self._loop = asyncio.get_running_loop()
+        self._thread_id = threading.get_ident()
+        subscriber = Subscriber(max_pending)
+        self._subscribers.add(subscriber)
+        return subscriber
+
+    def unsubscribe(self, subscriber: Subscriber):
+        self._subscribers.discard(subscriber)
+
+    def publish(self, version: int, changed: Iterable[str] = (), removed: Iterable[str] = ()):
+        if not self._subscribers or self._loop is None:
+            return
+        if threading.get_ident() == self._thread_id:
+            self._dispatch(version, changed, removed)
+        elif not self._loop.is_closed():
+            self._loop.call_soon_threadsafe(self._dispatch, version, list(changed), list(removed))
+
+    def _dispatch(self, version: int, changed: Iterable[str], removed: Iterable[str]):
+        for subscriber in list(self._subscribers):
+            for domain in changed:
+                subscriber.push(domain, version, False)
+            for domain in removed:
+                subscriber.push(domain, version, True)
+
+
+# 全局事件分發
+event_hub = EventHub()
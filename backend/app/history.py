@@ -0,0 +1,370 @@
+"""探測歷史：緊湊的追加寫入日誌"""
+import ipaddress
+import logging
+import os
+import struct
+import threading
+import time
+from array import array
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+from . import config
+
+logger = logging.getLogger(__name__)
+
+# 記錄類型
+KIND_TRANSITION = 1
+KIND_HEARTBEAT = 2
+
+# 記錄頭：長度(u16) 時間戳(u32) 網域ID(u32) 狀態ID(u32) 類型(u8) 解析器數(u8)
+# 狀態、解析器、分類與網域共用字符串表，ID 須與網域 ID 同寬
+_HEADER = struct.Struct("<HIIIBB")
+# 解析器項：解析器ID(u32) 分類ID(u32) IP 數(u8)，其後為 IP（長度 u8 + 打包位元組）
+_ENTRY = struct.Struct("<IIB")
+# 單個解析器記錄的 IP 上限（IP 數字段為 u8），超出部分按排序截斷
+_MAX_IPS = 255
+# 舊格式（v1，.bin）：狀態/解析器/分類 ID 為 u16，字符串表超過 65535 項後無法寫入，載入時轉換為 v2
+_HEADER_V1 = struct.Struct("<HIIHBB")
+_ENTRY_V1 = struct.Struct("<HHB")
+
+# 記錄狀態簽名：(狀態, ((解析器, 分類, (IP...)), ...))
+Signature = Tuple[str, Tuple[Tuple[str, str, Tuple[str, ...]], ...]]
+
+
+def _signature(result: Dict) -> Signature:
+    entries = tuple(sorted(
+        (r.get("resolver", ""), r.get("category", ""), tuple(sorted(r.get("ips", []))[:_MAX_IPS]))
+        for r in result.get("tw", [])
+    ))
+    return result.get("status", ""), entries
+
+
+def _pack_ip(ip: str) -> bytes:
+    try:
+        packed = ipaddress.ip_address(ip).packed
+    except ValueError:
+        packed = b""
+    return bytes((len(packed),)) + packed
+
+
+class HistoryLog:
+    """
+    按網域記錄探測結果變化
+
+    - 字符串（網域、解析器、狀態、分類）駐留為整數 ID，保存在 .ids 文件（每行一個）
+    - 記錄追加寫入 .bin 文件，IP 以打包位元組保存
+    - 僅在狀態變化（transition）或超過心跳間隔（heartbeat）時記錄
+    - 內存中保存每個網域的記錄偏移，讀取單個網域歷史無需掃描全文件
+    - compact() 按保留策略降採樣舊心跳並刪除過期記錄
+    """
+
+    def __init__(self, directory: str, name: str = "probe_history"):
+        self._bin_path = Path(directory) / f"{name}.v2.bin"
+        self._legacy_bin_path = Path(directory) / f"{name}.bin"
+        self._ids_path = Path(directory) / f"{name}.ids"
+        self._lock = threading.Lock()
+        self._compact_lock = threading.Lock()
+        # 串行化文件追加（不持有 _lock，避免寫盤時阻塞事件循環中的 record）
+        self._write_lock = threading.Lock()
+        self._loaded = False
+        # 字符串駐留表
+        self._strings: List[str] = []
+        self._string_ids: Dict[str, int] = {}
+        self._unsaved_strings: List[str] = []
+        # 網域 ID -> 記錄位置（offset << 16 | length）
+        self._index: Dict[int, array] = {}
+        # 網域 -> (最後記錄的簽名, 時間戳)
+        self._last: Dict[str, Tuple[Signature, int]] = {}
+        # 尚未寫入文件的記錄：(網域ID, 編碼後記錄)
+        self._pending: List[Tuple[int, bytes]] = []
+        # 正在寫入文件、尚未加入索引的記錄（供 read 讀取）
+        self._writing: List[Tuple[int, bytes]] = []
+        self._size = 0
+        self._last_compact = time.monotonic()
+        self.appended = 0
+
+    # ---------- 載入 ----------
+
+    def load(self):
+        """載入字符串表並建立索引（啟動時在線程中調用，避免首次記錄時阻塞事件循環）"""
+        with self._lock:
+            self._ensure_loaded()
+
+    def _ensure_loaded(self):
+        """首次使用時載入字符串表並掃描記錄建立索引（需持有 _lock）"""
+        if self._loaded:
+            return
+        self._loaded = True
+        if self._ids_path.exists():
+            with open(self._ids_path, "r", encoding="utf-8") as f:
+                self._strings = f.read().split("\n")[:-1]
+            self._string_ids = {s: i for i, s in enumerate(self._strings)}
+        if not self._bin_path.exists() and self._legacy_bin_path.exists():
+            self._convert_legacy()
+        if self._bin_path.exists():
+            self._rebuild_index()
+
+    def _convert_legacy(self):
+        """將 v1 日誌轉換為 v2（字符串表不變，僅加寬記錄中的 ID 字段）；舊文件保留，確認無誤後可刪除"""
+        with open(self._legacy_bin_path, "rb") as f:
+            data = f.read()
+        converted = bytearray()
+        offset = count = 0
+        while offset + _HEADER_V1.size <= len(data):
+            length, ts, domain_id, status_id, kind, n_entries = _HEADER_V1.unpack_from(data, offset)
+            if length < _HEADER_V1.size or offset + length > len(data):
+                break
+            body = bytearray()
+            pos = offset + _HEADER_V1.size
+            for _ in range(n_entries):
+                resolver_id, category_id, n_ips = _ENTRY_V1.unpack_from(data, pos)
+                pos += _ENTRY_V1.size
+                ips_start = pos
+                for _ in range(n_ips):
+                    pos += 1 + data[pos]
+                body += _ENTRY.pack(resolver_id, category_id, n_ips) + data[ips_start:pos]
+            converted += _HEADER.pack(_HEADER.size + len(body), ts, domain_id, status_id, kind, n_entries) + body
+            offset += length
+            count += 1
+        tmp_path = self._bin_path.with_name(self._bin_path.name + ".tmp")
+        with open(tmp_path, "wb") as f:
+            f.write(converted)
+        os.replace(tmp_path, self._bin_path)
+        logger.info(f"[history] 已將 {self._legacy_bin_path.name} 的 {count} 條記錄轉換為 {self._bin_path.name}，舊文件可刪除")
+
+    def _rebuild_index(self):
+        self._index = {}
+        self._last = {}
+        with open(self._bin_path, "rb") as f:
+            data = f.read()
+        end = 0
+        for offset, length, _, domain_id, _ in self._scan(data):
+            record = self._decode(data[offset:offset + length])
+            self._index.setdefault(domain_id, array("Q")).append(offset << 16 | length)
+            self._last[self._strings[domain_id]] = (record["signature"], record["ts"])
+            end = offset + length
+        self._size = end
+        if end < len(data):
+            # 截斷的尾部記錄（寫入中途崩潰），丟棄
+            logger.warning(f"[history] {self._bin_path.name} 在偏移 {end} 處截斷")
+            with open(self._bin_path, "r+b") as f:
+                f.truncate(end)
+
+    # ---------- 編碼 ----------
+
+    def _intern(self, s: str) -> int:
+        """獲取字符串 ID，新字符串待下次 flush 寫入（需持有 _lock）"""
+        sid = self._string_ids.get(s)
+        if sid is None:
+            sid = len(self._strings)
+            self._strings.append(s)
+            self._string_ids[s] = sid
+            self._unsaved_strings.append(s)
+        return sid
+
+    def _encode(self, domain_id: int, ts: int, kind: int, signature: Signature) -> bytes:
+        status, entries = signature
+        body = bytearray()
+        for resolver, category, ips in entries:
+            body += _ENTRY.pack(self._intern(resolver), self._intern(category), len(ips))
+            for ip in ips:
+                body += _pack_ip(ip)
+        length = _HEADER.size + len(body)
+        return _HEADER.pack(length, ts, domain_id, self._intern(status), kind, len(entries)) + body
+
+    def _decode(self, data: bytes) -> Dict:
+        _, ts, domain_id, status_id, kind, count = _HEADER.unpack_from(data, 0)
+        offset = _HEADER.size
+        entries = []
+        for _ in range(count):
+            resolver_id, category_id, n_ips = _ENTRY.unpack_from(data, offset)
+            offset += _ENTRY.size
+            ips = []
+            for _ in range(n_ips):
+                size = data[offset]
+                packed = data[offset + 1:offset + 1 + size]
+                offset += 1 + size
+                ips.append(str(ipaddress.ip_address(packed)) if size else "")
+            entries.append((self._strings[resolver_id], self._strings[category_id], tuple(ips)))
+        return {
+            "ts": ts,
+            "domain_id": domain_id,
+            "kind": kind,
+            "signature": (self._strings[status_id], tuple(entries))
+        }
+
+    # ---------- 寫入 ----------
+
+    def record(self, domain: str, result: Dict, ts: Optional[int] = None) -> bool:
+        """
+        記錄一次判定結果（狀態變化或到達心跳間隔時才寫入）
+        返回是否產生了新記錄
+        """
+        ts = int(ts if ts is not None else time.time())
+        signature = _signature(result)
+        with self._lock:
+            self._ensure_loaded()
+            last = self._last.get(domain)
+            if last is None or last[0] != signature:
+                kind = KIND_TRANSITION
+            elif ts - last[1] >= config.HISTORY_HEARTBEAT_INTERVAL:
+                kind = KIND_HEARTBEAT
+            else:
+                return False
+            domain_id = self._intern(domain)
+            try:
+                data = self._encode(domain_id, ts, kind, signature)
+            except struct.error as e:
+                # 記錄長度（u16）或解析器數（u8）超出範圍，不影響探測流程
+                logger.warning(f"[history] {domain} 的記錄過大，已略過: {e}")
+                return False
+            self._pending.append((domain_id, data))
+            self._last[domain] = (signature, ts)
+            self.appended += 1
+            return True
+
+    def flush(self) -> int:
+        """將待寫入記錄追加到文件，返回寫入條數（_lock 內只交換緩衝區，寫盤在鎖外進行）"""
+        with self._write_lock:
+            with self._lock:
+                self._ensure_loaded()
+                strings, self._unsaved_strings = self._unsaved_strings, []
+                pending, self._pending = self._pending, []
+                self._writing = pending
+            try:
+                if strings:
+                    # 字符串表先於引用它的記錄落盤
+                    with open(self._ids_path, "a", encoding="utf-8") as f:
+                        f.write("".join(s + "\n" for s in strings))
+                if pending:
+                    with open(self._bin_path, "ab") as f:
+                        f.write(b"".join(data for _, data in pending))
+            except Exception:
+                with self._lock:
+                    self._unsaved_strings = strings + self._unsaved_strings
+                    self._pending = pending + self._pending
+                    self._writing = []
+                raise
+            with self._lock:
+                for domain_id, data in pending:
+                    self._index.setdefault(domain_id, array("Q")).append(self._size << 16 | len(data))
+                    self._size += len(data)
+                self._writing = []
+            return len(pending)
+
+    # ---------- 讀取 ----------
+
+    def read(self, domain: str, since_ts: int = 0, limit: Optional[int] = None) -> List[Dict]:
+        """讀取單個網域的歷史記錄（按時間升序）"""
+        with self._lock:
+            self._ensure_loaded()
+            domain_id = self._string_ids.get(domain)
+            if domain_id is None:
+                return []
+            raw = []
+            positions = self._index.get(domain_id, ())
+            if positions:
+                with open(self._bin_path, "rb") as f:
+                    fd = f.fileno()
+                    for pos in positions:
+                        raw.append(os.pread(fd, pos & 0xFFFF, pos >> 16))
+            raw.extend(data for did, data in self._writing if did == domain_id)
+            raw.extend(data for did, data in self._pending if did == domain_id)
+            records = [self._decode(data) for data in raw]
+
+        result = []
+        for rec in records:
+            if rec["ts"] < since_ts:
+                continue
+            status, entries = rec["signature"]
+            result.append({
+                "ts": rec["ts"],
+                "kind": "transition" if rec["kind"] == KIND_TRANSITION else "heartbeat",
+                "status": status,
+                "tw": [{"resolver": r, "category": c, "ips": list(ips)} for r, c, ips in entries]
+            })
+        if limit is not None:
+            result = result[-limit:]
+        return result
+
+    # ---------- 保留策略 ----------
+
+    def compaction_due(self) -> bool:
+        return time.monotonic() - self._last_compact >= config.HISTORY_COMPACT_INTERVAL
+
+    def compact(self, now: Optional[int] = None) -> Tuple[int, int]:
+        """
+        按保留策略重寫日誌：
+        - 超過 HISTORY_RETENTION_DAYS 的記錄刪除
+        - 超過 HISTORY_DOWNSAMPLE_AFTER_DAYS 的心跳按 HISTORY_DOWNSAMPLE_INTERVAL 降採樣（狀態變化全部保留）
+        重寫期間不阻塞 record/flush，期間追加的記錄在最後合併
+        返回 (保留條數, 刪除條數)
+        """
+        now = int(now if now is not None else time.time())
+        retention_cutoff = now - config.HISTORY_RETENTION_DAYS * 86400
+        downsample_cutoff = now - config.HISTORY_DOWNSAMPLE_AFTER_DAYS * 86400
+
+        with self._compact_lock:
+            with self._lock:
+                self._ensure_loaded()
+                self._last_compact = time.monotonic()
+                size = self._size
+            if not size:
+                return 0, 0
+            with open(self._bin_path, "rb") as f:
+                data = f.read(size)
+
+            kept = bytearray()
+            index: Dict[int, array] = {}
+            last_kept: Dict[int, int] = {}
+            dropped = 0
+            for offset, length, ts, domain_id, kind in self._scan(data):
+                if ts < retention_cutoff:
+                    dropped += 1
+                    continue
+                if (
+                    kind == KIND_HEARTBEAT and ts < downsample_cutoff
+                    and ts - last_kept.get(domain_id, 0) < config.HISTORY_DOWNSAMPLE_INTERVAL
+                ):
+                    dropped += 1
+                    continue
+                index.setdefault(domain_id, array("Q")).append(len(kept) << 16 | length)
+                last_kept[domain_id] = ts
+                kept += data[offset:offset + length]
+
+            tmp_path = self._bin_path.with_name(self._bin_path.name + ".tmp")
+            with open(tmp_path, "wb") as f:
+                f.write(kept)
+
+            with self._write_lock, self._lock:
+                # 合併壓縮期間新追加的記錄
+                with open(self._bin_path, "rb") as f:
+                    f.seek(size)
+                    tail = f.read(self._size - size)
+                base = len(kept)
+                for offset, length, _, domain_id, _ in self._scan(tail):
+                    index.setdefault(domain_id, array("Q")).append((base + offset) << 16 | length)
+                with open(tmp_path, "ab") as f:
+                    f.write(tail)
+                os.replace(tmp_path, self._bin_path)
+                self._index = index
+                self._size = base + len(tail)
+
+        kept_count = sum(len(v) for v in index.values())
+        logger.info(f"[history] 壓縮完成: 保留 {kept_count} 條, 刪除 {dropped} 條")
+        return kept_count, dropped
+
+    @staticmethod
+    def _scan(data: bytes):
+        """遍歷記錄頭：(偏移, 長度, 時間戳, 網域ID, 類型)"""
+        offset = 0
+        while offset + _HEADER.size <= len(data):
+            length, ts, domain_id, _, kind, _ = _HEADER.unpack_from(data, offset)
+            if length < _HEADER.size or offset + length > len(data):
+                break
+            yield offset, length, ts, domain_id, kind
+            offset += length
+
+
+# 全局探測歷史
+history_log = HistoryLog(config.HISTORY_DIR)
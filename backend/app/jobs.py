@@ -0,0 +1,221 @@
+"""分佈式探測：租約制任務分發（遠端探測節點拉取到期網域並回傳判定結果）"""
+import asyncio
+import itertools
+import logging
+import secrets
+import time
+from collections import deque
+from typing import Deque, Dict, List, Optional, Set, Tuple
+from . import config
+
+logger = logging.getLogger(__name__)
+
+
+class LeaseExpired(Exception):
+    """任務的租約多次過期仍未收到結果"""
+
+
+class _Job:
+    __slots__ = ("job_id", "domain", "force_trace", "previous_trace", "targets", "future",
+                 "lease_id", "leases", "worker", "expires_at", "attempts")
+
+    def __init__(self, job_id: int, domain: str, force_trace: bool, previous_trace: Optional[Dict],
+                 targets: Optional[Dict], future: asyncio.Future):
+        self.job_id = job_id
+        self.domain = domain
+        self.force_trace = force_trace
+        self.previous_trace = previous_trace
+        self.targets = targets
+        self.future = future
+        self.lease_id: Optional[str] = None
+        # 本任務發出過的所有租約 ID（過期租約的遲到結果同樣接受）
+        self.leases: Set[str] = set()
+        self.worker: Optional[str] = None
+        self.expires_at = 0.0
+        self.attempts = 0
+
+
+class LeaseManager:
+    """
+    租約制任務隊列
+
+    - 調度器派發的網域以 submit 入隊，等待遠端節點回傳結果
+    - 節點以 lease 批量領取任務，每個任務附帶租約 ID 與過期時間
+    - 租約過期仍未回傳的任務重新入隊（排在隊首），超過 max_attempts 次則以 LeaseExpired 結束
+    - 同一任務以先到的結果為準；過期租約的遲到結果只要任務仍未完成同樣接受
+    - 結果須帶有本任務發出過的租約 ID 且網域一致，否則丟棄（任務 ID 在協調節點重啟後從 1 重新編號，
+      節點重試的舊結果不能記到其他網域上）
+    """
+
+    def __init__(self, max_attempts: int):
+        self.max_attempts = max_attempts
+        self._ids = itertools.count(1)
+        self._ready: Deque[_Job] = deque()
+        # 任務ID -> 任務（包括待領取與已租出）
+        self._jobs: Dict[int, _Job] = {}
+        self._leased: Dict[int, _Job] = {}
+        self._wakeup: Optional[asyncio.Event] = None
+        # 節點 -> 最後一次領取/回傳的時間（time.time）
+        self._workers: Dict[str, float] = {}
+        # 統計
+        self.leased_total = 0
+        self.completed = 0
+        self.reissued = 0
+        self.expired = 0
+        self.stale = 0
+
+    def _event(self) -> asyncio.Event:
+        if self._wakeup is None:
+            self._wakeup = asyncio.Event()
+        return self._wakeup
+
+    # ---------- 調度器側 ----------
+
+    async def submit(
+        self,
+        domain: str,
+        force_trace: bool = False,
+        previous_trace: Optional[Dict] = None,
+        targets: Optional[Dict] = None
+    ) -> Tuple[Dict, bool]:
+        """
+        提交探測任務並等待遠端節點的結果
+
+        探測所需的網域狀態（上次追蹤結果、跳轉目標狀態）隨租約下發，節點不讀取本機網域列表
+
+        Returns:
+            (判定結果, 是否失效網域)
+        """
+        job = _Job(next(self._ids), domain, force_trace, previous_trace, targets, asyncio.get_running_loop().create_future())
+        self._jobs[job.job_id] = job
+        self._ready.append(job)
+        self._event().set()
+        try:
+            return await job.future
+        finally:
+            self._discard(job)
+
+    def _discard(self, job: _Job):
+        self._jobs.pop(job.job_id, None)
+        if self._leased.pop(job.job_id, None) is None and job.lease_id is None:
+            # 尚未領取即被取消（如調度器停止）
+            try:
+                self._ready.remove(job)
+            except ValueError:
+                pass
+
+    def reap(self, now: Optional[float] = None) -> int:
+        """將租約已過期的任務重新入隊，返回重新入隊數"""
+        now = now if now is not None else time.monotonic()
+        reissued = 0
+        for job in [j for j in self._leased.values() if j.expires_at <= now]:
+            del self._leased[job.job_id]
+            if job.attempts >= self.max_attempts:
+                self.expired += 1
+                self._jobs.pop(job.job_id, None)
+                if not job.future.done():
+                    job.future.set_exception(LeaseExpired(f"{job.domain} 租約過期 {job.attempts} 次"))
+                continue
+            logger.debug(f"[jobs] 租約過期，重新分發: {job.domain} (節點={job.worker}, 第 {job.attempts} 次)")
+            job.lease_id = None
+            self._ready.appendleft(job)
+            reissued += 1
+        if reissued:
+            self.reissued += reissued
+            self._event().set()
+        return reissued
+
+    # ---------- 節點側 ----------
+
+    async def lease(self, worker: str, limit: int, lease_seconds: float, wait: float = 0.0) -> List[Dict]:
+        """
+        領取最多 limit 個任務；隊列為空時最多等待 wait 秒（長輪詢）
+
+        Returns:
+            [{"job_id", "lease_id", "domain", "force_trace", "previous_trace", "targets"}]
+        """
+        self._workers[worker] = time.time()
+        deadline = time.monotonic() + wait
+        while True:
+            self.reap()
+            if self._ready:
+                break
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return []
+            event = self._event()
+            event.clear()
+            # 定期醒來檢查租約過期
+            try:
+                await asyncio.wait_for(event.wait(), min(remaining, 1.0))
+            except asyncio.TimeoutError:
+                pass
+
+        now = time.monotonic()
+        jobs = []
+        while self._ready and len(jobs) < limit:
+            job = self._ready.popleft()
+            job.lease_id = secrets.token_hex(8)
+            job.leases.add(job.lease_id)
+            job.worker = worker
+            job.expires_at = now + lease_seconds
+            job.attempts += 1
+            self._leased[job.job_id] = job
+            jobs.append({
+                "job_id": job.job_id,
+                "lease_id": job.lease_id,
+                "domain": job.domain,
+                "force_trace": job.force_trace,
+                "previous_trace": job.previous_trace,
+                "targets": job.targets
+            })
+        self.leased_total += len(jobs)
+        return jobs
+
+    def complete(self, worker: str, results: List[Dict]) -> Tuple[int, int]:
+        """
+        接收節點回傳的結果：[{"job_id", "lease_id", "verdict", "dead"}]
+        返回 (接受數, 丟棄數)；任務已完成或已不存在（如網域被刪除）、租約或網域不符時丟棄
+        """
+        self._workers[worker] = time.time()
+        accepted = 0
+        for item in results:
+            job = self._jobs.get(item.get("job_id"))
+            if job is None or job.future.done() or not item.get("verdict"):
+                continue
+            lease_id = item.get("lease_id")
+            if lease_id not in job.leases:
+                logger.warning(f"[jobs] 丟棄未知租約的結果: 任務 {job.job_id} ({job.domain}), 節點={worker}")
+                continue
+            if item["verdict"].get("domain", job.domain) != job.domain:
+                logger.warning(
+                    f"[jobs] 丟棄網域不符的結果: 任務 {job.job_id} 為 {job.domain}，"
+                    f"結果為 {item['verdict'].get('domain')} (節點={worker})"
+                )
+                continue
+            if lease_id != job.lease_id:
+                logger.debug(f"[jobs] 接受過期租約的結果: {job.domain} (節點={worker})")
+            self._leased.pop(job.job_id, None)
+            job.future.set_result((item["verdict"], bool(item.get("dead"))))
+            accepted += 1
+        dropped = len(results) - accepted
+        self.completed += accepted
+        self.stale += dropped
+        return accepted, dropped
+
+    def stats(self, worker_ttl: float = 300) -> Dict:
+        now = time.time()
+        return {
+            "queued": len(self._ready),
+            "leased": len(self._leased),
+            "workers": sorted(w for w, seen in self._workers.items() if now - seen <= worker_ttl),
+            "leased_total": self.leased_total,
+            "completed": self.completed,
+            "reissued": self.reissued,
+            "expired": self.expired,
+            "stale": self.stale
+        }
+
+
+# 全局任務租約（DISTRIBUTED_PROBING 開啟時使用）
+lease_manager = LeaseManager(config.JOB_LEASE_MAX_ATTEMPTS)
@@ -0,0 +1,184 @@
+"""按解析器的自適應並發控制（AIMD）"""
+import asyncio
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Deque, Dict, List, Optional
+from . import config
+
+
+class AdaptiveLimiter:
+    """
+    單個上游解析器的並發上限
+
+    每完成 AIMD_WINDOW 次查詢評估一次：
+    - 逾時率超過 AIMD_TIMEOUT_RATE_THRESHOLD：上限 × AIMD_DECREASE_FACTOR
+    - 無逾時且平均延遲低於 AIMD_LATENCY_HEALTHY_MS、且上限已被用滿：上限 + AIMD_INCREASE
+    """
+
+    def __init__(self, resolver: str, initial: float, min_limit: float, max_limit: float):
+        self.resolver = resolver
+        self.limit = float(initial)
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.in_flight = 0
+        self._waiters: Deque[asyncio.Future] = deque()
+        # 當前評估窗口
+        self._samples = 0
+        self._timeouts = 0
+        self._latency_sum = 0.0
+        self._peak_in_flight = 0
+        # 累計統計
+        self.total = 0
+        self.total_timeouts = 0
+        self.wait_timeouts = 0
+        self.increases = 0
+        self.decreases = 0
+        self.last_timeout_rate = 0.0
+        self.last_latency_ms = 0.0
+
+    # ---------- 槽位 ----------
+
+    async def acquire(self, timeout: Optional[float] = None) -> bool:
+        """等待槽位，最多等待 timeout 秒；超時返回 False（不計入 AIMD 樣本）"""
+        if self.in_flight < int(self.limit) and not self._waiters:
+            self.in_flight += 1
+            self._peak_in_flight = max(self._peak_in_flight, self.in_flight)
+            return True
+        future = asyncio.get_running_loop().create_future()
+        self._waiters.append(future)
+        try:
+            await asyncio.wait_for(asyncio.shield(future), timeout)
+        except asyncio.TimeoutError:
+            if future.done() and not future.cancelled():
+                # 超時的同時已分配到槽位，照常使用
+                self._peak_in_flight = max(self._peak_in_flight, self.in_flight)
+                return True
+            future.cancel()
+            try:
+                self._waiters.remove(future)
+            except ValueError:
+                pass
+            self.wait_timeouts += 1
+            return False
+        except asyncio.CancelledError:
+            if future.done() and not future.cancelled():
+                # 已分配到槽位但調用方被取消，歸還槽位
+                self._release_slot()
+            else:
+                try:
+                    self._waiters.remove(future)
+                except ValueError:
+                    pass
+            raise
+        self._peak_in_flight = max(self._peak_in_flight, self.in_flight)
+        return True
+
+    def _release_slot(self):
+        self.in_flight -= 1
+        self._wake()
+
+    def _wake(self):
+        while self._waiters and self.in_flight < int(self.limit):
+            future = self._waiters.popleft()
+            if not future.done():
+                self.in_flight += 1
+                future.set_result(None)
+
+    def release(self, latency_ms: float, timed_out: bool):
+        """歸還槽位並記錄一次查詢結果"""
+        self._release_slot()
+        self.total += 1
+        self._samples += 1
+        self._latency_sum += latency_ms
+        if timed_out:
+            self.total_timeouts += 1
+            self._timeouts += 1
+        if self._samples >= config.AIMD_WINDOW:
+            self._adjust()
+
+    @asynccontextmanager
+    async def slot(self, timeout: Optional[float] = None) -> AsyncIterator[Dict]:
+        """
+        占用一個槽位執行查詢，最多等待 timeout 秒
+
+        用法：async with limiter.slot(timeout) as outcome: if outcome["acquired"]: ...; outcome["timed_out"] = True
+        等待超時時 outcome["acquired"] 為 False，調用方不應發出查詢
+        """
+        if not await self.acquire(timeout):
+            yield {"acquired": False, "timed_out": True}
+            return
+        outcome = {"acquired": True, "timed_out": False}
+        start = time.perf_counter()
+        try:
+            yield outcome
+        finally:
+            self.release((time.perf_counter() - start) * 1000, outcome["timed_out"])
+
+    # ---------- 調整 ----------
+
+    def _adjust(self):
+        timeout_rate = self._timeouts / self._samples
+        latency_ms = self._latency_sum / self._samples
+        saturated = self._peak_in_flight >= int(self.limit)
+        self.last_timeout_rate = timeout_rate
+        self.last_latency_ms = latency_ms
+
+        if timeout_rate > config.AIMD_TIMEOUT_RATE_THRESHOLD:
+            self.limit = max(self.min_limit, self.limit * config.AIMD_DECREASE_FACTOR)
+            self.decreases += 1
+        elif self._timeouts == 0 and latency_ms < config.AIMD_LATENCY_HEALTHY_MS and saturated:
+            self.limit = min(self.max_limit, self.limit + config.AIMD_INCREASE)
+            self.increases += 1
+            self._wake()
+
+        self._samples = 0
+        self._timeouts = 0
+        self._latency_sum = 0.0
+        self._peak_in_flight = self.in_flight
+
+    def snapshot(self) -> Dict:
+        return {
+            "resolver": self.resolver,
+            "limit": int(self.limit),
+            "in_flight": self.in_flight,
+            "waiting": len(self._waiters),
+            "total": self.total,
+            "timeouts": self.total_timeouts,
+            "wait_timeouts": self.wait_timeouts,
+            "timeout_rate": round(self.last_timeout_rate, 4),
+            "avg_latency_ms": round(self.last_latency_ms, 1),
+            "increases": self.increases,
+            "decreases": self.decreases
+        }
+
+
+# 解析器 IP -> 並發控制
+_limiters: Dict[str, AdaptiveLimiter] = {}
+
+
+def initial_limit(resolver: str) -> int:
+    """初始並發上限：未配置時取探測並發數 × 該解析器查詢計劃的記錄類型數（即滿載時的需求）"""
+    initial = config.RESOLVER_CONCURRENCY_INITIAL
+    if not initial:
+        plan = config.RESOLVER_QUERY_PLANS.get(resolver) or config.DEFAULT_QUERY_PLAN
+        initial = config.MAX_CONCURRENCY * len(plan)
+    return min(max(initial, config.RESOLVER_CONCURRENCY_MIN), config.RESOLVER_CONCURRENCY_MAX)
+
+
+def get_limiter(resolver: str) -> AdaptiveLimiter:
+    limiter = _limiters.get(resolver)
+    if limiter is None:
+        limiter = AdaptiveLimiter(
+            resolver,
+            initial_limit(resolver),
+            config.RESOLVER_CONCURRENCY_MIN,
+            config.RESOLVER_CONCURRENCY_MAX
+        )
+        _limiters[resolver] = limiter
+    return limiter
+
+
+def snapshot_all() -> List[Dict]:
+    """所有解析器的當前並發上限（供監控）"""
+    return [limiter.snapshot() for limiter in _limiters.values()]
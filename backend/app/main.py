@@ -1,12 +1,18 @@
 """FastAPI 入口與後台調度"""
 import asyncio
+import json
 import logging
+import secrets
+import time
 from datetime import datetime, timezone
+from typing import Dict, List, Optional, Tuple
 from contextlib import asynccontextmanager
-from fastapi import FastAPI, Query, HTTPException, Path
+from fastapi import FastAPI, Depends, Header, Query, HTTPException, Path, Request, Response
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import PlainTextResponse, StreamingResponse
 
 from . import config
+from . import metrics
 
 # 配置調試日誌（在 config.py 中設置 LOG_LEVEL）
 logging.basicConfig(
@@ -20,157 +26,333 @@ logging.basicConfig(
 logger = logging.getLogger(__name__)
 
 from .domains import (
-    load_domains, get_all_domains, get_domain,
+    load_domains, get_all_domains, get_domain, count_domains, add_change_listener,
     add_domain, update_domain, delete_domain, batch_delete_domains,
-    update_note, toggle_reported, batch_set_reported
+    update_note, toggle_reported, batch_set_reported, registry, AutoEnrolBuffer
 )
-from .dns_probe import probe_domain, probe_domain_simple
-from .verdict import aggregate_verdict
+from .dns_probe import probe_domain, probe_domain_simple, is_dead_result
+from . import dns_udp
+from .redirect_trace import (
+    start_http_client, close_http_client, pool_stats, hop_cache,
+    TargetState, has_tw_resolve_failure, settle_connect_failure
+)
+from .domain_names import extract_root_domain
+from .dns_cache import baseline_cache
+from .history import history_log
+from .verdict import aggregate_verdict, is_throttled_verdict, trace_status_of
 from .store import store
+from .events import event_hub, Subscriber
+from .domain_index import domain_index, SORT_FIELDS
+from .domain_groups import group_index
+from .scheduler import ProbeScheduler, FailureBackoff
+from .workers import worker_pool
+from .check_cache import check_cache
+from .jobs import lease_manager
+from .cycle_stats import cycle_recorder
 from .schemas import (
-    StatusResponse, DomainSummary, DomainDetail, HealthResponse, CheckResponse,
-    DomainInfo, DomainListResponse, AddDomainRequest, UpdateDomainRequest,
+    StatusResponse, DomainSummary, DomainDetail, HealthResponse, CheckResponse, BatchCheckRequest,
+    DomainInfo, DomainListResponse, HistoryResponse, HistoryRecord, HistoryResolver, AddDomainRequest, UpdateDomainRequest,
     BatchDeleteRequest, UpdateNoteRequest, MessageResponse,
     ToggleReportedResponse, BatchDeleteResponse,
-    BatchSetReportedRequest, BatchSetReportedResponse
+    BatchSetReportedRequest, BatchSetReportedResponse,
+    LeaseRequest, LeaseResponse, LeasedJob, JobResultsRequest, JobResultsResponse
 )
 
 
-async def probe_loop():
-    """後台探測循環"""
-    from .domains import get_domain, auto_add_domain, extract_root_domain
+# 網域列表變更時遞增列表版本號
+add_change_listener(store.touch)
+
+# 失效網域退避狀態
+dead_backoff = FailureBackoff(config.DEAD_DOMAIN_BACKOFF_FACTOR, config.DEAD_DOMAIN_MAX_INTERVAL)
+
+# 跳轉鏈發現網域的收錄緩衝
+enrolment = AutoEnrolBuffer(
+    config.AUTO_ENROL_MAX_PER_CYCLE, config.AUTO_ENROL_MAX_PER_SOURCE, config.AUTO_ENROL_SEEN_MAX
+)
+
+
+def _initial_schedule(domain: str, domain_info: Dict, now: datetime) -> Tuple[float, float]:
+    """
+    根據 domains.json 中的上次探測時間計算首次排程
+    返回 (距離到期的秒數, 探測間隔)
+    """
+    # 異常/已封鎖域名使用較長間隔
+    interval = config.ABNORMAL_PROBE_INTERVAL if domain_info.get("polluted", False) else config.PROBE_INTERVAL
+    last_probe_str = domain_info.get("last_probe_at")
+    if not last_probe_str:
+        return 0.0, interval
+    try:
+        last_probe = datetime.fromisoformat(last_probe_str.replace("Z", "+00:00"))
+        elapsed = (now - last_probe).total_seconds()
+        return max(interval - elapsed, 0.0), interval
+    except Exception as e:
+        logger.warning(f"[調度] 時間解析失敗 {domain}: {e}")
+        return 0.0, interval
+
+
+def _trace_target_state(root_domain: str) -> TargetState:
+    """跳轉目標（根域名）的監控狀態，用於連線失敗時判定空解析"""
+    info = get_domain(root_domain)
+    if not info:
+        return None
+    return {
+        "polluted": info.get("polluted", True),
+        "resolve_failed": has_tw_resolve_failure((store.get(root_domain) or {}).get("tw"))
+    }
+
+
+def _trace_targets(domain: str, previous_trace: Dict) -> Dict[str, TargetState]:
+    """隨探測任務傳入的跳轉目標狀態：網域自身及上次跳轉鏈經過的根域名"""
+    from urllib.parse import urlparse
+    hosts = {domain}
+    for step in previous_trace.get("chain") or []:
+        hosts.add(urlparse(step.get("url", "")).netloc)
+    return {root: _trace_target_state(root) for root in {extract_root_domain(h) for h in hosts if h}}
+
+
+def _settle_trace(domain: str, verdict: Dict):
+    """判定探測時目標狀態未知的連線失敗（跳轉到隨任務傳入範圍以外的網域），並更新 trace_status"""
+    trace = verdict.get("redirect_trace")
+    if trace and settle_connect_failure(domain, trace, _trace_target_state, verdict.get("tw")):
+        verdict["trace_status"] = trace_status_of(verdict["baseline"]["ips"], trace)
+
+
+async def probe_one(domain: str, force_trace: bool = False) -> Optional[float]:
+    """探測單個網域並處理結果，返回下次探測間隔（秒）；force_trace 時忽略可沿用的追蹤結果"""
     from urllib.parse import urlparse
     
-    loop_count = 0
-    while True:
-        loop_count += 1
-        logger.info(f"========== 探測循環 #{loop_count} 開始 ==========")
+    # 背壓：落盤跟不上時暫停探測
+    await store.wait_for_capacity()
+    
+    logger.debug(f"[探測] 開始探測: {domain}")
+    started = time.perf_counter()
+    # 探測模塊不讀取網域列表與 store：上次追蹤結果與跳轉目標狀態由主進程取出，隨任務傳給子進程 / 遠端節點
+    previous_trace = (store.get(domain) or {}).get("redirect_trace") or {}
+    targets = _trace_targets(domain, previous_trace)
+    if config.DISTRIBUTED_PROBING:
+        verdict, dead = await lease_manager.submit(domain, force_trace, previous_trace, targets)
+    elif worker_pool.running:
+        verdict, dead = await worker_pool.probe(domain, force_trace, previous_trace, targets)
+    else:
+        result = await probe_domain(domain, force_trace=force_trace, previous_trace=previous_trace, targets=targets)
+        verdict = aggregate_verdict(result)
+        dead = is_dead_result(result)
+    if is_throttled_verdict(verdict):
+        # 本機限流導致部分解析器未查詢：不保存不完整的判定、不計入失效退避，稍後重新探測
+        metrics.PROBES.inc("throttled")
+        logger.debug(f"[探測] {domain} 等待解析器槽位超時，{config.THROTTLED_RETRY_INTERVAL} 秒後重新探測")
+        return config.THROTTLED_RETRY_INTERVAL
+    _settle_trace(domain, verdict)
+    # 主進程側的耗時只記入循環統計，不修改已交給 store（已版本化並推送）的判定結果
+    timings = dict(verdict.get("timings") or {})
+    store_start = time.perf_counter()
+    store.update(domain, verdict)
+    timings["store_ms"] = round((time.perf_counter() - store_start) * 1000, 3)
+    metrics.PROBES.inc(verdict.get("status", ""))
+    logger.debug(f"[探測] 探測完成: {domain}, 狀態={verdict.get('status')}")
+    
+    # 自動收錄跳轉追蹤中發現的新域名
+    redirect_trace = verdict.get("redirect_trace")
+    if redirect_trace:
+        # 更新域名組
+        from .domain_groups import extract_domains_from_trace, update_domain_group
+        group_start = time.perf_counter()
+        domains_in_chain = extract_domains_from_trace(domain, redirect_trace)
+        update_domain_group(domains_in_chain)
+        timings["group_ms"] = round((time.perf_counter() - group_start) * 1000, 3)
         
-        try:
-            domains = load_domains()
-            current_domains = set(domains)
-            now = datetime.now(timezone.utc)
-            
-            logger.info(f"[循環#{loop_count}] 從 domains.json 載入 {len(domains)} 個域名")
-            
-            # 清理已刪除的網域
-            store.clear_stale(current_domains)
-            
-            # 過濾需要探測的域名（異常域名使用較長間隔）
-            domains_to_probe = []
-            skipped_polluted = 0  # 因污染跳過的計數
+        chain = redirect_trace.get("chain", [])
+        for step in chain:
+            url = step.get("url", "")
+            if url:
+                try:
+                    parsed = urlparse(url)
+                    hostname = parsed.hostname
+                    if hostname:
+                        # 進入收錄緩衝，由 sync_schedule 批量寫入
+                        enrolment.offer(domain, hostname)
+                except Exception as e:
+                    logger.warning(f"[探測] 自動收錄異常: {url}, 錯誤={e}")
+    
+    # 含排隊等待（子進程 / 遠端節點）與落盤前處理的總耗時
+    timings["total_ms"] = round((time.perf_counter() - started) * 1000, 2)
+    cycle_recorder.record(timings, verdict.get("status"))
+    
+    # 持續失效的網域指數退避，任一解析器恢復應答即回到正常間隔
+    interval = dead_backoff.record(domain, dead, config.PROBE_INTERVAL)
+    if verdict.get("status") == "已污染":
+        return config.ABNORMAL_PROBE_INTERVAL
+    if interval > config.PROBE_INTERVAL:
+        logger.debug(f"[探測] {domain} 連續失效 {dead_backoff.streak(domain)} 次，下次間隔 {interval:.0f} 秒")
+    return interval
+
+
+def sync_schedule(scheduler: ProbeScheduler) -> int:
+    """將網域列表同步到調度器，返回新排程的網域數"""
+    # 先提交收錄緩衝，新網域在本次同步中排程
+    added = enrolment.commit()
+    if added:
+        logger.info(f"[探測] 自動收錄 {len(added)} 個新域名: {', '.join(added[:10])}{' ...' if len(added) > 10 else ''}")
+    
+    domains_data = get_all_domains()
+    current_domains = set(domains_data.keys())
+    
+    # 清理已刪除的網域
+    store.clear_stale(current_domains)
+    dead_backoff.retain(current_domains)
+    
+    new_domains = scheduler.sync(current_domains)
+    now = datetime.now(timezone.utc)
+    base = time.monotonic()
+    for domain in new_domains:
+        delay, interval = _initial_schedule(domain, domains_data[domain], now)
+        scheduler.schedule(domain, base + delay, interval)
+    return len(new_domains)
+
+
+# 運行中的探測調度器（手動重新追蹤經由調度器派發）
+_scheduler: Optional[ProbeScheduler] = None
+
+
+async def probe_loop():
+    """後台探測循環：調度器持續派發到期網域，本循環負責同步網域列表與循環統計"""
+    if config.DISTRIBUTED_PROBING:
+        # 分佈式模式下並發數即待領取與已租出的任務上限
+        concurrency = config.JOB_MAX_OUTSTANDING
+    else:
+        # 多進程模式下每個子進程各承擔 MAX_CONCURRENCY 個並發探測
+        concurrency = config.MAX_CONCURRENCY * max(worker_pool.workers if worker_pool.running else 1, 1)
+    global _scheduler
+    scheduler = _scheduler = ProbeScheduler(probe_one, concurrency, config.PROBE_INTERVAL)
+    runner = asyncio.create_task(scheduler.run())
+    # 調度器狀態在 /metrics 抓取時取值
+    metrics.SCHEDULED_DOMAINS.set_function(lambda: len(scheduler))
+    metrics.DUE_QUEUE_DEPTH.set_function(scheduler.overdue)
+    metrics.PROBES_IN_FLIGHT.set_function(scheduler.in_flight)
+    
+    loop_count = 0
+    try:
+        while True:
+            loop_count += 1
+            cycle_start = time.monotonic()
+            completed_before, failed_before = scheduler.completed, scheduler.failed
+            # 單跳緩存僅在本循環內有效
+            hop_cache.clear()
+            cycle_recorder.start(loop_count)
+            logger.info(f"========== 探測循環 #{loop_count} 開始 ==========")
             
-            for domain in domains:
-                domain_info = get_domain(domain)
-                if domain_info:
-                    last_probe_str = domain_info.get("last_probe_at")
-                    is_polluted = domain_info.get("polluted", False)
-                    
-                    # 異常/已封鎖域名使用較長間隔
-                    if is_polluted and last_probe_str:
-                        try:
-                            # 解析 ISO 時間
-                            last_probe = datetime.fromisoformat(last_probe_str.replace("Z", "+00:00"))
-                            elapsed = (now - last_probe).total_seconds()
-                            if elapsed < config.ABNORMAL_PROBE_INTERVAL:
-                                skipped_polluted += 1
-                                continue  # 跳過，尚未到探測時間
-                        except Exception as e:
-                            logger.warning(f"[循環#{loop_count}] 時間解析失敗 {domain}: {e}")
+            while True:
+                try:
+                    added = sync_schedule(scheduler)
+                    if added:
+                        logger.info(
+                            f"[循環#{loop_count}] 新排程 {added} 個域名，共 {len(scheduler)} 個，"
+                            f"派發速率={scheduler.rate:.2f}/秒，並發限制={concurrency}"
+                        )
+                except Exception as e:
+                    logger.error(f"[循環#{loop_count}] 同步網域列表失敗: {e}", exc_info=True)
                 
-                domains_to_probe.append(domain)
-            
-            logger.info(f"[循環#{loop_count}] 需探測: {len(domains_to_probe)}, 跳過(污染未到時間): {skipped_polluted}")
-            
-            # 並發探測（帶限制）
-            sem = asyncio.Semaphore(config.MAX_CONCURRENCY)
-            probe_success_count = 0
-            probe_error_count = 0
+                remaining = config.PROBE_INTERVAL - (time.monotonic() - cycle_start)
+                if remaining <= 0:
+                    break
+                await asyncio.sleep(min(config.SCHEDULER_SYNC_INTERVAL, remaining))
             
-            async def probe_with_limit(domain: str):
-                nonlocal probe_success_count, probe_error_count
-                async with sem:
-                    try:
-                        logger.debug(f"[循環#{loop_count}] 開始探測: {domain}")
-                        result = await probe_domain(domain)
-                        verdict = aggregate_verdict(result)
-                        store.update(domain, verdict)
-                        probe_success_count += 1
-                        logger.debug(f"[循環#{loop_count}] 探測完成: {domain}, 狀態={verdict.get('status')}")
-                        
-                        # 自動收錄跳轉追蹤中發現的新域名
-                        redirect_trace = verdict.get("redirect_trace")
-                        if redirect_trace:
-                            # 更新域名組
-                            from .domain_groups import extract_domains_from_trace, update_domain_group
-                            domains_in_chain = extract_domains_from_trace(domain, redirect_trace)
-                            update_domain_group(domains_in_chain)
-                            
-                            chain = redirect_trace.get("chain", [])
-                            for step in chain:
-                                url = step.get("url", "")
-                                if url:
-                                    try:
-                                        parsed = urlparse(url)
-                                        hostname = parsed.hostname
-                                        if hostname:
-                                            # www 收斂到根域名
-                                            root_domain = extract_root_domain(hostname)
-                                            if root_domain and root_domain not in current_domains:
-                                                added = auto_add_domain(hostname)
-                                                if added:
-                                                    logger.info(f"[循環#{loop_count}] 自動收錄新域名: {hostname} -> {root_domain}")
-                                                current_domains.add(root_domain)
-                                    except Exception as e:
-                                        logger.warning(f"[循環#{loop_count}] 自動收錄異常: {url}, 錯誤={e}")
-                    except Exception as e:
-                        probe_error_count += 1
-                        logger.error(f"[循環#{loop_count}] 探測異常: {domain}, 錯誤={e}", exc_info=True)
-            
-            # 執行並發探測
-            logger.info(f"[循環#{loop_count}] 開始並發探測 {len(domains_to_probe)} 個域名，並發限制={config.MAX_CONCURRENCY}")
-            results = await asyncio.gather(
-                *[probe_with_limit(d) for d in domains_to_probe],
-                return_exceptions=True
+            logger.info(
+                f"[循環#{loop_count}] 探測完成: 成功={scheduler.completed - completed_before}, "
+                f"錯誤={scheduler.failed - failed_before}, 待派發={scheduler.overdue()}, 進行中={scheduler.in_flight()}, "
+                f"退避中={len(dead_backoff)}, 未落盤={store.unpersisted_count()}"
+            )
+            if worker_pool.running:
+                worker_stats = worker_pool.stats()
+                logger.info(
+                    f"[循環#{loop_count}] 探測子進程: 存活={worker_stats['alive']}/{worker_stats['workers']}, "
+                    f"累計完成={worker_stats['completed']}, 重啟={worker_stats['respawns']}"
+                )
+            if config.DISTRIBUTED_PROBING:
+                job_stats = lease_manager.stats()
+                logger.info(
+                    f"[循環#{loop_count}] 分佈式探測: 節點={len(job_stats['workers'])}, 待領取={job_stats['queued']}, "
+                    f"已租出={job_stats['leased']}, 累計完成={job_stats['completed']}, "
+                    f"重新分發={job_stats['reissued']}, 放棄={job_stats['expired']}"
+                )
+            metrics.CYCLES.inc()
+            metrics.CYCLE_SECONDS.set(time.monotonic() - cycle_start)
+            summary = cycle_recorder.finish(
+                time.monotonic() - cycle_start,
+                scheduled=len(scheduler), overdue=scheduler.overdue(), in_flight=scheduler.in_flight()
+            )
+            phases = summary["phases_ms"]
+            if phases:
+                logger.info(
+                    f"[循環#{loop_count}] 階段耗時 p50/p99(ms): "
+                    + ", ".join(f"{name}={p['p50']:.0f}/{p['p99']:.0f}" for name, p in phases.items())
+                )
+            enrol_offered, enrol_rejected = enrolment.reset_cycle()
+            if enrol_offered:
+                logger.info(f"[循環#{loop_count}] 自動收錄: 候選={enrol_offered}, 超出配額={enrol_rejected}")
+            http_stats = pool_stats.snapshot(reset=True)
+            hop_stats = hop_cache.stats(reset=True)
+            logger.info(
+                f"[循環#{loop_count}] 跳轉追蹤: 請求={http_stats['requests']}, "
+                f"新建連接={http_stats['new_connections']}, 連接復用率={http_stats['reuse_rate']:.1%}, "
+                f"單跳緩存命中={hop_stats['hits']}({hop_stats['hit_rate']:.1%})"
+            )
+            cache_stats = baseline_cache.stats()
+            logger.info(
+                f"[循環#{loop_count}] 基準緩存: 條目={cache_stats['entries']}, "
+                f"命中={cache_stats['hits']}(否定={cache_stats['negative_hits']}), 未命中={cache_stats['misses']}, 命中率={cache_stats['hit_rate']:.1%}"
             )
             
-            # 檢查 gather 結果中的異常
-            exception_count = sum(1 for r in results if isinstance(r, Exception))
-            if exception_count > 0:
-                logger.warning(f"[循環#{loop_count}] gather 返回 {exception_count} 個異常")
-                for i, r in enumerate(results):
-                    if isinstance(r, Exception):
-                        logger.error(f"[循環#{loop_count}] 任務 {i} 異常: {r}")
-            
-            # 批量寫入待處理的更新到 domains.json
-            try:
-                flushed = store.flush_pending()
-                if flushed > 0:
-                    logger.info(f"[循環#{loop_count}] 批量寫入 {flushed} 條記錄到 domains.json")
-            except Exception as e:
-                logger.error(f"[循環#{loop_count}] 批量寫入失敗: {e}", exc_info=True)
-            
-            logger.info(f"[循環#{loop_count}] 探測完成: 成功={probe_success_count}, 錯誤={probe_error_count}, gather異常={exception_count}")
-            
-        except Exception as e:
-            logger.error(f"[循環#{loop_count}] 探測循環主體錯誤: {e}", exc_info=True)
-        
-        logger.info(f"========== 探測循環 #{loop_count} 結束，等待 {config.PROBE_INTERVAL} 秒 ==========")
-        await asyncio.sleep(config.PROBE_INTERVAL)
+            # 探測歷史降採樣
+            if history_log.compaction_due():
+                try:
+                    await asyncio.to_thread(history_log.compact)
+                except Exception as e:
+                    logger.error(f"[循環#{loop_count}] 探測歷史壓縮失敗: {e}", exc_info=True)
+            logger.info(f"========== 探測循環 #{loop_count} 結束 ==========")
+    finally:
+        _scheduler = None
+        runner.cancel()
+        try:
+            await runner
+        except asyncio.CancelledError:
+            pass
 
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     """應用生命週期管理"""
+    if config.DISTRIBUTED_PROBING and not config.WORKER_TOKEN:
+        raise RuntimeError("DISTRIBUTED_PROBING=1 時必須設置 WORKER_TOKEN")
+    # 共享 HTTP 連接池（重定向追蹤）
+    start_http_client()
+    # 載入探測歷史索引
+    await asyncio.to_thread(history_log.load)
+    # 建立網域列表索引
+    await asyncio.to_thread(domain_index.build)
+    # 多進程探測（PROBE_WORKERS > 0 且未開啟分佈式探測時）
+    if not config.DISTRIBUTED_PROBING:
+        worker_pool.start()
     # 啟動後台任務
+    flusher = asyncio.create_task(store.run_flusher())
     task = asyncio.create_task(probe_loop())
+    loop_monitor = asyncio.create_task(metrics.monitor_event_loop())
     yield
     # 關閉時取消任務
-    task.cancel()
-    try:
-        await task
-    except asyncio.CancelledError:
-        pass
+    for t in (task, flusher, loop_monitor):
+        t.cancel()
+        try:
+            await t
+        except asyncio.CancelledError:
+            pass
+    await asyncio.to_thread(worker_pool.stop)
+    await close_http_client()
+    dns_udp.close_all()
+    # 寫入尚未持久化的探測結果與網域變更
+    store.flush_pending()
+    registry.flush()
+    history_log.flush()
+    group_index.flush()
 
 
 app = FastAPI(
@@ -188,20 +370,170 @@ app.add_middleware(
 )
 
 
+metrics.UNPERSISTED.set_function(store.unpersisted_count)
+
+
+@app.get("/metrics", include_in_schema=False)
+async def prometheus_metrics():
+    """Prometheus 指標（文本格式）"""
+    return PlainTextResponse(metrics.registry.render(), media_type=metrics.CONTENT_TYPE)
+
+
 @app.get("/api/health", response_model=HealthResponse)
 async def health():
     """健康檢查"""
     return {"ok": True}
 
 
+def _domain_row(domain: str, info: Optional[Dict] = None, result: Optional[Dict] = None) -> Optional[Dict]:
+    """單個網域的當前狀態（推送事件與列表索引共用），網域不存在時返回 None"""
+    info = info if info is not None else get_domain(domain)
+    if info is None:
+        return None
+    # 探測結果以內存為準（domains.json 在背景批量寫入前會稍有延遲）
+    result = result if result is not None else store.get(domain) or {}
+    return {
+        "domain": domain,
+        "status": result.get("status", "待檢測"),
+        "reported": info.get("reported", False),
+        "polluted": result["status"] == "已污染" if "status" in result else info.get("polluted", False),
+        "note": info.get("note", ""),
+        "created_at": info.get("created_at", ""),
+        "last_probe_at": result.get("last_probe_at") or info.get("last_probe_at"),
+        "trace_status": result.get("trace_status") or info.get("trace_status")
+    }
+
+
+def _all_domain_rows():
+    results = store.get_all()
+    for domain, info in get_all_domains().items():
+        yield _domain_row(domain, info, results.get(domain, {}))
+
+
+def _domain_event(domain: str, removed: bool) -> Dict:
+    """推送事件內容：op=upsert 時附帶網域當前狀態"""
+    row = None if removed else _domain_row(domain)
+    if row is None:
+        return {"domain": domain, "op": "remove"}
+    return {"op": "upsert", **row}
+
+
+# 列表變更時更新索引並推送給 SSE 訂閱者
+domain_index.bind(_domain_row, _all_domain_rows)
+store.add_listener(domain_index.refresh)
+store.add_listener(event_hub.publish)
+
+
+def _list_params(
+    limit: Optional[int] = Query(None, ge=1, le=1000, description="每頁數量，指定後啟用分頁"),
+    cursor: Optional[str] = Query(None, description="上一頁返回的 next_cursor"),
+    sort: str = Query("domain", description="排序欄位：domain | created_at | last_probe_at"),
+    order: str = Query("asc", pattern="^(asc|desc)$", description="排序方向"),
+    status: Optional[str] = Query(None, description="按檢測狀態過濾"),
+    reported: Optional[bool] = Query(None, description="按已上報過濾"),
+    trace_status: Optional[str] = Query(None, description="按追蹤狀態過濾"),
+    q: Optional[str] = Query(None, description="網域或備註包含的文字"),
+    prefix: Optional[str] = Query(None, description="網域前綴")
+) -> Optional[Dict]:
+    """分頁/過濾/排序參數；均未指定時返回 None（全量列表）"""
+    filters = {k: v for k, v in (("status", status), ("reported", reported), ("trace_status", trace_status)) if v is not None}
+    if limit is None and cursor is None and sort == "domain" and order == "asc" and not filters and not q and not prefix:
+        return None
+    if sort not in SORT_FIELDS:
+        raise HTTPException(status_code=400, detail=f"不支持的排序欄位: {sort}")
+    return {
+        "limit": limit or config.LIST_PAGE_SIZE, "cursor": cursor, "sort": sort, "descending": order == "desc",
+        "filters": filters, "search": q.strip() if q else None, "prefix": prefix.strip().lower() if prefix else None
+    }
+
+
+def _reject_paged_delta(since: Optional[int], page: Optional[Dict]):
+    """增量同步（since）返回完整的變更集，不能與分頁/過濾/排序參數同時使用"""
+    if since is not None and page is not None:
+        raise HTTPException(status_code=400, detail="since 不能與分頁、過濾或排序參數同時使用")
+
+
+def _query_page(params: Dict) -> Tuple[List[Dict], int, Optional[str]]:
+    try:
+        return domain_index.query(**params)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+
+def _etag(version: int) -> str:
+    # 響應含生成時間戳，內容不逐位元組相同，使用弱 ETag；帶上 epoch，重啟後舊 ETag 不再命中
+    return f'W/"{store.epoch}-{version}"'
+
+
+def _not_modified(request: Request, etag: str) -> bool:
+    """If-None-Match 是否命中當前版本（弱比較）"""
+    header = request.headers.get("if-none-match")
+    if not header:
+        return False
+    tags = {t.strip().removeprefix("W/") for t in header.split(",")}
+    return "*" in tags or etag.removeprefix("W/") in tags
+
+
+def _versioned(request: Request, response: Response, version: int) -> Optional[Response]:
+    """設置版本快取頭；客戶端已持有當前版本時返回 304 響應"""
+    headers = {"ETag": _etag(version), "Cache-Control": "no-cache"}
+    if _not_modified(request, headers["ETag"]):
+        return Response(status_code=304, headers=headers)
+    response.headers.update(headers)
+    return None
+
+
+def _delta(since: Optional[int], epoch: Optional[str], exists) -> Tuple[Optional[List[str]], List[str]]:
+    """
+    計算 since 之後的增量
+    返回 (需返回的網域, 已刪除網域)；無法提供增量（含 epoch 不屬於本進程）時返回 (None, [])，調用方返回全量
+    """
+    changes = store.changes_since(since, epoch) if since is not None else None
+    if changes is None:
+        return None, []
+    changed, removed = changes
+    present = [d for d in changed if exists(d)]
+    removed = sorted(set(removed) | (set(changed) - set(present)))
+    return sorted(present), removed
+
+
 @app.get("/api/status", response_model=StatusResponse)
-async def status():
+async def status(
+    request: Request,
+    response: Response,
+    since: Optional[int] = Query(None, description="上次響應的 version，僅返回其後的變更"),
+    epoch: Optional[str] = Query(None, description="上次響應的 epoch，與 since 一同傳回"),
+    page: Optional[Dict] = Depends(_list_params)
+):
     """獲取網域狀態列表（舊版 API，保留相容性）"""
+    _reject_paged_delta(since, page)
+    # 先讀版本號：構建期間發生的變更會在下次同步時再次返回
+    version = store.version
+    not_modified = _versioned(request, response, version)
+    if not_modified is not None:
+        return not_modified
+    
+    if page is not None:
+        rows, total, next_cursor = _query_page(page)
+        return {
+            "timestamp": datetime.now(timezone.utc).isoformat(),
+            "interval_sec": config.PROBE_INTERVAL,
+            "domains": [DomainSummary(domain=r["domain"], status=r["status"], last_probe_at=r["last_probe_at"] or "") for r in rows],
+            "version": version,
+            "epoch": store.epoch,
+            "total": total,
+            "next_cursor": next_cursor,
+            "counts": domain_index.counts()
+        }
+    
     results = store.get_all()
-    domains_data = get_all_domains()
-    domains = []
+    names, removed = _delta(since, epoch, registry.contains)
+    full = names is None
+    if full:
+        names = sorted(get_all_domains().keys())
     
-    for domain in sorted(domains_data.keys()):
+    domains = []
+    for domain in names:
         probe_data = results.get(domain, {})
         domains.append(DomainSummary(
             domain=domain,
@@ -212,7 +544,95 @@ async def status():
     return {
         "timestamp": datetime.now(timezone.utc).isoformat(),
         "interval_sec": config.PROBE_INTERVAL,
-        "domains": domains
+        "domains": domains,
+        "version": version,
+        "epoch": store.epoch,
+        "full": full,
+        "removed": removed
+    }
+
+
+def _sse(event: str, data: Dict, event_id: Optional[str] = None) -> str:
+    head = f"id: {event_id}\n" if event_id is not None else ""
+    return f"{head}event: {event}\ndata: {json.dumps(data, ensure_ascii=False, separators=(',', ':'))}\n\n"
+
+
+async def _event_stream(request: Request, subscriber: Subscriber):
+    try:
+        yield "retry: 3000\n\n"
+        while True:
+            resync, items = await subscriber.drain(config.EVENTS_KEEPALIVE_INTERVAL)
+            if await request.is_disconnected():
+                break
+            if resync:
+                yield _sse("resync", {"version": store.version, "epoch": store.epoch})
+            for domain, version, removed in items:
+                yield _sse("domain", _domain_event(domain, removed), f"{store.epoch}-{version}")
+            if not resync and not items:
+                yield ": keepalive\n\n"
+    finally:
+        event_hub.unsubscribe(subscriber)
+
+
+@app.get("/api/events")
+async def events(
+    request: Request,
+    since: Optional[int] = Query(None, description="列表響應的 version，先補發其後的變更再推送實時事件"),
+    epoch: Optional[str] = Query(None, description="列表響應的 epoch，與 since 一同傳回")
+):
+    """
+    網域變更推送（SSE）
+
+    事件：
+    - domain：單個網域的當前狀態（op=upsert|remove），id 為 <epoch>-<變更版本號>
+    - resync：變更過多、版本過舊或服務已重啟（epoch 不符），客戶端需重新獲取全量列表
+    斷線重連時瀏覽器帶上 Last-Event-ID，從該版本續傳（同版本的事件會重發）
+    """
+    last_epoch, _, last_version = request.headers.get("last-event-id", "").rpartition("-")
+    if last_epoch and last_version.isdigit():
+        # 同一版本可能包含多個網域，從該版本起重發以免遺漏
+        since, epoch = int(last_version) - 1, last_epoch
+    
+    # 先訂閱再補發：期間的變更可能重複推送，但不會遺漏
+    subscriber = event_hub.subscribe(config.EVENTS_CLIENT_BUFFER)
+    if since is not None:
+        changes = store.changes_since(since, epoch)
+        if changes is None:
+            subscriber.request_resync()
+        else:
+            version = store.version
+            changed, removed = changes
+            for domain in reversed(changed):
+                subscriber.push(domain, version, False)
+            for domain in removed:
+                subscriber.push(domain, version, True)
+    
+    return StreamingResponse(
+        _event_stream(request, subscriber),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+
+@app.get("/api/debug/resolvers")
+async def resolver_limits():
+    """各解析器當前的自適應並發上限（監控用）"""
+    from .limiter import snapshot_all
+    
+    names = {**config.BASELINE_RESOLVERS, **config.TW_RESOLVERS}
+    return {
+        "timestamp": datetime.now(timezone.utc).isoformat(),
+        "resolvers": [{**item, "name": names.get(item["resolver"], "")} for item in snapshot_all()]
+    }
+
+
+@app.get("/api/debug/cycles")
+async def cycle_timings(limit: int = Query(10, ge=1, le=config.CYCLE_HISTORY)):
+    """最近探測循環的分階段耗時百分位（監控用），current 為進行中的循環"""
+    return {
+        "timestamp": datetime.now(timezone.utc).isoformat(),
+        "current": cycle_recorder.current(),
+        "cycles": cycle_recorder.recent(limit)
     }
 
 
@@ -226,11 +646,35 @@ async def detail(domain: str = Query(..., description="網域")):
     return DomainDetail(**data)
 
 
+@app.get("/api/history", response_model=HistoryResponse)
+async def history(
+    domain: str = Query(..., description="網域"),
+    days: int = Query(365, ge=1, description="查詢最近多少天"),
+    limit: Optional[int] = Query(None, ge=1, description="最多返回的記錄數（取最新）")
+):
+    """獲取網域的探測歷史（狀態變化與心跳）"""
+    since_ts = int(time.time()) - days * 86400
+    names = {**config.BASELINE_RESOLVERS, **config.TW_RESOLVERS}
+    records = history_log.read(domain, since_ts=since_ts, limit=limit)
+    
+    return HistoryResponse(
+        domain=domain,
+        records=[
+            HistoryRecord(
+                timestamp=datetime.fromtimestamp(rec["ts"], timezone.utc).isoformat(),
+                kind=rec["kind"],
+                status=rec["status"],
+                tw=[HistoryResolver(name=names.get(r["resolver"], ""), **r) for r in rec["tw"]]
+            )
+            for rec in records
+        ]
+    )
+
+
 @app.get("/api/related-domains")
 async def related_domains(domain: str = Query(..., description="網域")):
     """獲取某網域的相關網站列表"""
     from .domain_groups import get_related_domains
-    from .domains import extract_root_domain
     
     related = get_related_domains(domain)
     all_domains = get_all_domains()
@@ -252,55 +696,261 @@ async def related_domains(domain: str = Query(..., description="網域")):
     return {"domain": extract_root_domain(domain), "related": result}
 
 
-@app.get("/api/check", response_model=CheckResponse)
-async def check_domain(domain: str = Query(..., description="要檢測的網域")):
+@app.get("/api/check", response_model=CheckResponse, response_model_exclude_none=True)
+async def check_domain(
+    domain: str = Query(..., description="要檢測的網域"),
+    max_age: Optional[float] = Query(None, ge=0, description="可接受的結果最長時間（秒），0 表示強制重新探測")
+):
     """
     簡化版網域污染檢測 API（供 Orchestrator Worker 調用）
     
     - **domain**: 要檢測的網域
     - 返回 dns_ok/http_ok/latency_ms/status_code
     - 不做重定向追蹤，提升響應速度
+    - max_age 內的檢測結果或後台探測結果直接返回；同一網域的並發請求共享同一次探測
     """
+    fields, age, source = await _cached_check(domain.strip().lower(), _check_max_age(max_age))
+    return CheckResponse(**fields, source=source, age_sec=int(age))
+
+
+def _check_fields(verdict: Dict, latency_ms: Optional[float]) -> Dict:
+    """簡化版檢測的響應欄位；latency_ms 未知時省略"""
+    # DNS 是否正常：未污染/解析失敗 → dns_ok: true，已污染 → dns_ok: false
+    dns_ok = verdict["status"] in ("未污染", "解析失敗")
+    fields = {
+        "dns_ok": dns_ok,
+        "http_ok": dns_ok,  # 簡化：與 dns_ok 一致
+        "status_code": 200 if dns_ok else 0
+    }
+    if latency_ms is not None:
+        fields["latency_ms"] = int(latency_ms)
+    return fields
+
+
+def _check_max_age(max_age: Optional[float]) -> float:
+    return min(config.CHECK_CACHE_MAX_AGE if max_age is None else max_age, config.CHECK_CACHE_MAX_AGE_LIMIT)
+
+
+async def _probe_check(domain: str) -> Dict:
     result = await probe_domain_simple(domain)
     verdict = aggregate_verdict(result)
+    if is_throttled_verdict(verdict):
+        # 異常不進入檢測緩存
+        raise HTTPException(status_code=503, detail="解析器並發已滿，請稍後重試")
+    return {"status": verdict["status"], **_check_fields(verdict, result.get("latency_ms"))}
+
+
+def _stored_check(domain: str, max_age: float) -> Optional[Tuple[Dict, float]]:
+    """後台探測循環的結果（未超過 max_age 時），返回 (檢測結果, 已過秒數)"""
+    result = store.get(domain)
+    if not result or not result.get("last_probe_at"):
+        return None
+    age = max(time.time() - datetime.fromisoformat(result["last_probe_at"]).timestamp(), 0.0)
+    if age > max_age:
+        return None
+    # 保存的判定結果不含 latency_ms，取探測耗時（舊結果無 timings 時省略）
+    latency_ms = (result.get("timings") or {}).get("probe_ms")
+    return {"status": result["status"], **_check_fields(result, latency_ms)}, age
+
+
+async def _cached_check(domain: str, max_age: float, probe=_probe_check) -> Tuple[Dict, float, str]:
+    """檢測緩存 → 後台探測結果 → 進行中的同網域探測 → 新探測，返回 (檢測結果, 已過秒數, 來源)"""
+    return await check_cache.get(domain, max_age, probe, _stored_check)
+
+
+# 所有批量檢測請求共享的探測並發上限（在事件循環中惰性創建）
+_check_batch_slots: Optional[asyncio.Semaphore] = None
+
+
+def _ndjson(data: Dict) -> str:
+    return json.dumps(data, ensure_ascii=False, separators=(",", ":")) + "\n"
+
+
+async def _check_batch_stream(request: Request, domains: List[str], deadline: float, max_age: float):
+    """逐個輸出完成的檢測結果；到達截止時間時其餘網域以 deadline 錯誤結束，客戶端斷開時取消全部探測"""
+    global _check_batch_slots
+    if _check_batch_slots is None:
+        _check_batch_slots = asyncio.Semaphore(config.CHECK_BATCH_CONCURRENCY)
+    started = time.monotonic()
+    deadline_at = started + deadline
+    pending = iter(domains)
+    done: asyncio.Queue = asyncio.Queue()
     
-    # DNS 是否正常：未污染/解析失敗 → dns_ok: true，已污染 → dns_ok: false
-    dns_ok = verdict["status"] in ("未污染", "解析失敗")
+    async def probe(domain: str) -> Dict:
+        async with _check_batch_slots:
+            return await _probe_check(domain)
+    
+    async def worker():
+        for domain in pending:
+            try:
+                fields, age, source = await _cached_check(domain, max_age, probe)
+                line = {"domain": domain, **fields, "source": source, "age_sec": int(age)}
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                line = {"domain": domain, "error": str(e) or type(e).__name__}
+            await done.put(line)
+    
+    workers = [asyncio.create_task(worker()) for _ in range(min(config.CHECK_BATCH_CONCURRENCY, len(domains)))]
+    completed = failed = 0
+    finished = set()
+    try:
+        while len(finished) < len(domains):
+            remaining = deadline_at - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                # 定期醒來檢查客戶端是否斷開
+                line = await asyncio.wait_for(done.get(), min(remaining, 1.0))
+            except asyncio.TimeoutError:
+                if await request.is_disconnected():
+                    logger.info(f"[批量檢測] 客戶端已斷開，取消剩餘 {len(domains) - len(finished)} 個網域")
+                    return
+                continue
+            finished.add(line["domain"])
+            if "error" in line:
+                failed += 1
+            else:
+                completed += 1
+            yield _ndjson(line)
+        
+        timed_out = [d for d in domains if d not in finished]
+        for domain in timed_out:
+            yield _ndjson({"domain": domain, "error": "deadline"})
+        yield _ndjson({"summary": {
+            "total": len(domains),
+            "completed": completed,
+            "failed": failed,
+            "timed_out": len(timed_out),
+            "elapsed_ms": int((time.monotonic() - started) * 1000)
+        }})
+    finally:
+        for t in workers:
+            t.cancel()
+        await asyncio.gather(*workers, return_exceptions=True)
+
+
+@app.post("/api/check/batch")
+async def check_batch(req: BatchCheckRequest, request: Request):
+    """
+    批量簡化版檢測（NDJSON 串流）
+    
+    - 每完成一個網域輸出一行：domain/status/dns_ok/http_ok/latency_ms/status_code/source/age_sec，失敗時為 domain/error
+    - 結果緩存規則與 /api/check 相同（max_age）
+    - 截止時間（deadline 秒）內未完成的網域輸出 error=deadline
+    - 最後一行為 summary 統計；客戶端斷開連接時取消尚未完成的探測
+    """
+    domains = list(dict.fromkeys(d.strip().lower() for d in req.domains if d and d.strip()))
+    if not domains:
+        raise HTTPException(status_code=400, detail="網域列表為空")
+    if len(domains) > config.CHECK_BATCH_MAX_DOMAINS:
+        raise HTTPException(status_code=413, detail=f"單次最多檢測 {config.CHECK_BATCH_MAX_DOMAINS} 個網域")
+    deadline = min(req.deadline or config.CHECK_BATCH_DEADLINE, config.CHECK_BATCH_MAX_DEADLINE)
+    return StreamingResponse(
+        _check_batch_stream(request, domains, deadline, _check_max_age(req.max_age)),
+        media_type="application/x-ndjson",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+
+# ========== 分佈式探測 API ==========
+
+def _worker_auth(x_worker_token: str = Header("", description="探測節點令牌（WORKER_TOKEN）")):
+    # 未設置令牌時一律拒絕：/api/ 經 Nginx 對外暴露，否則任何人都可領取網域列表並回傳偽造的判定
+    if not config.WORKER_TOKEN:
+        raise HTTPException(status_code=503, detail="未設置 WORKER_TOKEN，探測節點接口已停用")
+    if not secrets.compare_digest(x_worker_token.encode(), config.WORKER_TOKEN.encode()):
+        raise HTTPException(status_code=401, detail="探測節點令牌無效")
+
+
+@app.post("/api/jobs/lease", response_model=LeaseResponse, dependencies=[Depends(_worker_auth)])
+async def lease_jobs(req: LeaseRequest):
+    """
+    探測節點領取到期網域（需開啟 DISTRIBUTED_PROBING）
     
-    return CheckResponse(
-        dns_ok=dns_ok,
-        http_ok=dns_ok,  # 簡化：與 dns_ok 一致
-        latency_ms=result.get("latency_ms", 0),
-        status_code=200 if dns_ok else 0
+    - 租約過期仍未回傳結果的任務會重新分發給其他節點
+    - wait > 0 時無任務則長輪詢等待
+    """
+    if not config.DISTRIBUTED_PROBING:
+        raise HTTPException(status_code=409, detail="未開啟分佈式探測")
+    lease_seconds = min(max(req.lease_seconds or config.JOB_LEASE_SECONDS, 1), config.JOB_LEASE_MAX_SECONDS)
+    jobs = await lease_manager.lease(
+        req.worker_id,
+        min(max(req.limit, 1), config.JOB_LEASE_MAX_BATCH),
+        lease_seconds,
+        min(max(req.wait, 0), config.JOB_LEASE_MAX_WAIT)
     )
+    return LeaseResponse(jobs=[LeasedJob(**job) for job in jobs], lease_seconds=lease_seconds)
+
+
+@app.post("/api/jobs/results", response_model=JobResultsResponse, dependencies=[Depends(_worker_auth)])
+async def submit_job_results(req: JobResultsRequest):
+    """探測節點批量回傳判定結果"""
+    accepted, dropped = lease_manager.complete(req.worker_id, [
+        {"job_id": r.job_id, "lease_id": r.lease_id, "verdict": r.verdict, "dead": r.dead} for r in req.results
+    ])
+    return JobResultsResponse(accepted=accepted, dropped=dropped)
+
+
+@app.get("/api/jobs/stats", dependencies=[Depends(_worker_auth)])
+async def job_stats():
+    """分佈式探測統計：隊列長度、活躍節點與重新分發次數"""
+    return {"enabled": config.DISTRIBUTED_PROBING, **lease_manager.stats()}
 
 
 # ========== 網域管理 API ==========
 
 @app.get("/api/domains", response_model=DomainListResponse)
-async def list_domains():
+async def list_domains(
+    request: Request,
+    response: Response,
+    since: Optional[int] = Query(None, description="上次響應的 version，僅返回其後的變更"),
+    epoch: Optional[str] = Query(None, description="上次響應的 epoch，與 since 一同傳回"),
+    page: Optional[Dict] = Depends(_list_params)
+):
     """獲取網域列表（含屬性）"""
-    domains_data = get_all_domains()
-    probe_results = store.get_all()
+    _reject_paged_delta(since, page)
+    # 先讀版本號：構建期間發生的變更會在下次同步時再次返回
+    version = store.version
+    not_modified = _versioned(request, response, version)
+    if not_modified is not None:
+        return not_modified
+    
+    if page is not None:
+        rows, total, next_cursor = _query_page(page)
+        return DomainListResponse(
+            timestamp=datetime.now(timezone.utc).isoformat(),
+            total=total,
+            domains=[DomainInfo(**{k: v for k, v in r.items() if k != "status"}) for r in rows],
+            version=version,
+            epoch=store.epoch,
+            next_cursor=next_cursor,
+            counts=domain_index.counts()
+        )
+    
+    names, removed = _delta(since, epoch, registry.contains)
+    if names is None:
+        items = sorted(get_all_domains().items())
+        total = len(items)
+    else:
+        items = [(d, info) for d, info in ((d, get_domain(d)) for d in names) if info is not None]
+        total = count_domains()
     
+    # 探測結果以內存為準：落盤到網域註冊表不再遞增版本號，不能依賴註冊表中的 polluted/trace_status/last_probe_at
+    results = store.get_all()
     domains = []
-    for domain, info in sorted(domains_data.items()):
-        probe_data = probe_results.get(domain, {})
-        
-        domains.append(DomainInfo(
-            domain=domain,
-            reported=info.get("reported", False),
-            polluted=info.get("polluted", False),
-            note=info.get("note", ""),
-            created_at=info.get("created_at", ""),
-            last_probe_at=info.get("last_probe_at"),
-            trace_status=info.get("trace_status")
-        ))
+    for domain, info in items:
+        row = _domain_row(domain, info, results.get(domain, {}))
+        domains.append(DomainInfo(**{k: v for k, v in row.items() if k != "status"}))
     
     return DomainListResponse(
         timestamp=datetime.now(timezone.utc).isoformat(),
-        total=len(domains),
-        domains=domains
+        total=total,
+        domains=domains,
+        version=version,
+        epoch=store.epoch,
+        full=names is None,
+        removed=removed
     )
 
 
@@ -370,6 +1020,28 @@ async def toggle_domain_reported(domain: str = Path(..., description="網域")):
     return ToggleReportedResponse(success=True, reported=new_status)
 
 
+@app.post("/api/domains/{domain:path}/retrace", response_model=DomainDetail)
+async def retrace_domain(domain: str = Path(..., description="網域")):
+    """
+    立即重新探測並強制重新追蹤跳轉（不沿用上次的追蹤結果）
+
+    經由調度器派發：與排程中的探測不會同時進行，探測結果照常決定下次探測間隔
+    """
+    if not registry.contains(domain):
+        raise HTTPException(status_code=404, detail="網域不存在")
+    if _scheduler is None:
+        raise HTTPException(status_code=503, detail="探測調度器未啟動")
+    try:
+        # 請求斷開不取消已排入的探測
+        await asyncio.shield(_scheduler.probe_now(domain, force_trace=True))
+    except LookupError:
+        raise HTTPException(status_code=404, detail="網域不存在")
+    result = store.get(domain)
+    if result is None:
+        raise HTTPException(status_code=503, detail="探測未完成，請稍後重試")
+    return DomainDetail(**result)
+
+
 @app.post("/api/domains/batch-reported", response_model=BatchSetReportedResponse)
 async def batch_set_domain_reported(req: BatchSetReportedRequest):
     """批量設置上報狀態"""
@@ -0,0 +1,202 @@
+"""輕量 Prometheus 指標（計數器、儀表、直方圖與文本格式輸出）"""
+import asyncio
+import math
+import time
+from bisect import bisect_left
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+LabelValues = Tuple[str, ...]
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    parts = [f'{n}="{_escape(str(v))}"' for n, v in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+def _format_value(value: float) -> str:
+    if math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    if value == int(value) and abs(value) < 1e15:
+        return str(int(value))
+    return repr(value)
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, help_text: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.help = help_text
+        self.labelnames = tuple(labelnames)
+        registry.register(self)
+
+    def _samples(self) -> List[str]:
+        raise NotImplementedError
+
+    def render(self) -> str:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+        lines += self._samples()
+        return "\n".join(lines)
+
+
+class Counter(_Metric):
+    """單調遞增計數器：inc(*標籤值, amount=數量)"""
+    kind = "counter"
+
+    def __init__(self, name: str, help_text: str, labelnames: Sequence[str] = ()):
+        super().__init__(name, help_text, labelnames)
+        self._values: Dict[LabelValues, float] = {}
+
+    def inc(self, *labels: str, amount: float = 1):
+        self._values[labels] = self._values.get(labels, 0) + amount
+
+    def _samples(self) -> List[str]:
+        return [
+            f"{self.name}{_format_labels(self.labelnames, labels)} {_format_value(v)}"
+            for labels, v in sorted(self._values.items())
+        ]
+
+
+class Gauge(_Metric):
+    """儀表：set(值, *標籤值)，或以 set_function 在輸出時取值（僅無標籤）"""
+    kind = "gauge"
+
+    def __init__(self, name: str, help_text: str, labelnames: Sequence[str] = ()):
+        super().__init__(name, help_text, labelnames)
+        self._values: Dict[LabelValues, float] = {}
+        self._function: Optional[Callable[[], float]] = None
+
+    def set(self, value: float, *labels: str):
+        self._values[labels] = value
+
+    def set_function(self, function: Optional[Callable[[], float]]):
+        self._function = function
+
+    def _samples(self) -> List[str]:
+        if self._function is not None:
+            try:
+                return [f"{self.name} {_format_value(float(self._function()))}"]
+            except Exception:
+                return []
+        return [
+            f"{self.name}{_format_labels(self.labelnames, labels)} {_format_value(v)}"
+            for labels, v in sorted(self._values.items())
+        ]
+
+
+class _HistogramChild:
+    __slots__ = ("counts", "sum")
+
+    def __init__(self, size: int):
+        self.counts = [0] * size
+        self.sum = 0.0
+
+
+class Histogram(_Metric):
+    """
+    直方圖：observe(值, *標籤值)
+
+    每個標籤組合保存各桶的（非累計）計數與總和，輸出時再累加，記錄只需一次二分查找
+    """
+    kind = "histogram"
+
+    def __init__(self, name: str, help_text: str, buckets: Sequence[float], labelnames: Sequence[str] = ()):
+        super().__init__(name, help_text, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        self._children: Dict[LabelValues, _HistogramChild] = {}
+
+    def observe(self, value: float, *labels: str):
+        child = self._children.get(labels)
+        if child is None:
+            child = self._children[labels] = _HistogramChild(len(self.buckets) + 1)
+        child.counts[bisect_left(self.buckets, value)] += 1
+        child.sum += value
+
+    def _samples(self) -> List[str]:
+        lines = []
+        for labels, child in sorted(self._children.items()):
+            cumulative = 0
+            for bound, count in zip((*self.buckets, math.inf), child.counts):
+                cumulative += count
+                le = 'le="' + _format_value(bound) + '"'
+                lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, labels, le)} {cumulative}")
+            lines.append(f"{self.name}_sum{_format_labels(self.labelnames, labels)} {_format_value(child.sum)}")
+            lines.append(f"{self.name}_count{_format_labels(self.labelnames, labels)} {cumulative}")
+        return lines
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self._metrics: List[_Metric] = []
+
+    def register(self, metric: _Metric):
+        self._metrics.append(metric)
+
+    def render(self) -> str:
+        return "\n".join(m.render() for m in self._metrics) + "\n"
+
+
+registry = MetricsRegistry()
+
+
+# ---------- 事件循環延遲 ----------
+
+async def monitor_event_loop(interval: float = 0.5):
+    """定期 sleep 並測量實際醒來時間與預期的差值（事件循環被阻塞的程度）"""
+    while True:
+        start = time.perf_counter()
+        await asyncio.sleep(interval)
+        lag = max(time.perf_counter() - start - interval, 0.0)
+        EVENT_LOOP_LAG.set(lag)
+        EVENT_LOOP_LAG_SECONDS.observe(lag)
+
+
+# ---------- 指標定義 ----------
+# 多進程探測（PROBE_WORKERS）或分佈式探測時，DNS 與跳轉追蹤指標只反映 API 進程內的探測
+
+_LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+RESOLVER_QUERY_SECONDS = Histogram(
+    "dnsrpz_resolver_query_seconds", "DNS query latency per resolver (cache misses only)",
+    _LATENCY_BUCKETS, ("resolver",)
+)
+RESOLVER_QUERIES = Counter(
+    "dnsrpz_resolver_queries_total", "DNS queries per resolver by outcome (ok/nxdomain/noanswer/timeout/error)",
+    ("resolver", "status")
+)
+PROBE_SECONDS = Histogram("dnsrpz_probe_seconds", "probe_domain wall time", _LATENCY_BUCKETS + (30,))
+PROBES = Counter("dnsrpz_probes_total", "Completed background probes by verdict status", ("status",))
+
+TRACE_SECONDS = Histogram("dnsrpz_trace_seconds", "Redirect trace wall time", (0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30))
+TRACE_HOPS = Histogram("dnsrpz_trace_hops", "Redirect chain length per trace", (0, 1, 2, 3, 4, 5, 7, 10))
+TRACE_HOP_SECONDS = Histogram("dnsrpz_trace_hop_seconds", "Single redirect hop request latency", _LATENCY_BUCKETS)
+TRACES = Counter("dnsrpz_traces_total", "Redirect traces by result (success/failure)", ("result",))
+
+CYCLE_SECONDS = Gauge("dnsrpz_cycle_duration_seconds", "Wall time of the last completed probe cycle")
+CYCLES = Counter("dnsrpz_cycles_total", "Completed probe cycles")
+SCHEDULED_DOMAINS = Gauge("dnsrpz_scheduled_domains", "Domains known to the scheduler")
+DUE_QUEUE_DEPTH = Gauge("dnsrpz_due_queue_depth", "Domains past their due time and not yet dispatched")
+PROBES_IN_FLIGHT = Gauge("dnsrpz_probes_in_flight", "Probes currently running")
+
+FLUSH_SECONDS = Histogram(
+    "dnsrpz_store_flush_seconds", "Background flush wall time (store, registry, history, groups)",
+    (0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1, 5)
+)
+FLUSH_BATCH_SIZE = Histogram(
+    "dnsrpz_store_flush_batch_size", "Probe results written per Store.flush_pending",
+    (1, 10, 50, 100, 500, 1000, 5000, 10000)
+)
+UNPERSISTED = Gauge("dnsrpz_store_unpersisted", "Results and domain changes not yet written to disk")
+
+EVENT_LOOP_LAG = Gauge("dnsrpz_event_loop_lag_last_seconds", "Most recent event loop lag sample")
+EVENT_LOOP_LAG_SECONDS = Histogram(
+    "dnsrpz_event_loop_lag_seconds", "Event loop lag samples", (0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1, 5)
+)
@@ -1,16 +1,270 @@
 """HTTP 跳轉追蹤模塊"""
+import asyncio
+import http.cookiejar
+import importlib.util
+import logging
+import time
 import httpx
-from typing import Dict, List, Optional
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Callable, Dict, List, Optional, Tuple
 from urllib.parse import urlparse
 from . import config
-from .domains import get_domain, extract_root_domain
-from .store import store
+from .domain_names import extract_root_domain
+from . import metrics
+
+logger = logging.getLogger(__name__)
+
+
+class PoolStats:
+    """共享連接池統計（按循環重置）"""
+    
+    def __init__(self):
+        self.requests = 0
+        self.new_connections = 0
+    
+    async def trace(self, event_name: str, info: Dict):
+        """httpcore trace 擴展回調：統計新建的 TCP 連接"""
+        if event_name == "connection.connect_tcp.complete":
+            self.new_connections += 1
+    
+    def snapshot(self, reset: bool = False) -> Dict:
+        """返回請求數、新建連接數與連接復用率"""
+        reused = max(self.requests - self.new_connections, 0)
+        stats = {
+            "requests": self.requests,
+            "new_connections": self.new_connections,
+            "reuse_rate": round(reused / self.requests, 4) if self.requests else 0.0
+        }
+        if reset:
+            self.requests = 0
+            self.new_connections = 0
+        return stats
+
+
+pool_stats = PoolStats()
+
+
+class HopCache:
+    """
+    跳轉請求緩存（按 URL）
+
+    - 已請求過的 URL 在 ttl 秒內直接返回狀態碼與 Location
+    - 連線失敗、逾時等錯誤同樣緩存並重新拋出，但只保留 error_ttl 秒，避免失敗結果長期沿用
+    - 並發追蹤同一 URL 時共享同一個進行中的請求，單個調用方被取消不影響其他等待者
+    - 過期條目在下次請求時替換；超過 max_entries 時淘汰最早的條目
+    - 主進程在探測循環開始時清空，探測子進程與遠端節點以 clear_every 按探測間隔清空
+    """
+    
+    def __init__(self, max_entries: int, ttl: float, error_ttl: float):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.error_ttl = error_ttl
+        # URL -> (請求任務, 過期時間 time.monotonic)
+        self._entries: Dict[str, Tuple[asyncio.Task, float]] = {}
+        self._cleared_at = time.monotonic()
+        self.hits = 0
+        self.misses = 0
+    
+    def __len__(self) -> int:
+        return len(self._entries)
+    
+    async def fetch(self, client: httpx.AsyncClient, url: str, timeout: float, refresh: bool = False) -> Tuple[int, str]:
+        """請求單跳，返回 (狀態碼, Location)；refresh 時忽略緩存重新請求並替換條目"""
+        now = time.monotonic()
+        entry = self._entries.get(url)
+        if refresh or entry is None or entry[1] <= now:
+            self.misses += 1
+            task = asyncio.ensure_future(self._request(client, url, timeout))
+            task.add_done_callback(lambda t: self._on_done(url, t))
+            # 重新插入到末尾，保持按插入順序淘汰
+            self._entries.pop(url, None)
+            self._entries[url] = (task, now + self.ttl)
+            while len(self._entries) > self.max_entries:
+                del self._entries[next(iter(self._entries))]
+        else:
+            self.hits += 1
+            task = entry[0]
+        return await asyncio.shield(task)
+    
+    def _on_done(self, url: str, task: asyncio.Task):
+        # 無人等待時（調用方均被取消）也取出異常，避免未處理異常警告
+        failed = task.cancelled() or task.exception() is not None
+        entry = self._entries.get(url)
+        if failed and entry is not None and entry[0] is task:
+            self._entries[url] = (task, min(entry[1], time.monotonic() + self.error_ttl))
+    
+    @staticmethod
+    async def _request(client: httpx.AsyncClient, url: str, timeout: float) -> Tuple[int, str]:
+        pool_stats.requests += 1
+        started = time.perf_counter()
+        try:
+            resp = await client.get(
+                url,
+                timeout=timeout,
+                extensions={"trace": pool_stats.trace}
+            )
+        finally:
+            metrics.TRACE_HOP_SECONDS.observe(time.perf_counter() - started)
+        return resp.status_code, resp.headers.get("location", "")
+    
+    def clear(self):
+        """清空緩存（進行中的請求繼續完成，已在等待的調用方不受影響）"""
+        self._entries.clear()
+        self._cleared_at = time.monotonic()
+    
+    def clear_every(self, interval: float) -> bool:
+        """距上次清空超過 interval 秒時清空（沒有探測循環的進程按探測間隔分窗），返回是否清空"""
+        if time.monotonic() - self._cleared_at < interval:
+            return False
+        self.clear()
+        return True
+    
+    def stats(self, reset: bool = False) -> Dict:
+        total = self.hits + self.misses
+        stats = {
+            "entries": len(self._entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / total, 4) if total else 0.0
+        }
+        if reset:
+            self.hits = 0
+            self.misses = 0
+        return stats
+
+
+hop_cache = HopCache(config.HOP_CACHE_MAX_ENTRIES, config.HOP_CACHE_TTL, config.HOP_CACHE_ERROR_TTL)
+
+# 由應用生命週期持有的共享客戶端
+_client: Optional[httpx.AsyncClient] = None
+
+
+def http_limits() -> httpx.Limits:
+    """按配置的連接池限制"""
+    return httpx.Limits(
+        max_connections=config.HTTP_MAX_CONNECTIONS,
+        max_keepalive_connections=config.HTTP_MAX_KEEPALIVE,
+        keepalive_expiry=config.HTTP_KEEPALIVE_EXPIRY
+    )
+
+
+def _new_client(transport: Optional[httpx.AsyncBaseTransport] = None) -> httpx.AsyncClient:
+    """按配置創建 HTTP 客戶端；傳入 transport 時由其負責連接（連接池限制需自行設置）"""
+    http2 = config.HTTP2_ENABLED
+    if http2 and importlib.util.find_spec("h2") is None:
+        logger.warning("[trace] 未安裝 h2，HTTP/2 已停用（pip install httpx[http2]）")
+        http2 = False
+    return httpx.AsyncClient(
+        follow_redirects=False,
+        verify=False,  # 忽略SSL证书错误
+        http2=http2,
+        # 共享客戶端不保存 Set-Cookie：避免 Cookie 無限累積並帶入其他網域的追蹤
+        cookies=http.cookiejar.CookieJar(policy=http.cookiejar.DefaultCookiePolicy(allowed_domains=[])),
+        limits=http_limits(),
+        transport=transport
+    )
+
+
+def start_http_client(transport: Optional[httpx.AsyncBaseTransport] = None) -> httpx.AsyncClient:
+    """創建共享 HTTP 客戶端（應用啟動時調用；transport 供離線基準測試替換網絡層）"""
+    global _client
+    if _client is None:
+        _client = _new_client(transport)
+    return _client
+
+
+async def close_http_client():
+    """關閉共享 HTTP 客戶端（應用關閉時調用）"""
+    global _client
+    if _client is not None:
+        client, _client = _client, None
+        await client.aclose()
+
+
+@asynccontextmanager
+async def _borrow_client() -> AsyncIterator[httpx.AsyncClient]:
+    """借用共享客戶端；未啟動時（如腳本直接調用）使用臨時客戶端"""
+    if _client is not None:
+        yield _client
+    else:
+        async with _new_client() as client:
+            yield client
+
+
+# 跳轉目標（根域名）的監控狀態：{"polluted": 是否已污染, "resolve_failed": 上次探測是否有台灣 DNS 解析失敗}
+# 不在監控列表的目標為 None
+TargetState = Optional[Dict]
+
+
+def has_tw_resolve_failure(tw_results: Optional[List[Dict]]) -> bool:
+    """台灣 DNS 結果中是否有解析失敗或逾時"""
+    return any(r.get("category", "") in ("解析失敗", "逾時") for r in tw_results or [])
+
+
+def connect_failure_outcome(
+    domain: str,
+    root_domain: str,
+    state: TargetState,
+    current_tw_results: Optional[List[Dict]] = None
+) -> Optional[str]:
+    """
+    跳轉目標連線失敗時的判定
+    
+    Returns:
+        "解析失敗"（台灣 DNS 解析失敗）| "空解析"（目標未污染且台灣 DNS 正常）| None（一般連線失敗）
+    """
+    if not state:
+        return None
+    # 目標是當前域名時使用本次探測的結果，否則使用目標上次的探測結果
+    if root_domain == extract_root_domain(domain) and current_tw_results:
+        resolve_failed = has_tw_resolve_failure(current_tw_results)
+    else:
+        resolve_failed = state.get("resolve_failed", False)
+    if resolve_failed:
+        return "解析失敗"
+    if not state.get("polluted", True):
+        return "空解析"
+    return None
+
+
+def settle_connect_failure(
+    domain: str,
+    trace: Dict,
+    target_state: Callable[[str], TargetState],
+    current_tw_results: Optional[List[Dict]] = None
+) -> bool:
+    """
+    由主進程判定探測時無法判定的連線失敗（目標不在隨任務傳入的狀態中），並移除待判定標記
+    
+    Returns:
+        追蹤結果是否改變
+    """
+    url = trace.pop("unsettled_url", None)
+    if not url:
+        return False
+    root_domain = extract_root_domain(urlparse(url).netloc)
+    outcome = connect_failure_outcome(domain, root_domain, target_state(root_domain), current_tw_results)
+    if outcome is None:
+        return False
+    trace["chain"][-1] = {"url": url, "status": outcome}
+    empty = outcome == "空解析"
+    trace.update(
+        final_url=url,
+        final_domain=urlparse(url).netloc,
+        success=empty,
+        trace_status="追蹤成功" if empty else "追蹤失敗",
+        error=None if empty else outcome,
+        is_empty_resolution=empty
+    )
+    return True
 
 
 async def trace_redirects(
     domain: str, 
     timeout: float = 10.0,
-    current_tw_results: Optional[List[Dict]] = None
+    current_tw_results: Optional[List[Dict]] = None,
+    refresh: bool = False,
+    targets: Optional[Dict[str, TargetState]] = None
 ) -> Dict:
     """
     追踪域名的HTTP重定向链
@@ -19,7 +273,13 @@ async def trace_redirects(
         domain: 要追踪的域名
         timeout: HTTP 請求超時
         current_tw_results: 當前域名的台灣 DNS 結果（用於判斷空解析）
+        refresh: 不使用單跳緩存，每跳重新請求並更新緩存（強制重新追蹤時使用）
+        targets: 可能的跳轉目標（根域名）的監控狀態，由主進程隨任務傳入；
+            連線失敗的目標不在其中時，結果帶 unsettled_url，交由 settle_connect_failure 判定
     """
+    started = time.perf_counter()
+    # 每跳耗時（毫秒，含等待共享請求的時間）
+    hop_ms: List[float] = []
     chain = []
     start_url = f"https://{domain}"
     final_url = None
@@ -28,27 +288,25 @@ async def trace_redirects(
     error_msg = None
     final_status_code = None
     is_empty_resolution = False
+    unsettled_url = None
     
     try:
-        async with httpx.AsyncClient(
-            follow_redirects=False,
-            timeout=timeout,
-            verify=False  # 忽略SSL证书错误
-        ) as client:
+        async with _borrow_client() as client:
             url = start_url
             max_redirects = config.MAX_REDIRECTS
             
             for _ in range(max_redirects):
+                hop_start = time.perf_counter()
                 try:
-                    resp = await client.get(url)
+                    status_code, location = await hop_cache.fetch(client, url, timeout, refresh)
+                    hop_ms.append(round((time.perf_counter() - hop_start) * 1000, 2))
                     chain.append({
                         "url": url,
-                        "status": resp.status_code
+                        "status": status_code
                     })
                     
                     # 判断是否为重定向
-                    if resp.status_code in (301, 302, 303, 307, 308):
-                        location = resp.headers.get("location", "")
+                    if status_code in (301, 302, 303, 307, 308):
                         if not location:
                             break
                         # 处理相对路径和 protocol-relative URL
@@ -64,10 +322,10 @@ async def trace_redirects(
                     else:
                         # 非重定向，记录最终状态
                         final_url = url
-                        final_status_code = resp.status_code
+                        final_status_code = status_code
                         
                         # 追踪成功判定：200/404 = 成功，其他 = 失敗
-                        if resp.status_code in (200, 404):
+                        if status_code in (200, 404):
                             success = True
                             trace_status = "追蹤成功"
                         else:
@@ -76,58 +334,38 @@ async def trace_redirects(
                         break
                         
                 except httpx.ConnectError:
-                    # 連線失敗，檢查目標域名的解析狀態
-                    parsed = urlparse(url)
-                    target_domain = parsed.netloc
-                    root_domain = extract_root_domain(target_domain) if target_domain else None
-                    current_root = extract_root_domain(domain)
+                    hop_ms.append(round((time.perf_counter() - hop_start) * 1000, 2))
+                    # 連線失敗，按目標域名的解析狀態判定是否為空解析
+                    root_domain = extract_root_domain(urlparse(url).netloc) or None
+                    if root_domain and targets is not None and root_domain in targets:
+                        outcome = connect_failure_outcome(domain, root_domain, targets[root_domain], current_tw_results)
+                    else:
+                        # 目標不在隨任務傳入的狀態中，由主進程以 settle_connect_failure 判定
+                        outcome = None
+                        unsettled_url = url if root_domain else None
                     
-                    # 檢查目標域名是否在監控列表且有探測記錄
-                    if root_domain:
-                        target_info = get_domain(root_domain)
-                        if target_info:
-                            # 判斷台灣 DNS 是否有解析失敗
-                            has_tw_resolve_failure = False
-                            tw_results_to_check = None
-                            
-                            # 如果目標是當前域名，使用傳入的結果
-                            if root_domain == current_root and current_tw_results:
-                                tw_results_to_check = current_tw_results
-                            else:
-                                # 否則從 store 獲取
-                                probe_result = store.get(root_domain)
-                                if probe_result:
-                                    tw_results_to_check = probe_result.get("tw")
-                            
-                            # 檢查台灣 DNS 結果
-                            if tw_results_to_check:
-                                for tw_result in tw_results_to_check:
-                                    category = tw_result.get("category", "")
-                                    if category in ("解析失敗", "逾時"):
-                                        has_tw_resolve_failure = True
-                                        break
-                            
-                            if has_tw_resolve_failure:
-                                # 台灣 DNS 解析失敗，不是空解析
-                                chain.append({"url": url, "status": "解析失敗"})
-                                error_msg = "解析失敗"
-                                trace_status = "追蹤失敗"
-                                final_url = url
-                                break
-                            elif not target_info.get("polluted", True):
-                                # 未污染且台灣 DNS 正常，視為空解析
-                                is_empty_resolution = True
-                                chain.append({"url": url, "status": "空解析"})
-                                success = True
-                                trace_status = "追蹤成功"
-                                final_url = url
-                                break
+                    if outcome == "解析失敗":
+                        # 台灣 DNS 解析失敗，不是空解析
+                        chain.append({"url": url, "status": "解析失敗"})
+                        error_msg = "解析失敗"
+                        trace_status = "追蹤失敗"
+                        final_url = url
+                        break
+                    if outcome == "空解析":
+                        # 未污染且台灣 DNS 正常，視為空解析
+                        is_empty_resolution = True
+                        chain.append({"url": url, "status": "空解析"})
+                        success = True
+                        trace_status = "追蹤成功"
+                        final_url = url
+                        break
                     
                     chain.append({"url": url, "status": 0})
                     error_msg = "連線失敗"
                     trace_status = "追蹤失敗"
                     break
                 except httpx.TimeoutException:
+                    hop_ms.append(round((time.perf_counter() - hop_start) * 1000, 2))
                     chain.append({"url": url, "status": 0})
                     error_msg = "逾時"
                     trace_status = "追蹤失敗"
@@ -147,6 +385,10 @@ async def trace_redirects(
         parsed = urlparse(final_url)
         final_domain = parsed.netloc
     
+    metrics.TRACE_SECONDS.observe(time.perf_counter() - started)
+    metrics.TRACE_HOPS.observe(len(chain))
+    metrics.TRACES.inc("success" if success else "failure")
+    
     return {
         "final_url": final_url,
         "final_domain": final_domain,
@@ -155,6 +397,8 @@ async def trace_redirects(
         "success": success,
         "trace_status": trace_status,
         "error": error_msg if not is_empty_resolution else None,
-        "is_empty_resolution": is_empty_resolution
+        "is_empty_resolution": is_empty_resolution,
+        "hop_ms": hop_ms,
+        **({"unsettled_url": unsettled_url} if unsettled_url else {})
     }
 
@@ -0,0 +1,249 @@
+"""截止時間最小堆探測調度器"""
+import asyncio
+import heapq
+import itertools
+import logging
+import time
+from typing import Awaitable, Callable, Dict, List, Optional, Set, Tuple
+
+logger = logging.getLogger(__name__)
+
+# 探測處理函數：接收網域與是否強制重新追蹤，返回下次探測間隔（秒），None 表示使用預設間隔
+ProbeHandler = Callable[[str, bool], Awaitable[Optional[float]]]
+
+
+class ProbeScheduler:
+    """
+    按網域截止時間調度探測
+
+    - 最小堆保存每個網域的下次到期時間，工作池持續從中取出到期網域
+    - 派發速率 = Σ(1 / 網域間隔)，探測均勻分佈在整個間隔內，避免突發查詢
+    - 每個網域可有自己的間隔（如異常網域使用 ABNORMAL_PROBE_INTERVAL）
+    - probe_now 將網域排到所有已到期網域之前（如手動重新追蹤），同一網域不會同時探測
+    """
+
+    def __init__(self, handler: ProbeHandler, concurrency: int, default_interval: float):
+        self._handler = handler
+        self._concurrency = concurrency
+        self._default_interval = default_interval
+        # (到期時間, 序號, 網域)；_due 中時間不一致的堆項視為已失效
+        self._heap: List[Tuple[float, int, str]] = []
+        self._seq = itertools.count()
+        self._due: Dict[str, float] = {}
+        self._intervals: Dict[str, float] = {}
+        self._rate = 0.0
+        self._running: Set[str] = set()
+        # probe_now 請求：強制重新追蹤的網域，以及等待下一次探測完成的調用方
+        self._forced: Set[str] = set()
+        self._waiters: Dict[str, List[asyncio.Future]] = {}
+        self._queue: Optional[asyncio.Queue] = None
+        self._wakeup = asyncio.Event()
+        self._last_dispatch = 0.0
+        # 統計
+        self.dispatched = 0
+        self.completed = 0
+        self.failed = 0
+
+    # ---------- 排程 ----------
+
+    @property
+    def rate(self) -> float:
+        """目標派發速率（次/秒）= Σ(1 / 網域間隔)"""
+        return max(self._rate, 0.0)
+
+    def __len__(self) -> int:
+        return len(self._intervals)
+
+    def __contains__(self, domain: str) -> bool:
+        return domain in self._intervals
+
+    def schedule(self, domain: str, due: float, interval: Optional[float] = None):
+        """設定網域的下次到期時間（time.monotonic 時基）"""
+        old = self._intervals.get(domain)
+        interval = interval or old or self._default_interval
+        self._intervals[domain] = interval
+        self._rate += 1.0 / interval - (1.0 / old if old else 0.0)
+        if domain in self._running:
+            # 探測中的網域在完成時重新排程
+            return
+        self._due[domain] = due
+        heapq.heappush(self._heap, (due, next(self._seq), domain))
+        self._wakeup.set()
+
+    def remove(self, domain: str):
+        """移除網域（堆中舊項惰性失效）"""
+        old = self._intervals.pop(domain, None)
+        if old:
+            self._rate -= 1.0 / old
+        self._due.pop(domain, None)
+        if domain not in self._running:
+            self._forced.discard(domain)
+            self._resolve(self._waiters.pop(domain, []), LookupError(f"網域已移除: {domain}"))
+
+    def probe_now(self, domain: str, force_trace: bool = False) -> asyncio.Future:
+        """
+        立即探測網域（排在所有已到期網域之前），返回下一次探測完成時完成的 Future
+
+        網域正在探測時，本次探測完成後立即再探測一次；force_trace 在該次探測中生效
+        """
+        future = asyncio.get_running_loop().create_future()
+        self._waiters.setdefault(domain, []).append(future)
+        if force_trace:
+            self._forced.add(domain)
+        if domain not in self._running:
+            self.schedule(domain, 0.0)
+        return future
+
+    @staticmethod
+    def _resolve(waiters: List[asyncio.Future], error: Optional[BaseException] = None):
+        for future in waiters:
+            if future.done():
+                continue
+            if error is None:
+                future.set_result(None)
+            else:
+                future.set_exception(error)
+
+    def sync(self, current: Set[str]) -> Set[str]:
+        """
+        與網域列表同步：移除已不在列表中的網域
+
+        Returns:
+            尚未排程的新網域（由調用方決定首次到期時間）
+        """
+        for domain in list(self._intervals):
+            if domain not in current:
+                self.remove(domain)
+        return {d for d in current if d not in self._intervals}
+
+    def overdue(self) -> int:
+        """已到期但尚未派發的網域數"""
+        now = time.monotonic()
+        return sum(1 for due in self._due.values() if due <= now)
+
+    def in_flight(self) -> int:
+        return len(self._running)
+
+    # ---------- 運行 ----------
+
+    def _pop_due(self) -> Optional[Tuple[float, str]]:
+        """彈出最早的有效堆項，不存在時返回 None"""
+        while self._heap:
+            due, _, domain = self._heap[0]
+            if self._due.get(domain) != due:
+                heapq.heappop(self._heap)
+                continue
+            return due, domain
+        return None
+
+    async def _dispatcher(self):
+        while True:
+            head = self._pop_due()
+            if head is None:
+                self._wakeup.clear()
+                await self._wakeup.wait()
+                continue
+
+            due, domain = head
+            rate = self.rate
+            gap = 1.0 / rate if rate > 0 else 0.0
+            # probe_now 的請求（due 為 0）不受派發速率限制
+            start_at = due if due <= 0 else max(due, self._last_dispatch + gap)
+            delay = start_at - time.monotonic()
+            if delay > 0:
+                # 等待期間可能有更早到期的網域加入，被喚醒後重新檢查
+                self._wakeup.clear()
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout=delay)
+                    continue
+                except asyncio.TimeoutError:
+                    pass
+                if self._due.get(domain) != due:
+                    continue
+
+            heapq.heappop(self._heap)
+            del self._due[domain]
+            self._running.add(domain)
+            self._last_dispatch = time.monotonic()
+            self.dispatched += 1
+            # 所有工作者忙碌時在此阻塞，形成背壓
+            await self._queue.put(domain)
+
+    async def _worker(self):
+        while True:
+            domain = await self._queue.get()
+            started = time.monotonic()
+            interval = None
+            # 本次探測承接此前的 probe_now 請求，之後到達的請求由下一次探測承接
+            waiters = self._waiters.pop(domain, [])
+            force_trace = domain in self._forced
+            self._forced.discard(domain)
+            error = None
+            try:
+                interval = await self._handler(domain, force_trace)
+                self.completed += 1
+            except asyncio.CancelledError:
+                self._resolve(waiters, RuntimeError("調度器已停止"))
+                raise
+            except Exception as e:
+                self.failed += 1
+                error = e
+                logger.error(f"[scheduler] 探測異常: {domain}, 錯誤={e}", exc_info=True)
+            finally:
+                self._running.discard(domain)
+                self._queue.task_done()
+            self._resolve(waiters, error)
+
+            if domain in self._intervals:
+                interval = interval or self._intervals[domain]
+                # 探測期間有新的 probe_now 請求時立即再探測
+                due = 0.0 if domain in self._waiters else started + interval
+                self.schedule(domain, due, interval)
+            else:
+                self._forced.discard(domain)
+                self._resolve(self._waiters.pop(domain, []), LookupError(f"網域已移除: {domain}"))
+
+    async def run(self):
+        """啟動派發器與工作池，直到被取消"""
+        self._queue = asyncio.Queue(maxsize=self._concurrency)
+        tasks = [asyncio.create_task(self._dispatcher())]
+        tasks += [asyncio.create_task(self._worker()) for _ in range(self._concurrency)]
+        try:
+            await asyncio.gather(*tasks)
+        finally:
+            for t in tasks:
+                t.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+
+
+class FailureBackoff:
+    """
+    連續失敗網域的指數退避
+
+    連續失敗 n 次後的間隔 = base × factor^(n-1)，不超過 max_interval；任一次成功即重置
+    """
+
+    def __init__(self, factor: float, max_interval: float):
+        self.factor = factor
+        self.max_interval = max_interval
+        self._streaks: Dict[str, int] = {}
+
+    def __len__(self) -> int:
+        return len(self._streaks)
+
+    def record(self, domain: str, failed: bool, base_interval: float) -> float:
+        """記錄一次探測結果，返回下次探測間隔"""
+        if not failed:
+            self._streaks.pop(domain, None)
+            return base_interval
+        streak = self._streaks.get(domain, 0) + 1
+        self._streaks[domain] = streak
+        return min(base_interval * self.factor ** (streak - 1), max(self.max_interval, base_interval))
+
+    def streak(self, domain: str) -> int:
+        return self._streaks.get(domain, 0)
+
+    def retain(self, current: Set[str]):
+        """移除已不在列表中的網域"""
+        for domain in [d for d in self._streaks if d not in current]:
+            del self._streaks[domain]
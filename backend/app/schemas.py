@@ -1,6 +1,6 @@
 """Pydantic 模型定義"""
-from typing import List, Optional, Union
-from pydantic import BaseModel
+from typing import Dict, List, Optional, Union
+from pydantic import BaseModel, Field
 
 
 class ResolverResult(BaseModel):
@@ -9,6 +9,8 @@ class ResolverResult(BaseModel):
     name: str
     status: str  # ok, nxdomain, timeout, error
     ips: List[str] = []
+    answers: Dict[str, List[str]] = {}  # 查詢計劃中各記錄類型的答案
+    cached: bool = False  # 是否全部來自緩存（僅基準解析器）
     msg: Optional[str] = None
 
 
@@ -45,6 +47,8 @@ class RedirectTrace(BaseModel):
     success: bool = False
     trace_status: Optional[str] = None  # 追蹤成功 | 追蹤異常
     error: Optional[str] = None
+    traced_at: Optional[float] = None  # 實際追蹤時間（Unix 時間戳）
+    reused: bool = False  # DNS 答案未變，沿用了上次的追蹤結果
 
 
 class DomainDetail(BaseModel):
@@ -56,6 +60,29 @@ class DomainDetail(BaseModel):
     tw: List[TwResolverResult]
     redirect_trace: Optional[RedirectTrace] = None
     last_probe_at: str
+    timings: Dict[str, Union[float, List[float]]] = {}  # 最近一次探測各階段耗時（毫秒，不含主進程的落盤與分組）
+
+
+class HistoryResolver(BaseModel):
+    """歷史記錄中單個台灣解析器的結果"""
+    resolver: str
+    name: str
+    category: str
+    ips: List[str] = []
+
+
+class HistoryRecord(BaseModel):
+    """單條探測歷史"""
+    timestamp: str
+    kind: str  # transition（狀態變化）| heartbeat（心跳）
+    status: str
+    tw: List[HistoryResolver]
+
+
+class HistoryResponse(BaseModel):
+    """網域探測歷史響應"""
+    domain: str
+    records: List[HistoryRecord]
 
 
 class StatusResponse(BaseModel):
@@ -63,6 +90,13 @@ class StatusResponse(BaseModel):
     timestamp: str
     interval_sec: int
     domains: List[DomainSummary]
+    total: Optional[int] = None  # 分頁模式下符合條件的總數
+    version: int = 0  # 列表版本號，下次請求以 ?since=&epoch= 傳回可獲取增量
+    epoch: str = ""  # 服務進程標識，與 version 一同傳回；進程重啟後不符，返回全量
+    full: bool = True  # False 表示增量：domains 僅含變更項
+    removed: List[str] = []  # 增量模式下已刪除的網域
+    next_cursor: Optional[str] = None  # 分頁模式下一頁游標，最後一頁為 None
+    counts: Dict[str, int] = {}  # 分頁模式下全列表統計（total、reported 及各狀態數）
 
 
 class HealthResponse(BaseModel):
@@ -74,8 +108,18 @@ class CheckResponse(BaseModel):
     """簡化版檢測響應（供 Orchestrator Worker 調用）"""
     dns_ok: bool  # DNS 是否正常（未被污染）
     http_ok: bool  # HTTP 是否可達（簡化為與 dns_ok 一致）
-    latency_ms: int  # 探測耗時（毫秒）
+    latency_ms: Optional[int] = None  # 探測耗時（毫秒）；後台探測結果缺少耗時記錄時省略
     status_code: int  # 固定返回 200 或 0
+    status: Optional[str] = None  # 已污染 | 未污染 | 解析失敗
+    source: str = "probe"  # probe：本次探測 | cache：檢測緩存 | store：後台探測結果
+    age_sec: int = 0  # 結果距探測完成的秒數
+
+
+class BatchCheckRequest(BaseModel):
+    """批量檢測請求"""
+    domains: List[str]
+    deadline: Optional[float] = Field(None, gt=0)  # 截止時間（秒），未指定時使用 CHECK_BATCH_DEADLINE
+    max_age: Optional[float] = Field(None, ge=0)  # 可接受的結果最長時間（秒），未指定時使用 CHECK_CACHE_MAX_AGE，0 表示強制重新探測
 
 
 # ========== 網域管理相關模型 ==========
@@ -96,6 +140,12 @@ class DomainListResponse(BaseModel):
     timestamp: str
     total: int
     domains: List[DomainInfo]
+    version: int = 0  # 列表版本號，下次請求以 ?since=&epoch= 傳回可獲取增量
+    epoch: str = ""  # 服務進程標識，與 version 一同傳回；進程重啟後不符，返回全量
+    full: bool = True  # False 表示增量：domains 僅含變更項
+    removed: List[str] = []  # 增量模式下已刪除的網域
+    next_cursor: Optional[str] = None  # 分頁模式下一頁游標，最後一頁為 None
+    counts: Dict[str, int] = {}  # 分頁模式下全列表統計（total、reported 及各狀態數）
 
 
 class AddDomainRequest(BaseModel):
@@ -147,3 +197,49 @@ class BatchSetReportedResponse(BaseModel):
     """批量設置上報狀態響應"""
     success: bool
     updated: int
+
+
+# ========== 分佈式探測相關模型 ==========
+
+class LeaseRequest(BaseModel):
+    """領取任務請求"""
+    worker_id: str
+    limit: int = 50
+    lease_seconds: Optional[int] = None  # 未指定時使用 JOB_LEASE_SECONDS
+    wait: float = 0  # 無任務時的長輪詢等待（秒）
+
+
+class LeasedJob(BaseModel):
+    """已租出的探測任務"""
+    job_id: int
+    lease_id: str
+    domain: str
+    force_trace: bool = False
+    previous_trace: Optional[Dict] = None  # 上次追蹤結果（用於判斷能否沿用）
+    targets: Optional[Dict[str, Optional[Dict]]] = None  # 跳轉目標（根域名）的監控狀態（連線失敗時判定空解析）
+
+
+class LeaseResponse(BaseModel):
+    """領取任務響應"""
+    jobs: List[LeasedJob]
+    lease_seconds: int
+
+
+class JobResult(BaseModel):
+    """單個任務的判定結果（aggregate_verdict 的輸出）"""
+    job_id: int
+    lease_id: str
+    verdict: Dict
+    dead: bool = False  # 所有解析器均返回錯誤（失效網域退避）
+
+
+class JobResultsRequest(BaseModel):
+    """回傳結果請求"""
+    worker_id: str
+    results: List[JobResult]
+
+
+class JobResultsResponse(BaseModel):
+    """回傳結果響應"""
+    accepted: int
+    dropped: int  # 任務已完成或已不存在
@@ -0,0 +1,348 @@
+"""SQLite 存儲後端（網域與網域組）"""
+import json
+import logging
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Set, Tuple
+from . import config
+
+logger = logging.getLogger(__name__)
+
+# domains 表欄位（與 domains.json 的屬性一一對應）
+DOMAIN_COLUMNS = ("reported", "polluted", "note", "created_at", "trace_status", "last_probe_at")
+_BOOL_COLUMNS = ("reported", "polluted")
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS domains (
+    domain        TEXT PRIMARY KEY,
+    reported      INTEGER NOT NULL DEFAULT 0,
+    polluted      INTEGER NOT NULL DEFAULT 0,
+    note          TEXT NOT NULL DEFAULT '',
+    created_at    TEXT NOT NULL DEFAULT '',
+    trace_status  TEXT,
+    last_probe_at TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_domains_polluted ON domains(polluted);
+CREATE INDEX IF NOT EXISTS idx_domains_reported ON domains(reported);
+CREATE INDEX IF NOT EXISTS idx_domains_trace_status ON domains(trace_status);
+CREATE INDEX IF NOT EXISTS idx_domains_last_probe_at ON domains(last_probe_at);
+
+-- 網域組並查集：每個成員一行，根節點的 parent 為自己
+CREATE TABLE IF NOT EXISTS domain_group_parents (
+    domain TEXT PRIMARY KEY,
+    parent TEXT NOT NULL
+);
+
+-- 舊版網域組格式（每個成員保存整組），僅用於升級時轉換
+CREATE TABLE IF NOT EXISTS domain_groups (
+    domain  TEXT PRIMARY KEY,
+    related TEXT NOT NULL
+);
+"""
+
+
+class SqliteDatabase:
+    """共享連接（WAL 模式），由線程鎖序列化訪問"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.RLock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(_SCHEMA)
+
+    @contextmanager
+    def transaction(self) -> Iterator[sqlite3.Connection]:
+        """在單個事務中執行多條語句"""
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                yield self._conn
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+            self._conn.execute("COMMIT")
+
+    def query(self, sql: str, params: Tuple = ()) -> List[sqlite3.Row]:
+        with self._lock:
+            return self._conn.execute(sql, params).fetchall()
+
+    def data_version(self) -> int:
+        """其他連接（如其他進程）提交修改後變化的計數，本連接的寫入不改變此值"""
+        with self._lock:
+            return self._conn.execute("PRAGMA data_version").fetchone()[0]
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+_databases: Dict[str, SqliteDatabase] = {}
+
+
+def get_database(path: str) -> SqliteDatabase:
+    """按路徑獲取共享的數據庫連接"""
+    db = _databases.get(path)
+    if db is None:
+        db = SqliteDatabase(path)
+        _databases[path] = db
+    return db
+
+
+def _row_to_info(row: sqlite3.Row) -> Dict:
+    info = {
+        "reported": bool(row["reported"]),
+        "polluted": bool(row["polluted"]),
+        "note": row["note"],
+        "created_at": row["created_at"]
+    }
+    # 與 domains.json 保持一致：未探測過的網域沒有這兩個屬性
+    if row["trace_status"] is not None:
+        info["trace_status"] = row["trace_status"]
+    if row["last_probe_at"] is not None:
+        info["last_probe_at"] = row["last_probe_at"]
+    return info
+
+
+def _column_values(info: Dict) -> Tuple:
+    values = []
+    for col in DOMAIN_COLUMNS:
+        value = info.get(col)
+        if col in _BOOL_COLUMNS:
+            value = int(bool(value))
+        elif col in ("note", "created_at") and value is None:
+            value = ""
+        values.append(value)
+    return tuple(values)
+
+
+def _set_clause(fields: Dict[str, Any]) -> Tuple[str, Tuple]:
+    """UPDATE 的 SET 子句（忽略未知欄位）"""
+    cols = [c for c in fields if c in DOMAIN_COLUMNS]
+    values = tuple(int(bool(fields[c])) if c in _BOOL_COLUMNS else fields[c] for c in cols)
+    return ", ".join(f"{c} = ?" for c in cols), values
+
+
+class SqliteDomainBackend:
+    """
+    網域存儲的 SQLite 實現，接口與 DomainRegistry 一致
+
+    - 每次修改直接寫入對應的行，無需延遲批量寫入
+    - 讀取走內存鏡像，本進程的修改同步更新鏡像
+    - 透過 PRAGMA data_version 偵測其他進程（如 import_domains.py）提交的修改，重新載入並通知變更
+    """
+
+    def __init__(self, db: SqliteDatabase, on_external_change: Optional[Callable[[Iterable[str], Iterable[str]], None]] = None):
+        self._db = db
+        self._on_external_change = on_external_change
+        # 序列化寫入與鏡像更新，保證鏡像與數據庫一致
+        self._mutex = threading.RLock()
+        self._data: Optional[Dict[str, Dict]] = None
+        self._data_version: Optional[int] = None
+        self._last_check = 0.0
+
+    # ---------- 內存鏡像與外部修改偵測 ----------
+
+    def _refresh(self):
+        """必要時重新載入其他進程提交的修改（需持有 _mutex）"""
+        now = time.monotonic()
+        if self._data is not None and now - self._last_check < config.DOMAINS_STAT_INTERVAL:
+            return
+        self._last_check = now
+        version = self._db.data_version()
+        if self._data is not None and version == self._data_version:
+            return
+        disk = {row["domain"]: _row_to_info(row) for row in self._db.query("SELECT * FROM domains")}
+        if self._data is not None:
+            changed = [d for d, info in disk.items() if self._data.get(d) != info]
+            removed = [d for d in self._data if d not in disk]
+            if changed or removed:
+                logger.info(f"[sqlite] 偵測到外部修改：變更 {len(changed)} 個、刪除 {len(removed)} 個網域")
+                if self._on_external_change is not None:
+                    self._on_external_change(changed, removed)
+        self._data = disk
+        self._data_version = version
+
+    def _reload_rows(self, conn: sqlite3.Connection, domains: Iterable[str]):
+        """寫入後從數據庫讀回指定行更新鏡像（需持有 _mutex，且已載入鏡像）"""
+        for domain in domains:
+            row = conn.execute("SELECT * FROM domains WHERE domain = ?", (domain,)).fetchone()
+            if row is None:
+                self._data.pop(domain, None)
+            else:
+                self._data[domain] = _row_to_info(row)
+
+    # ---------- 持久化（WAL 下寫入即持久，保留接口以兼容調用方） ----------
+
+    def flush(self) -> bool:
+        return False
+
+    def dirty_count(self) -> int:
+        return 0
+
+    # ---------- 讀取 ----------
+
+    def keys(self) -> List[str]:
+        with self._mutex:
+            self._refresh()
+            return list(self._data)
+
+    def snapshot(self) -> Dict[str, Dict]:
+        """所有網域的淺拷貝（屬性字典為共享引用，調用方不可修改）"""
+        with self._mutex:
+            self._refresh()
+            return dict(self._data)
+
+    def get(self, domain: str) -> Optional[Dict]:
+        with self._mutex:
+            self._refresh()
+            info = self._data.get(domain)
+            return dict(info) if info is not None else None
+
+    def contains(self, domain: str) -> bool:
+        with self._mutex:
+            self._refresh()
+            return domain in self._data
+
+    def count(self) -> int:
+        with self._mutex:
+            self._refresh()
+            return len(self._data)
+
+    # ---------- 修改 ----------
+
+    def insert(self, domain: str, info: Dict) -> bool:
+        return bool(self.insert_many({domain: info}))
+
+    def insert_many(self, items: Dict[str, Dict]) -> List[str]:
+        added = []
+        with self._mutex:
+            self._refresh()
+            with self._db.transaction() as conn:
+                for domain, info in items.items():
+                    cur = conn.execute(
+                        f"INSERT OR IGNORE INTO domains (domain, {', '.join(DOMAIN_COLUMNS)}) VALUES (?{', ?' * len(DOMAIN_COLUMNS)})",
+                        (domain, *_column_values(info))
+                    )
+                    if cur.rowcount:
+                        added.append(domain)
+                self._reload_rows(conn, added)
+        return added
+
+    def update(self, domain: str, **fields: Any) -> Optional[Dict]:
+        clause, values = _set_clause(fields)
+        with self._mutex:
+            self._refresh()
+            with self._db.transaction() as conn:
+                if clause:
+                    cur = conn.execute(f"UPDATE domains SET {clause} WHERE domain = ?", (*values, domain))
+                    if cur.rowcount == 0:
+                        return None
+                self._reload_rows(conn, [domain])
+            info = self._data.get(domain)
+            return dict(info) if info is not None else None
+
+    def toggle(self, domain: str, field: str) -> Optional[bool]:
+        if field not in _BOOL_COLUMNS:
+            raise ValueError(f"不可翻轉的欄位: {field}")
+        with self._mutex:
+            self._refresh()
+            with self._db.transaction() as conn:
+                cur = conn.execute(f"UPDATE domains SET {field} = NOT {field} WHERE domain = ?", (domain,))
+                if cur.rowcount == 0:
+                    return None
+                self._reload_rows(conn, [domain])
+            return self._data[domain][field]
+
+    def update_many(self, updates: Dict[str, Dict[str, Any]]) -> int:
+        updated = []
+        with self._mutex:
+            self._refresh()
+            with self._db.transaction() as conn:
+                for domain, fields in updates.items():
+                    clause, values = _set_clause(fields)
+                    if clause and conn.execute(f"UPDATE domains SET {clause} WHERE domain = ?", (*values, domain)).rowcount:
+                        updated.append(domain)
+                self._reload_rows(conn, updated)
+        return len(updated)
+
+    def rename(self, old_domain: str, new_domain: str, **fields: Any) -> bool:
+        clause, values = _set_clause(fields)
+        with self._mutex:
+            self._refresh()
+            with self._db.transaction() as conn:
+                cur = conn.execute("UPDATE domains SET domain = ? WHERE domain = ?", (new_domain, old_domain))
+                if cur.rowcount == 0:
+                    return False
+                if clause:
+                    conn.execute(f"UPDATE domains SET {clause} WHERE domain = ?", (*values, new_domain))
+                self._reload_rows(conn, [old_domain, new_domain])
+        return True
+
+    def delete_many(self, domains: List[str]) -> int:
+        deleted = []
+        with self._mutex:
+            self._refresh()
+            with self._db.transaction() as conn:
+                for domain in domains:
+                    if conn.execute("DELETE FROM domains WHERE domain = ?", (domain,)).rowcount:
+                        deleted.append(domain)
+            for domain in deleted:
+                self._data.pop(domain, None)
+        return len(deleted)
+
+
+class SqliteGroupBackend:
+    """網域組存儲的 SQLite 實現：並查集的 (成員, 父節點) 行"""
+
+    def __init__(self, db: SqliteDatabase):
+        self._db = db
+
+    def read_parents(self) -> Dict[str, str]:
+        return {row["domain"]: row["parent"] for row in self._db.query("SELECT * FROM domain_group_parents")}
+
+    def write_parents(self, parents: Dict[str, str]):
+        """寫入（覆蓋）給定成員的父節點，只涉及這些行"""
+        with self._db.transaction() as conn:
+            conn.executemany(
+                "INSERT OR REPLACE INTO domain_group_parents (domain, parent) VALUES (?, ?)",
+                list(parents.items())
+            )
+
+    def read_legacy(self) -> Dict[str, Set[str]]:
+        """讀取舊版 domain_groups 表"""
+        return {row["domain"]: set(json.loads(row["related"])) for row in self._db.query("SELECT * FROM domain_groups")}
+
+
+def migrate_from_json(db: SqliteDatabase, domains_json: Path, groups_json: Path) -> Tuple[int, int]:
+    """
+    從 domains.json / domain_groups.json 一次性遷移到 SQLite（已存在的行將被覆蓋）
+    返回 (網域數, 網域組成員數)
+    """
+    domains: Dict[str, Dict] = {}
+    if domains_json.exists():
+        with open(domains_json, "r", encoding="utf-8") as f:
+            domains = json.load(f)
+    from .domain_groups import read_groups_file
+    # 每組以字典序最小的成員為根
+    parents: Dict[str, str] = {}
+    for members in read_groups_file(groups_json):
+        root = min(members)
+        parents.update({m: root for m in members})
+
+    with db.transaction() as conn:
+        conn.executemany(
+            f"INSERT OR REPLACE INTO domains (domain, {', '.join(DOMAIN_COLUMNS)}) VALUES (?{', ?' * len(DOMAIN_COLUMNS)})",
+            [(domain, *_column_values(info)) for domain, info in domains.items()]
+        )
+        conn.executemany(
+            "INSERT OR REPLACE INTO domain_group_parents (domain, parent) VALUES (?, ?)",
+            list(parents.items())
+        )
+    logger.info(f"[sqlite] 已遷移 {len(domains)} 個網域、{len(parents)} 個網域組成員")
+    return len(domains), len(parents)
@@ -1,11 +1,23 @@
 """內存緩存存儲"""
+import asyncio
 import logging
+import secrets
+import threading
+import time
+from collections import OrderedDict
 from datetime import datetime, timezone
-from typing import Dict, List, Optional, Tuple
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+from . import config
+from .history import history_log
+from . import metrics
 
 logger = logging.getLogger(__name__)
 
 
+# 變更監聽：callback(version, changed, removed)
+StoreListener = Callable[[int, List[str], List[str]], None]
+
+
 class Store:
     """存儲探測結果的內存緩存（支持批量寫入）"""
     
@@ -15,6 +27,64 @@ class Store:
         self._update_count = 0
         # 待批量寫入的更新隊列
         self._pending_updates: List[Tuple[str, bool, Optional[str], str]] = []
+        # 背景寫入任務的喚醒與背壓信號（在事件循環中惰性創建）
+        self._flush_wakeup: Optional[asyncio.Event] = None
+        self._drained: Optional[asyncio.Event] = None
+        self._last_flush_at = time.monotonic()
+        self._last_flush_count = 0
+        self._last_flush_ms = 0.0
+        # 列表版本號：進程內從 0 單調遞增；epoch 為進程啟動時生成的標識，
+        # 隨版本號一同出現在 ETag 與增量游標中，其他進程（如重啟前）的版本號一律需全量同步
+        self._version_lock = threading.Lock()
+        self.epoch = secrets.token_hex(6)
+        self._version = 0
+        # 變更日誌：網域 -> (最後變更版本, 是否已刪除)，按版本升序排列
+        self._changes: "OrderedDict[str, Tuple[int, bool]]" = OrderedDict()
+        # 早於此版本的變更已從日誌淘汰，無法提供增量
+        self._changes_floor = self._version
+        self._listeners: List[StoreListener] = []
+    
+    @property
+    def version(self) -> int:
+        """當前列表版本號（網域列表或探測結果任何變化都會遞增）"""
+        return self._version
+    
+    def add_listener(self, callback: StoreListener):
+        """註冊變更監聽（如 SSE 推送、列表索引），在 touch 的調用線程中執行"""
+        self._listeners.append(callback)
+    
+    def touch(self, changed: Iterable[str] = (), removed: Iterable[str] = ()):
+        """記錄網域變更、遞增版本號並通知監聽者（可在任意線程調用）"""
+        changed, removed = list(changed), list(removed)
+        with self._version_lock:
+            self._version += 1
+            version = self._version
+            for domain, gone in [*((d, False) for d in changed), *((d, True) for d in removed)]:
+                self._changes[domain] = (version, gone)
+                self._changes.move_to_end(domain)
+            while len(self._changes) > config.CHANGE_LOG_MAX_ENTRIES:
+                _, (evicted, _) = self._changes.popitem(last=False)
+                self._changes_floor = evicted
+        for callback in self._listeners:
+            try:
+                callback(version, changed, removed)
+            except Exception as e:
+                logger.error(f"[Store] 變更監聽失敗: {e}", exc_info=True)
+    
+    def changes_since(self, version: int, epoch: Optional[str]) -> Optional[Tuple[List[str], List[str]]]:
+        """
+        獲取指定版本之後變更的網域
+        返回 (新增或修改, 已刪除)；版本過舊或不屬於本進程（epoch 不符）時返回 None（需全量同步）
+        """
+        with self._version_lock:
+            if epoch != self.epoch or version < self._changes_floor or version > self._version:
+                return None
+            changed, removed = [], []
+            for domain, (v, gone) in reversed(self._changes.items()):
+                if v <= version:
+                    break
+                (removed if gone else changed).append(domain)
+            return changed, removed
     
     def update(self, domain: str, result: Dict):
         """
@@ -35,8 +105,15 @@ class Store:
         
         logger.debug(f"[Store.update #{self._update_count}] 緩存 {domain}: status={status}, polluted={is_polluted}")
         
+        self.touch((domain,))
+        
+        # 記錄狀態變化/心跳到探測歷史
+        history_log.record(domain, result)
+        
         # 加入待寫入隊列
         self._pending_updates.append((domain, is_polluted, trace_status, now))
+        if len(self._pending_updates) >= config.STORE_FLUSH_BATCH and self._flush_wakeup is not None:
+            self._flush_wakeup.set()
     
     def flush_pending(self) -> int:
         """
@@ -53,8 +130,10 @@ class Store:
         self._pending_updates.clear()
         
         try:
-            batch_update_polluted_and_trace(updates)
-            logger.info(f"[Store.flush] 批量寫入 {count} 條記錄到 domains.json")
+            # 變更已在 update 時發布（列表以內存中的探測結果為準），落盤不再重複通知
+            batch_update_polluted_and_trace(updates, notify=False)
+            logger.debug(f"[Store.flush] 批量寫入 {count} 條記錄到 domains.json")
+            metrics.FLUSH_BATCH_SIZE.observe(count)
         except Exception as e:
             logger.error(f"[Store.flush] 批量寫入失敗: {e}", exc_info=True)
             # 寫入失敗時恢復隊列
@@ -67,6 +146,61 @@ class Store:
         """獲取待寫入的記錄數"""
         return len(self._pending_updates)
     
+    def unpersisted_count(self) -> int:
+        """尚未落盤的記錄數（Store 隊列 + 網域註冊表待寫入）"""
+        from .domains import registry
+        return len(self._pending_updates) + registry.dirty_count()
+    
+    async def wait_for_capacity(self):
+        """
+        背壓：未落盤記錄超過 STORE_MAX_UNPERSISTED 時等待背景寫入追上
+        探測工作者在開始探測前調用
+        """
+        while self._drained is not None and self.unpersisted_count() >= config.STORE_MAX_UNPERSISTED:
+            self._drained.clear()
+            self._flush_wakeup.set()
+            await self._drained.wait()
+    
+    async def run_flusher(self):
+        """
+        背景增量寫入：累積 STORE_FLUSH_BATCH 條或經過 STORE_FLUSH_INTERVAL 秒即寫入 domains.json（及探測歷史、網域組）
+        內存更新在事件循環中完成，文件寫入在線程中執行
+        """
+        from .domains import registry
+        from .domain_groups import group_index
+        
+        self._flush_wakeup = asyncio.Event()
+        self._drained = asyncio.Event()
+        try:
+            while True:
+                try:
+                    await asyncio.wait_for(self._flush_wakeup.wait(), timeout=config.STORE_FLUSH_INTERVAL)
+                except asyncio.TimeoutError:
+                    pass
+                self._flush_wakeup.clear()
+                
+                start = time.perf_counter()
+                try:
+                    count = self.flush_pending()
+                    if registry.dirty_count():
+                        await asyncio.to_thread(registry.flush)
+                    await asyncio.to_thread(history_log.flush)
+                    if group_index.dirty_count():
+                        await asyncio.to_thread(group_index.flush)
+                    self._last_flush_count = count
+                    elapsed = time.perf_counter() - start
+                    self._last_flush_ms = elapsed * 1000
+                    metrics.FLUSH_SECONDS.observe(elapsed)
+                    self._last_flush_at = time.monotonic()
+                except Exception as e:
+                    logger.error(f"[Store.flusher] 寫入失敗: {e}", exc_info=True)
+                    await asyncio.sleep(1)
+                finally:
+                    self._drained.set()
+        finally:
+            self._flush_wakeup = None
+            self._drained = None
+    
     def get_all(self) -> Dict[str, Dict]:
         """获取所有域名结果"""
         return self._results.copy()
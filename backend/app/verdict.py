@@ -1,8 +1,26 @@
 """結果判定與聚合"""
-from typing import Dict, List, Set
+import time
+from typing import Collection, Dict, List, Optional, Set
 from . import config
 
 
+def _answer_hits_block_page(answers: Dict[str, List[str]]) -> bool:
+    """檢查 CNAME / HTTPS / SVCB 答案是否指向黑名單主機或 IP"""
+    for rtype in ("CNAME", "HTTPS", "SVCB"):
+        for rdata in answers.get(rtype, []):
+            tokens = rdata.split()
+            # CNAME：目標名；HTTPS/SVCB：優先級 目標名 參數...
+            target = tokens[0] if rtype == "CNAME" else (tokens[1] if len(tokens) > 1 else "")
+            if target.rstrip(".").lower() in config.BLOCK_PAGE_HOSTS:
+                return True
+            for param in tokens[2:]:
+                key, _, value = param.partition("=")
+                if key in ("ipv4hint", "ipv6hint"):
+                    if set(value.strip('"').split(",")) & config.BLOCK_PAGE_IPS:
+                        return True
+    return False
+
+
 def classify_tw_result(
     result: Dict,
     baseline_ips: Set[str]
@@ -11,6 +29,10 @@ def classify_tw_result(
     status = result.get("status")
     ips = set(result.get("ips", []))
     
+    # 本機等待解析器槽位超時，查詢未發出
+    if status == "throttled":
+        return "本機限流"
+    
     # 解析失敗情況
     if status == "timeout":
         return "逾時"
@@ -22,6 +44,10 @@ def classify_tw_result(
         return "正常"
     
     # status == "ok"
+    # 查詢計劃中的 CNAME / HTTPS / SVCB 指向封鎖頁
+    if _answer_hits_block_page(result.get("answers") or {}):
+        return "已封鎖"
+    
     if not ips:
         # 無 IP 返回，視為正常（未被污染）
         return "正常"
@@ -42,8 +68,27 @@ def classify_tw_result(
     return "正常"
 
 
+def is_throttled_verdict(verdict: Dict) -> bool:
+    """任一解析器因本機限流未查詢（結果不完整，不應保存）"""
+    results = verdict.get("baseline", {}).get("detail", []) + verdict.get("tw", [])
+    return any(r.get("status") == "throttled" for r in results)
+
+
+def trace_status_of(baseline_ips: Collection[str], redirect_trace: Optional[Dict]) -> Optional[str]:
+    """
+    確定 trace_status：追蹤成功 / 追蹤失敗
+    若無基準 IP（空解析），追蹤視為成功（無需追蹤）
+    """
+    if not baseline_ips:
+        return "追蹤成功"
+    if redirect_trace:
+        return "追蹤成功" if redirect_trace.get("success") else "追蹤失敗"
+    return None
+
+
 def aggregate_verdict(probe_result: Dict) -> Dict:
     """聚合域名級判定結果"""
+    started = time.perf_counter()
     domain = probe_result["domain"]
     baseline_results = probe_result["baseline"]
     tw_results = probe_result["tw"]
@@ -86,6 +131,9 @@ def aggregate_verdict(probe_result: Dict) -> Dict:
         elif category == "解析失敗":
             reasons.append("解析失敗")
             has_resolve_failure = True
+        elif category == "本機限流":
+            # 本機背壓，不代表解析器狀態，不計入失敗
+            reasons.append("本機限流：未查詢")
     
     # 去重
     reasons = list(dict.fromkeys(reasons))
@@ -99,18 +147,6 @@ def aggregate_verdict(probe_result: Dict) -> Dict:
     else:
         status = "未污染"
     
-    # 確定 trace_status：追蹤成功 / 追蹤失敗
-    # 若無基準 IP（空解析），追蹤視為成功（無需追蹤）
-    trace_status = None
-    if not baseline_ips:
-        # 空解析，無需追蹤
-        trace_status = "追蹤成功"
-    elif redirect_trace:
-        if redirect_trace.get("success"):
-            trace_status = "追蹤成功"
-        else:
-            trace_status = "追蹤失敗"
-    
     return {
         "domain": domain,
         "status": status,
@@ -121,6 +157,8 @@ def aggregate_verdict(probe_result: Dict) -> Dict:
         },
         "tw": tw_classified,
         "redirect_trace": redirect_trace,
-        "trace_status": trace_status
+        "trace_status": trace_status_of(baseline_ips, redirect_trace),
+        # 探測各階段耗時（毫秒），加上本次判定的耗時
+        "timings": {**probe_result.get("timings", {}), "classify_ms": round((time.perf_counter() - started) * 1000, 3)}
     }
 
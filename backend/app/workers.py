@@ -0,0 +1,243 @@
+"""
+多進程探測：按網域哈希分片到子進程，主進程負責調度與存儲
+
+子進程只導入探測模塊（dns_probe / redirect_trace / verdict），不導入網域列表與 store：
+探測所需的網域狀態由主進程隨任務傳入，子進程不加載 domains.json，也不會寫回
+"""
+import asyncio
+import itertools
+import logging
+import multiprocessing
+import threading
+import zlib
+from typing import Dict, List, Optional, Tuple
+from . import config
+
+logger = logging.getLogger(__name__)
+
+# 任務：(任務ID, 網域, 是否強制追蹤, 上次追蹤結果, 跳轉目標狀態)
+Job = Tuple[int, str, bool, Optional[Dict], Optional[Dict]]
+# 結果：(任務ID, 子進程序號, 判定結果, 是否失效網域, 錯誤信息)
+JobResult = Tuple[int, int, Optional[Dict], bool, Optional[str]]
+
+
+def shard_of(domain: str, workers: int) -> int:
+    """網域所屬的子進程序號（同一網域總在同一子進程探測，解析器緩存與限流狀態得以延續）"""
+    return zlib.crc32(domain.encode("utf-8")) % workers
+
+
+# ---------- 子進程 ----------
+
+def _worker_main(index: int, workers: int, jobs: "multiprocessing.Queue", results: "multiprocessing.Queue"):
+    """子進程入口：獨立事件循環中執行 probe_domain + aggregate_verdict"""
+    logging.basicConfig(
+        level=config.LOG_LEVEL,
+        format=f"%(asctime)s [%(levelname)s] [worker#{index}] %(message)s"
+    )
+    # 各解析器的並發上限在子進程間平分，總量與單進程模式一致
+    # 初始上限未配置時按子進程自身的 MAX_CONCURRENCY 計算，並受平分後的上限約束
+    if config.RESOLVER_CONCURRENCY_INITIAL:
+        config.RESOLVER_CONCURRENCY_INITIAL = max(config.RESOLVER_CONCURRENCY_INITIAL // workers, 1)
+    config.RESOLVER_CONCURRENCY_MIN = max(config.RESOLVER_CONCURRENCY_MIN // workers, 1)
+    config.RESOLVER_CONCURRENCY_MAX = max(config.RESOLVER_CONCURRENCY_MAX // workers, 1)
+    try:
+        asyncio.run(_worker_loop(index, jobs, results))
+    except KeyboardInterrupt:
+        pass
+
+
+async def _worker_loop(index: int, jobs: "multiprocessing.Queue", results: "multiprocessing.Queue"):
+    from . import dns_udp
+    from .dns_probe import probe_domain, is_dead_result
+    from .redirect_trace import start_http_client, close_http_client, hop_cache
+    from .verdict import aggregate_verdict
+
+    async def run(job: Job):
+        job_id, domain, force_trace, previous_trace, targets = job
+        try:
+            result = await probe_domain(domain, force_trace=force_trace, previous_trace=previous_trace, targets=targets)
+            results.put((job_id, index, aggregate_verdict(result), is_dead_result(result), None))
+        except Exception as e:
+            logger.error(f"[worker] 探測異常: {domain}, 錯誤={e}", exc_info=True)
+            results.put((job_id, index, None, False, repr(e)))
+
+    loop = asyncio.get_running_loop()
+    start_http_client()
+    tasks = set()
+    logger.info(f"[worker] 子進程 #{index} 已啟動")
+    try:
+        while True:
+            job = await loop.run_in_executor(None, jobs.get)
+            if job is None:
+                break
+            # 主進程的循環清空不作用於子進程，按探測間隔自行清空單跳緩存
+            hop_cache.clear_every(config.PROBE_INTERVAL)
+            task = asyncio.create_task(run(job))
+            tasks.add(task)
+            task.add_done_callback(tasks.discard)
+        if tasks:
+            await asyncio.gather(*tasks, return_exceptions=True)
+    finally:
+        await close_http_client()
+        dns_udp.close_all()
+
+
+# ---------- 主進程 ----------
+
+class ProbeWorkerPool:
+    """
+    探測子進程池
+
+    - 每個子進程一條任務隊列，網域按 crc32 哈希固定分配到某個子進程
+    - 所有子進程共用一條結果隊列，只回傳判定結果（不含原始探測數據）
+    - 結果由讀取線程取出，經 call_soon_threadsafe 交回事件循環
+    - 子進程意外退出時，其未完成任務以異常結束並重新拉起子進程
+    """
+
+    def __init__(self, workers: int, timeout: float):
+        self.workers = workers
+        self.timeout = timeout
+        self._ctx = multiprocessing.get_context("spawn")
+        self._processes: List[Optional[multiprocessing.Process]] = []
+        self._jobs: List["multiprocessing.Queue"] = []
+        self._results: Optional["multiprocessing.Queue"] = None
+        self._reader: Optional[threading.Thread] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        # 任務ID -> (等待結果的 Future, 子進程序號)
+        self._pending: Dict[int, Tuple[asyncio.Future, int]] = {}
+        self._ids = itertools.count(1)
+        # 統計
+        self.completed: List[int] = []
+        self.respawns = 0
+
+    @property
+    def running(self) -> bool:
+        return self._loop is not None
+
+    def start(self):
+        """啟動子進程與結果讀取線程（需在事件循環中調用；workers 為 0 時不啟動）"""
+        if self.workers <= 0 or self.running:
+            return
+        self._loop = asyncio.get_running_loop()
+        self._results = self._ctx.Queue()
+        self._processes = [None] * self.workers
+        self._jobs = [None] * self.workers
+        self.completed = [0] * self.workers
+        for i in range(self.workers):
+            self._spawn(i)
+        self._reader = threading.Thread(target=self._read_results, name="probe-worker-results", daemon=True)
+        self._reader.start()
+        logger.info(f"[worker] 已啟動 {self.workers} 個探測子進程")
+
+    def _spawn(self, index: int):
+        jobs = self._ctx.Queue()
+        process = self._ctx.Process(
+            target=_worker_main,
+            args=(index, self.workers, jobs, self._results),
+            name=f"probe-worker-{index}",
+            daemon=True
+        )
+        process.start()
+        self._jobs[index] = jobs
+        self._processes[index] = process
+
+    def _ensure_alive(self, index: int):
+        """子進程已退出時重新拉起，並結束分配給它的未完成任務"""
+        process = self._processes[index]
+        if process.is_alive():
+            return
+        logger.warning(f"[worker] 子進程 #{index} 已退出 (exitcode={process.exitcode})，重新啟動")
+        for job_id, (future, shard) in list(self._pending.items()):
+            if shard == index:
+                del self._pending[job_id]
+                if not future.done():
+                    future.set_exception(RuntimeError(f"探測子進程 #{index} 已退出"))
+        self.respawns += 1
+        self._spawn(index)
+
+    def _read_results(self):
+        while True:
+            item = self._results.get()
+            if item is None:
+                return
+            try:
+                self._loop.call_soon_threadsafe(self._resolve, item)
+            except RuntimeError:
+                # 事件循環已關閉
+                return
+
+    def _resolve(self, item: JobResult):
+        job_id, index, verdict, dead, error = item
+        self.completed[index] += 1
+        entry = self._pending.pop(job_id, None)
+        if entry is None or entry[0].done():
+            # 已超時或子進程重啟時被放棄的任務
+            return
+        future = entry[0]
+        if error is not None:
+            future.set_exception(RuntimeError(error))
+        else:
+            future.set_result((verdict, dead))
+
+    async def probe(
+        self,
+        domain: str,
+        force_trace: bool = False,
+        previous_trace: Optional[Dict] = None,
+        targets: Optional[Dict] = None
+    ) -> Tuple[Dict, bool]:
+        """
+        在所屬子進程中探測網域（previous_trace / targets 見 probe_domain）
+
+        Returns:
+            (判定結果, 是否失效網域)
+        """
+        index = shard_of(domain, self.workers)
+        self._ensure_alive(index)
+        job_id = next(self._ids)
+        future = self._loop.create_future()
+        self._pending[job_id] = (future, index)
+        self._jobs[index].put((job_id, domain, force_trace, previous_trace, targets))
+        try:
+            return await asyncio.wait_for(future, self.timeout)
+        finally:
+            self._pending.pop(job_id, None)
+
+    def stats(self) -> Dict:
+        return {
+            "workers": self.workers,
+            "alive": sum(1 for p in self._processes if p is not None and p.is_alive()),
+            "pending": len(self._pending),
+            "completed": list(self.completed),
+            "respawns": self.respawns
+        }
+
+    def stop(self, timeout: float = 5.0):
+        """通知子進程退出並等待，逾時則強制終止"""
+        if not self.running:
+            return
+        for jobs in self._jobs:
+            try:
+                jobs.put(None)
+            except Exception:
+                pass
+        for process in self._processes:
+            process.join(timeout)
+            if process.is_alive():
+                process.terminate()
+                process.join(1)
+        self._results.put(None)
+        self._reader.join(timeout)
+        for future, _ in self._pending.values():
+            # 可能在線程中調用，Future 須在事件循環中取消
+            self._loop.call_soon_threadsafe(future.cancel)
+        self._pending.clear()
+        for q in [*self._jobs, self._results]:
+            q.close()
+            q.join_thread()
+        self._loop = None
+        logger.info("[worker] 探測子進程已停止")
+
+
+# 全局探測子進程池（PROBE_WORKERS 為 0 時不啟動，探測在 API 進程內進行）
+worker_pool = ProbeWorkerPool(config.PROBE_WORKERS, config.PROBE_WORKER_TIMEOUT)
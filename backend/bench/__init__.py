@@ -0,0 +1 @@
+"""離線基準測試（模擬 DNS / HTTP 服務器與探測管線壓測）"""
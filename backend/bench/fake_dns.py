@@ -0,0 +1,171 @@
+"""
+離線基準測試用的本地 DNS 服務器
+
+每個模擬解析器綁定一個 127.0.0.x 地址（與 config.DNS_PORT 相同的端口），按配置模擬延遲、丟包、
+NXDOMAIN 與封鎖頁答案。NXDOMAIN 與封鎖按網域哈希決定，同比例的解析器對同一網域給出一致的結果。
+"""
+import asyncio
+import random
+import zlib
+from typing import Dict, List, Optional
+
+import dns.flags
+import dns.message
+import dns.rcode
+import dns.rdatatype
+import dns.rrset
+
+# 模擬網域解析到的地址段（RFC 2544 基準測試保留段）
+ANSWER_PREFIX = "198.18"
+ANSWER_TTL = 300
+# 否定答案的 SOA（minimum 即否定緩存時間）
+NEGATIVE_SOA = "ns.bench.test. admin.bench.test. 1 3600 600 86400 300"
+
+
+def hash_fraction(salt: str, name: str) -> float:
+    """網域在 [0, 1) 上的穩定位置，用於按比例選取網域"""
+    return zlib.crc32(f"{salt}:{name.lower().rstrip('.')}".encode()) / 2 ** 32
+
+
+def answer_ip(name: str) -> str:
+    """網域的正常 A 記錄（所有解析器一致）"""
+    h = zlib.crc32(name.lower().rstrip(".").encode())
+    return f"{ANSWER_PREFIX}.{(h >> 8) & 0xFF}.{h & 0xFF}"
+
+
+class ResolverProfile:
+    """
+    模擬解析器的行為
+
+    Args:
+        kind: "baseline" 或 "tw"
+        latency_ms: 平均應答延遲（在 0.5~1.5 倍之間均勻抖動）
+        loss: 丟棄查詢的比例（觸發探測端逾時與重傳）
+        nxdomain: 返回 NXDOMAIN 的網域比例
+        block: 返回封鎖頁地址的網域比例
+        block_ip: 封鎖頁地址（應在 config.BLOCK_PAGE_IPS 中）
+    """
+
+    def __init__(
+        self,
+        kind: str,
+        latency_ms: float = 5.0,
+        loss: float = 0.0,
+        nxdomain: float = 0.0,
+        block: float = 0.0,
+        block_ip: str = "182.173.0.181"
+    ):
+        if kind not in ("baseline", "tw"):
+            raise ValueError(f"未知的解析器類型: {kind}")
+        self.kind = kind
+        self.latency_ms = latency_ms
+        self.loss = loss
+        self.nxdomain = nxdomain
+        self.block = block
+        self.block_ip = block_ip
+
+    @classmethod
+    def parse(cls, spec: str) -> "ResolverProfile":
+        """解析命令行描述，如 "tw,latency=20,loss=0.005,nxdomain=0.05,block=0.1" """
+        kind, *options = spec.split(",")
+        fields = {"latency": "latency_ms", "loss": "loss", "nxdomain": "nxdomain", "block": "block", "block_ip": "block_ip"}
+        kwargs = {}
+        for option in options:
+            key, sep, value = option.partition("=")
+            if not sep or key.strip() not in fields:
+                raise ValueError(f"無效的解析器選項: {option}（可用: {', '.join(fields)}）")
+            key = key.strip()
+            kwargs[fields[key]] = value.strip() if key == "block_ip" else float(value)
+        return cls(kind.strip(), **kwargs)
+
+    def describe(self) -> str:
+        return (
+            f"{self.kind},latency={self.latency_ms:g},loss={self.loss:g},"
+            f"nxdomain={self.nxdomain:g},block={self.block:g}"
+        )
+
+    def to_dict(self) -> Dict:
+        return {
+            "kind": self.kind, "latency_ms": self.latency_ms, "loss": self.loss,
+            "nxdomain": self.nxdomain, "block": self.block, "block_ip": self.block_ip
+        }
+
+
+class FakeDnsProtocol(asyncio.DatagramProtocol):
+    def __init__(self, profile: ResolverProfile):
+        self.profile = profile
+        self.transport: Optional[asyncio.DatagramTransport] = None
+        self.queries = 0
+        self.dropped = 0
+
+    def connection_made(self, transport):
+        self.transport = transport
+
+    def datagram_received(self, data: bytes, addr):
+        try:
+            query = dns.message.from_wire(data)
+        except Exception:
+            return
+        self.queries += 1
+        profile = self.profile
+        if profile.loss and random.random() < profile.loss:
+            self.dropped += 1
+            return
+        wire = self._answer(query).to_wire()
+        delay = profile.latency_ms * (0.5 + random.random()) / 1000
+        if delay > 0:
+            asyncio.get_running_loop().call_later(delay, self._send, wire, addr)
+        else:
+            self._send(wire, addr)
+
+    def _send(self, wire: bytes, addr):
+        if self.transport is not None and not self.transport.is_closing():
+            self.transport.sendto(wire, addr)
+
+    def _answer(self, query: dns.message.Message) -> dns.message.Message:
+        response = dns.message.make_response(query)
+        response.flags |= dns.flags.RA
+        if not query.question:
+            response.set_rcode(dns.rcode.FORMERR)
+            return response
+        question = query.question[0]
+        name = question.name.to_text()
+        profile = self.profile
+        if hash_fraction("nxdomain", name) < profile.nxdomain:
+            response.set_rcode(dns.rcode.NXDOMAIN)
+            response.authority.append(dns.rrset.from_text("bench.test.", ANSWER_TTL, "IN", "SOA", NEGATIVE_SOA))
+        elif question.rdtype == dns.rdatatype.A:
+            blocked = profile.kind == "tw" and hash_fraction("block", name) < profile.block
+            ip = profile.block_ip if blocked else answer_ip(name)
+            response.answer.append(dns.rrset.from_text(question.name, ANSWER_TTL, "IN", "A", ip))
+        else:
+            # 其他類型返回無記錄（NOERROR + SOA）
+            response.authority.append(dns.rrset.from_text("bench.test.", ANSWER_TTL, "IN", "SOA", NEGATIVE_SOA))
+        return response
+
+
+async def serve(resolvers: Dict[str, ResolverProfile], port: int, ready=None):
+    """在各自的地址上啟動模擬解析器並一直運行；ready 為 multiprocessing.Event 時啟動後置位"""
+    loop = asyncio.get_running_loop()
+    transports: List[asyncio.DatagramTransport] = []
+    for ip, profile in resolvers.items():
+        transport, _ = await loop.create_datagram_endpoint(
+            lambda profile=profile: FakeDnsProtocol(profile), local_addr=(ip, port)
+        )
+        transports.append(transport)
+    if ready is not None:
+        ready.set()
+    try:
+        await asyncio.Event().wait()
+    finally:
+        for transport in transports:
+            transport.close()
+
+
+def run_server(resolvers: Dict[str, Dict], port: int, ready=None):
+    """子進程入口（resolvers 為 {地址: ResolverProfile.to_dict()}）"""
+    profiles = {ip: ResolverProfile(**spec) for ip, spec in resolvers.items()}
+    try:
+        asyncio.run(serve(profiles, port, ready))
+    except KeyboardInterrupt:
+        pass
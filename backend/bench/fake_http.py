@@ -0,0 +1,134 @@
+"""
+離線基準測試用的本地 HTTP 跳轉服務器
+
+- 網域的跳轉鏈長度按網域哈希在 0~max_hops 之間分佈，每 cluster 個連續編號的網域（d000123.bench.test）
+  跳轉到同一落地網域（編號最小者），模擬同一集群共用落地頁（單跳緩存可命中）
+- error_rate 比例的網域最終返回 503（追蹤失敗）
+- 探測端以 LoopbackTransport 將所有請求（含 https://）轉發到本服務器，原網域保留在 Host 頭中
+"""
+import asyncio
+import re
+import zlib
+from typing import Optional, Tuple
+
+import httpx
+
+_INDEXED_HOST = re.compile(r"^d(\d+)\.(.+)$")
+_HOP_PATH = re.compile(r"^/r/(\d+)$")
+_REASONS = {200: "OK", 302: "Found", 404: "Not Found", 503: "Service Unavailable"}
+
+
+def domain_name(index: int, suffix: str = "bench.test") -> str:
+    """第 index 個模擬網域"""
+    return f"d{index:06d}.{suffix}"
+
+
+class RedirectProfile:
+    """跳轉鏈配置：latency_ms 為每次應答的延遲"""
+
+    def __init__(self, latency_ms: float = 5.0, max_hops: int = 3, cluster: int = 20, error_rate: float = 0.02):
+        self.latency_ms = latency_ms
+        self.max_hops = max_hops
+        self.cluster = max(cluster, 1)
+        self.error_rate = error_rate
+
+    def to_dict(self):
+        return {
+            "latency_ms": self.latency_ms, "max_hops": self.max_hops,
+            "cluster": self.cluster, "error_rate": self.error_rate
+        }
+
+    def hops(self, host: str) -> int:
+        return zlib.crc32(host.encode()) % (self.max_hops + 1)
+
+    def failing(self, host: str) -> bool:
+        return zlib.crc32(f"error:{host}".encode()) / 2 ** 32 < self.error_rate
+
+    def landing(self, host: str) -> str:
+        """集群的落地網域"""
+        m = _INDEXED_HOST.match(host)
+        if not m:
+            return host
+        index = int(m.group(1))
+        return domain_name(index - index % self.cluster, m.group(2))
+
+    def route(self, host: str, path: str) -> Tuple[int, str]:
+        """返回 (狀態碼, Location)"""
+        host = host.split(":")[0].lower()
+        hop = _HOP_PATH.match(path)
+        if hop:
+            remaining = int(hop.group(1))
+            if remaining > 0:
+                # 落地網域內的相對跳轉
+                return 302, f"/r/{remaining - 1}"
+            return (503 if self.failing(host) else 200), ""
+        if path != "/":
+            return 404, ""
+        hops = self.hops(host)
+        if hops == 0:
+            return (503 if self.failing(host) else 200), ""
+        return 302, f"https://{self.landing(host)}/r/{hops - 1}"
+
+
+async def _handle(reader: asyncio.StreamReader, writer: asyncio.StreamWriter, profile: RedirectProfile):
+    try:
+        while True:
+            request_line = await reader.readline()
+            if not request_line:
+                break
+            host = ""
+            while True:
+                line = await reader.readline()
+                if line in (b"\r\n", b"\n", b""):
+                    break
+                name, _, value = line.decode("latin-1").partition(":")
+                if name.strip().lower() == "host":
+                    host = value.strip()
+            parts = request_line.decode("latin-1").split()
+            path = parts[1] if len(parts) > 1 else "/"
+            status, location = profile.route(host, path)
+            if profile.latency_ms > 0:
+                await asyncio.sleep(profile.latency_ms / 1000)
+            body = b"" if location else b"ok"
+            head = f"HTTP/1.1 {status} {_REASONS.get(status, '')}\r\nContent-Length: {len(body)}\r\n"
+            if location:
+                head += f"Location: {location}\r\n"
+            writer.write(head.encode() + b"\r\n" + body)
+            await writer.drain()
+    except (ConnectionError, asyncio.IncompleteReadError):
+        pass
+    finally:
+        writer.close()
+
+
+async def serve(profile: RedirectProfile, host: str, port: int, ready=None):
+    """啟動跳轉服務器並一直運行；ready 為 multiprocessing.Event 時啟動後置位"""
+    server = await asyncio.start_server(lambda r, w: _handle(r, w, profile), host, port, backlog=1024)
+    if ready is not None:
+        ready.set()
+    async with server:
+        await server.serve_forever()
+
+
+def run_server(profile: dict, host: str, port: int, ready=None):
+    """子進程入口（profile 為 RedirectProfile.to_dict()）"""
+    try:
+        asyncio.run(serve(RedirectProfile(**profile), host, port, ready))
+    except KeyboardInterrupt:
+        pass
+
+
+class LoopbackTransport(httpx.AsyncBaseTransport):
+    """將所有請求轉發到本地跳轉服務器（保留原 Host 頭），用於替換跳轉追蹤的網絡層"""
+
+    def __init__(self, host: str, port: int, limits: Optional[httpx.Limits] = None):
+        self._host = host
+        self._port = port
+        self._transport = httpx.AsyncHTTPTransport(limits=limits or httpx.Limits())
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        request.url = request.url.copy_with(scheme="http", host=self._host, port=self._port)
+        return await self._transport.handle_async_request(request)
+
+    async def aclose(self):
+        await self._transport.aclose()
@@ -0,0 +1,394 @@
+"""
+離線基準測試：以本地模擬 DNS / HTTP 服務器驅動探測管線，不向真實解析器發送任何查詢
+
+    cd backend
+    python -m bench.run_bench --sizes 1000,10000,100000
+    python -m bench.run_bench --sizes 10000 --save bench.json
+    python -m bench.run_bench --sizes 10000 --compare bench.json   # 吞吐下降或 p99 上升超過容差時退出碼為 1
+
+每個規模分兩個用例，各在獨立的子進程（臨時目錄、SQLite 存儲）中運行，峰值 RSS 互不影響：
+- pipeline：依次測量 probe_domain（含跳轉追蹤）、aggregate_verdict、Store.update 與落盤
+- loop：以應用生命週期（lifespan）啟動完整的後台探測循環，按 --cycle-seconds 縮短探測間隔，
+  記錄每個循環的耗時、完成數、p99 與循環結束時的積壓（積壓 > 0 表示探測跟不上該間隔）
+
+模擬解析器綁定 127.0.0.x 地址（需 Linux 迴環網段），各在一個子進程中運行。
+"""
+import argparse
+import asyncio
+import json
+import logging
+import multiprocessing
+import os
+import resource
+import shutil
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import Dict, List, Optional
+
+from . import fake_dns, fake_http
+from .fake_dns import ResolverProfile
+from .fake_http import RedirectProfile, domain_name
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+
+DEFAULT_RESOLVERS = [
+    "baseline,latency=5,nxdomain=0.03",
+    "baseline,latency=8,nxdomain=0.03",
+    "tw,latency=15,loss=0.002,nxdomain=0.03,block=0.1",
+    "tw,latency=25,loss=0.002,nxdomain=0.03,block=0.1",
+]
+STAGES = ("pipeline", "loop")
+
+
+def percentile(values: List[float], p: float) -> float:
+    """最近秩百分位（values 須已排序）"""
+    if not values:
+        return 0.0
+    rank = max(int(-(-p * len(values) // 100)), 1)
+    return values[rank - 1]
+
+
+def peak_rss_mb() -> float:
+    """本進程峰值 RSS（Linux 上 ru_maxrss 單位為 KB）"""
+    return round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1)
+
+
+def stage_result(stage: str, count: int, seconds: float, latencies_ms: List[float], **extra) -> Dict:
+    latencies_ms.sort()
+    return {
+        "stage": stage,
+        "count": count,
+        "seconds": round(seconds, 3),
+        "domains_per_sec": round(count / seconds, 1) if seconds > 0 else 0.0,
+        "p50_ms": round(percentile(latencies_ms, 50), 3),
+        "p99_ms": round(percentile(latencies_ms, 99), 3),
+        "max_ms": round(latencies_ms[-1], 3) if latencies_ms else 0.0,
+        "peak_rss_mb": peak_rss_mb(),
+        **extra
+    }
+
+
+# ---------- 子進程：被測代碼 ----------
+
+def _setup_app(options: Dict, workdir: str):
+    """在導入 app 前設置環境（存儲、歷史與日誌均寫入臨時目錄），並指向模擬解析器"""
+    os.chdir(workdir)
+    if str(BACKEND_DIR) not in sys.path:
+        sys.path.insert(0, str(BACKEND_DIR))
+    os.environ.update(
+        STORAGE_BACKEND="sqlite",
+        SQLITE_PATH=os.path.join(workdir, "bench.db"),
+        HISTORY_DIR=workdir,
+        DNS_ENGINE=options["dns_engine"],
+        DNS_PORT=str(options["dns_port"]),
+        PROBE_WORKERS="0",
+        DISTRIBUTED_PROBING="0"
+    )
+    from app import config
+    config.BASELINE_RESOLVERS = {
+        ip: f"bench-{ip}" for ip, spec in options["resolvers"].items() if spec["kind"] == "baseline"
+    }
+    config.TW_RESOLVERS = {ip: f"bench-{ip}" for ip, spec in options["resolvers"].items() if spec["kind"] == "tw"}
+    config.MAX_CONCURRENCY = options["concurrency"]
+    return config
+
+
+def _http_transport(options: Dict):
+    from app.redirect_trace import http_limits
+    return fake_http.LoopbackTransport("127.0.0.1", options["http_port"], http_limits())
+
+
+def _seed_domains(size: int) -> List[str]:
+    from app.domains import auto_add_domains
+    domains = [domain_name(i) for i in range(size)]
+    auto_add_domains(domains, note="bench")
+    return domains
+
+
+def _phase_summary(results: List[Dict]) -> Dict[str, Dict[str, float]]:
+    """probe_domain 各階段耗時（timings）的 p50 / p99"""
+    phases: Dict[str, List[float]] = {}
+    for result in results:
+        for name, value in result.get("timings", {}).items():
+            if name.endswith("_ms") and isinstance(value, (int, float)):
+                phases.setdefault(name[:-3], []).append(value)
+    summary = {}
+    for name, values in phases.items():
+        values.sort()
+        summary[name] = {"p50": round(percentile(values, 50), 2), "p99": round(percentile(values, 99), 2)}
+    return summary
+
+
+async def _pipeline_case(size: int, options: Dict) -> List[Dict]:
+    from app import dns_udp
+    from app.dns_probe import probe_domain
+    from app.verdict import aggregate_verdict
+    from app.store import store
+    from app.domains import registry
+    from app.history import history_log
+    from app.domain_groups import group_index
+    from app.redirect_trace import start_http_client, close_http_client
+
+    domains = _seed_domains(size)
+    start_http_client(_http_transport(options))
+    stages = []
+    try:
+        # probe_domain：固定並發的工作池
+        results: List[Optional[Dict]] = [None] * size
+        latencies: List[float] = []
+        pending = iter(enumerate(domains))
+
+        async def worker():
+            for i, domain in pending:
+                started = time.perf_counter()
+                results[i] = await probe_domain(domain)
+                latencies.append((time.perf_counter() - started) * 1000)
+
+        started = time.perf_counter()
+        await asyncio.gather(*[worker() for _ in range(options["concurrency"])])
+        stages.append(stage_result(
+            "probe_domain", size, time.perf_counter() - started, latencies, phases_ms=_phase_summary(results)
+        ))
+    finally:
+        await close_http_client()
+        dns_udp.close_all()
+
+    # aggregate_verdict
+    verdicts = []
+    latencies = []
+    started = time.perf_counter()
+    for result in results:
+        t = time.perf_counter()
+        verdicts.append(aggregate_verdict(result))
+        latencies.append((time.perf_counter() - t) * 1000)
+    statuses: Dict[str, int] = {}
+    for verdict in verdicts:
+        statuses[verdict["status"]] = statuses.get(verdict["status"], 0) + 1
+    stages.append(stage_result("aggregate_verdict", size, time.perf_counter() - started, latencies, statuses=statuses))
+
+    # Store.update 與落盤（與後台寫入任務相同的順序）
+    latencies = []
+    started = time.perf_counter()
+    for domain, verdict in zip(domains, verdicts):
+        t = time.perf_counter()
+        store.update(domain, verdict)
+        latencies.append((time.perf_counter() - t) * 1000)
+    flush_started = time.perf_counter()
+    store.flush_pending()
+    registry.flush()
+    history_log.flush()
+    group_index.flush()
+    flush_sec = time.perf_counter() - flush_started
+    stages.append(stage_result(
+        "store", size, time.perf_counter() - started, latencies, flush_sec=round(flush_sec, 3)
+    ))
+    return stages
+
+
+async def _loop_case(size: int, options: Dict) -> List[Dict]:
+    from app.main import app, lifespan
+    from app.cycle_stats import cycle_recorder
+    from app.redirect_trace import start_http_client
+
+    _seed_domains(size)
+    start_http_client(_http_transport(options))
+    cycles = options["cycles"]
+    deadline = time.monotonic() + cycles * (options["cycle_seconds"] * 2 + 60)
+    async with lifespan(app):
+        while len(cycle_recorder.recent()) < cycles and time.monotonic() < deadline:
+            await asyncio.sleep(0.2)
+        # 關閉時取消進行中的探測，不輸出取消引起的 asyncio 錯誤日誌
+        logging.getLogger("asyncio").setLevel(logging.CRITICAL)
+    stages = []
+    for summary in reversed(cycle_recorder.recent(cycles)):
+        total = summary["phases_ms"].get("total", {})
+        duration = summary["duration_sec"]
+        probes = summary["probes"]
+        stages.append({
+            "stage": f"loop#{summary['cycle']}",
+            "count": probes,
+            "seconds": duration,
+            "domains_per_sec": round(probes / duration, 1) if duration > 0 else 0.0,
+            "p50_ms": total.get("p50", 0.0),
+            "p99_ms": total.get("p99", 0.0),
+            "max_ms": total.get("max", 0.0),
+            "peak_rss_mb": peak_rss_mb(),
+            "overdue": summary.get("overdue", 0),
+            "statuses": summary.get("statuses", {})
+        })
+    return stages
+
+
+def run_case(case: str, size: int, options: Dict) -> List[Dict]:
+    """子進程入口"""
+    workdir = tempfile.mkdtemp(prefix="dnsrpz-bench-")
+    try:
+        config = _setup_app(options, workdir)
+        if case == "loop":
+            config.PROBE_INTERVAL = options["cycle_seconds"]
+            config.ABNORMAL_PROBE_INTERVAL = options["cycle_seconds"]
+            config.SCHEDULER_SYNC_INTERVAL = min(config.SCHEDULER_SYNC_INTERVAL, options["cycle_seconds"])
+            return asyncio.run(_loop_case(size, options))
+        return asyncio.run(_pipeline_case(size, options))
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+# ---------- 主進程：服務器、調度與報告 ----------
+
+def start_servers(ctx, options: Dict, profile: RedirectProfile) -> List[multiprocessing.Process]:
+    processes = []
+    ready = []
+    for ip, spec in options["resolvers"].items():
+        event = ctx.Event()
+        processes.append(ctx.Process(
+            target=fake_dns.run_server, args=({ip: spec}, options["dns_port"], event), daemon=True
+        ))
+        ready.append(event)
+    event = ctx.Event()
+    processes.append(ctx.Process(
+        target=fake_http.run_server, args=(profile.to_dict(), "127.0.0.1", options["http_port"], event), daemon=True
+    ))
+    ready.append(event)
+    for process in processes:
+        process.start()
+    for event, process in zip(ready, processes):
+        if not event.wait(10):
+            stop_servers(processes)
+            raise RuntimeError(f"模擬服務器啟動失敗（進程 {process.pid}，請檢查端口是否被佔用）")
+    return processes
+
+
+def stop_servers(processes: List[multiprocessing.Process]):
+    for process in processes:
+        if process.is_alive():
+            process.terminate()
+    for process in processes:
+        process.join(5)
+
+
+def print_rows(size: int, rows: List[Dict]):
+    for row in rows:
+        extra = ""
+        if "flush_sec" in row:
+            extra = f"  flush={row['flush_sec']}s"
+        if "phases_ms" in row:
+            extra = "  " + ", ".join(f"{k}={v['p50']:.0f}/{v['p99']:.0f}" for k, v in row["phases_ms"].items())
+        if "overdue" in row:
+            extra = f"  overdue={row['overdue']}"
+        print(
+            f"{size:>8}  {row['stage']:<18} {row['count']:>8} {row['seconds']:>9.2f} {row['domains_per_sec']:>10.1f}"
+            f" {row['p50_ms']:>9.2f} {row['p99_ms']:>9.2f} {row['peak_rss_mb']:>9.1f}{extra}",
+            flush=True
+        )
+
+
+def compare(results: Dict[str, List[Dict]], baseline: Dict[str, List[Dict]], tolerance: float) -> List[str]:
+    """與先前保存的結果比較，返回退化項（吞吐下降或 p99 上升超過容差）"""
+    regressions = []
+    for size, rows in results.items():
+        previous = {row["stage"]: row for row in baseline.get(size, [])}
+        for row in rows:
+            old = previous.get(row["stage"])
+            if old is None:
+                continue
+            if old["domains_per_sec"] and row["domains_per_sec"] < old["domains_per_sec"] * (1 - tolerance):
+                regressions.append(
+                    f"{size} {row['stage']}: domains/s {old['domains_per_sec']} -> {row['domains_per_sec']}"
+                )
+            # 亞毫秒級的 p99 波動不計
+            if old["p99_ms"] and row["p99_ms"] > old["p99_ms"] * (1 + tolerance) and row["p99_ms"] - old["p99_ms"] > 1:
+                regressions.append(f"{size} {row['stage']}: p99 {old['p99_ms']}ms -> {row['p99_ms']}ms")
+    return regressions
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="DNS RPZ 探測離線基準測試")
+    parser.add_argument("--sizes", default="1000,10000,100000", help="模擬網域數（逗號分隔）")
+    parser.add_argument("--stages", default=",".join(STAGES), help=f"用例（{', '.join(STAGES)}）")
+    parser.add_argument("--concurrency", type=int, default=50, help="探測並發數（即 MAX_CONCURRENCY）")
+    parser.add_argument("--dns-engine", default="udp", choices=("udp", "dnspython"))
+    parser.add_argument("--dns-port", type=int, default=15353)
+    parser.add_argument(
+        "--resolver", action="append", default=None, metavar="SPEC",
+        help="模擬解析器，可重複，如 tw,latency=20,loss=0.005,nxdomain=0.05,block=0.1（預設 2 個基準 + 2 個台灣）"
+    )
+    parser.add_argument("--http-port", type=int, default=18080)
+    parser.add_argument("--http-latency-ms", type=float, default=5.0)
+    parser.add_argument("--max-hops", type=int, default=3, help="跳轉鏈最大長度")
+    parser.add_argument("--cluster", type=int, default=20, help="共用落地網域的網域數")
+    parser.add_argument("--http-error-rate", type=float, default=0.02)
+    parser.add_argument("--cycles", type=int, default=3, help="loop 用例運行的探測循環數")
+    parser.add_argument("--cycle-seconds", type=float, default=10.0, help="loop 用例的探測間隔（秒）")
+    parser.add_argument("--save", help="將結果保存為 JSON")
+    parser.add_argument("--compare", help="與先前保存的 JSON 結果比較")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="比較時允許的相對退化")
+    return parser.parse_args(argv)
+
+
+def main(argv=None) -> int:
+    args = parse_args(argv)
+    sizes = [int(s) for s in args.sizes.split(",") if s.strip()]
+    stages = [s.strip() for s in args.stages.split(",") if s.strip()]
+    unknown = set(stages) - set(STAGES)
+    if unknown:
+        print(f"未知的用例: {', '.join(sorted(unknown))}", file=sys.stderr)
+        return 2
+    profiles = [ResolverProfile.parse(spec) for spec in (args.resolver or DEFAULT_RESOLVERS)]
+    resolvers = {f"127.0.0.{10 + i}": profile.to_dict() for i, profile in enumerate(profiles)}
+    redirect = RedirectProfile(args.http_latency_ms, args.max_hops, args.cluster, args.http_error_rate)
+    options = {
+        "resolvers": resolvers,
+        "dns_engine": args.dns_engine,
+        "dns_port": args.dns_port,
+        "http_port": args.http_port,
+        "concurrency": args.concurrency,
+        "cycles": args.cycles,
+        "cycle_seconds": args.cycle_seconds
+    }
+
+    print("解析器: " + "; ".join(f"{ip}={p.describe()}" for ip, p in zip(resolvers, profiles)))
+    print(f"跳轉: {redirect.to_dict()}  並發={args.concurrency}  DNS 引擎={args.dns_engine}")
+    print(
+        f"{'size':>8}  {'stage':<18} {'count':>8} {'wall s':>9} {'domains/s':>10}"
+        f" {'p50 ms':>9} {'p99 ms':>9} {'RSS MB':>9}"
+    )
+
+    ctx = multiprocessing.get_context("spawn")
+    servers = start_servers(ctx, options, redirect)
+    results: Dict[str, List[Dict]] = {}
+    try:
+        for size in sizes:
+            rows = []
+            for case in stages:
+                # 每個用例使用新的子進程，峰值 RSS 與全局狀態互不影響
+                with ProcessPoolExecutor(max_workers=1, mp_context=ctx) as executor:
+                    case_rows = executor.submit(run_case, case, size, options).result()
+                print_rows(size, case_rows)
+                rows += case_rows
+            results[str(size)] = rows
+    finally:
+        stop_servers(servers)
+
+    if args.save:
+        with open(args.save, "w", encoding="utf-8") as f:
+            json.dump({"options": options, "redirect": redirect.to_dict(), "results": results}, f, ensure_ascii=False, indent=2)
+        print(f"結果已保存到 {args.save}")
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            baseline = json.load(f)["results"]
+        regressions = compare(results, baseline, args.tolerance)
+        if regressions:
+            print(f"性能退化（容差 {args.tolerance:.0%}）:")
+            for line in regressions:
+                print(f"  {line}")
+            return 1
+        print(f"與 {args.compare} 相比無退化（容差 {args.tolerance:.0%}）")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
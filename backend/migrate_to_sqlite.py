@@ -0,0 +1,38 @@
+#!/usr/bin/env python3
+"""
+JSON → SQLite 一次性遷移腳本
+
+用法：
+    python migrate_to_sqlite.py [目標數據庫路徑]
+
+說明：
+    - 將 domains.json 與 domain_groups.json 導入 SQLite（預設路徑見 config.SQLITE_PATH）
+    - 可重複執行，已存在的網域會被 JSON 中的內容覆蓋
+    - 遷移完成後設置環境變量 STORAGE_BACKEND=sqlite 並重啟服務
+"""
+import sys
+from pathlib import Path
+
+# 將 app 目錄加入路徑
+sys.path.insert(0, str(Path(__file__).parent))
+
+from app import config
+from app.domains import DOMAINS_JSON
+from app.domain_groups import DOMAIN_GROUPS_FILE
+from app.sqlite_store import get_database, migrate_from_json
+
+
+def main():
+    db_path = sys.argv[1] if len(sys.argv) > 1 else config.SQLITE_PATH
+    
+    print(f"正在遷移 {DOMAINS_JSON.name}、{DOMAIN_GROUPS_FILE.name} -> {db_path} ...")
+    domains, groups = migrate_from_json(get_database(db_path), DOMAINS_JSON, DOMAIN_GROUPS_FILE)
+    
+    print(f"\n遷移完成！")
+    print(f"  ✓ 網域: {domains} 個")
+    print(f"  ✓ 網域組成員: {groups} 個")
+    print(f"\n請設置 STORAGE_BACKEND=sqlite 後重啟服務")
+
+
+if __name__ == "__main__":
+    main()
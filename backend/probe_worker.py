@@ -0,0 +1,195 @@
+#!/usr/bin/env python3
+"""
+分佈式探測節點
+
+用法：
+    python probe_worker.py http://協調節點:8000 [--worker-id tw-hinet-1] [--token 令牌]
+                           [--batch 50] [--concurrency 50] [--lease-seconds 120] [--processes 1]
+
+說明：
+    - 協調節點須以 DISTRIBUTED_PROBING=1 啟動，網域列表、調度與存儲都在協調節點
+    - 本節點從 /api/jobs/lease 領取到期網域，使用本機 config 中的解析器執行 probe_domain，
+      並將判定結果批量回傳 /api/jobs/results
+    - 本節點不導入網域列表與 store（不讀取本機 domains.json）：上次追蹤結果與跳轉目標狀態隨租約下發
+    - 節點中斷時已領取的任務在租約過期後由協調節點重新分發
+    - --processes N 在本機啟動 N 個節點進程（節點 ID 加上 -1..N 後綴），可用於本地測試
+"""
+import argparse
+import asyncio
+import logging
+import multiprocessing
+import socket
+import sys
+from pathlib import Path
+from typing import Dict, List, Set
+
+import httpx
+
+# 將 app 目錄加入路徑
+sys.path.insert(0, str(Path(__file__).parent))
+
+from app import config
+from app import dns_udp
+from app.dns_probe import probe_domain, is_dead_result
+from app.redirect_trace import start_http_client, close_http_client, hop_cache
+from app.verdict import aggregate_verdict
+
+logger = logging.getLogger("probe_worker")
+
+# 結果累積到此數量或等待超過 RESULT_FLUSH_INTERVAL 秒即回傳
+RESULT_FLUSH_SIZE = 100
+RESULT_FLUSH_INTERVAL = 1.0
+# 協調節點不可用時的重試間隔（秒）
+RETRY_INTERVAL = 5
+# 無任務時的長輪詢等待（秒）
+LEASE_WAIT = 20
+
+
+class ProbeWorker:
+    """單個探測節點：持續領取任務，保持最多 concurrency 個探測同時進行"""
+
+    def __init__(self, server: str, worker_id: str, token: str, batch: int, concurrency: int, lease_seconds: int):
+        self.worker_id = worker_id
+        self.batch = batch
+        self.concurrency = concurrency
+        self.lease_seconds = lease_seconds
+        headers = {"X-Worker-Token": token} if token else {}
+        self._api = httpx.AsyncClient(base_url=server.rstrip("/"), headers=headers, timeout=LEASE_WAIT + 30)
+        self._inflight: Set[asyncio.Task] = set()
+        self._results: List[Dict] = []
+        self._results_ready = asyncio.Event()
+        self.completed = 0
+
+    async def _lease(self, limit: int, wait: float) -> List[Dict]:
+        resp = await self._api.post("/api/jobs/lease", json={
+            "worker_id": self.worker_id,
+            "limit": limit,
+            "lease_seconds": self.lease_seconds,
+            "wait": wait
+        })
+        resp.raise_for_status()
+        return resp.json()["jobs"]
+
+    async def _probe(self, job: Dict):
+        domain = job["domain"]
+        try:
+            result = await probe_domain(
+                domain, force_trace=job["force_trace"],
+                previous_trace=job.get("previous_trace"), targets=job.get("targets")
+            )
+        except Exception as e:
+            # 不回傳結果，租約過期後由協調節點重新分發
+            logger.error(f"[worker] 探測異常: {domain}, 錯誤={e}", exc_info=True)
+            return
+        self._results.append({
+            "job_id": job["job_id"],
+            "lease_id": job["lease_id"],
+            "verdict": aggregate_verdict(result),
+            "dead": is_dead_result(result)
+        })
+        if len(self._results) >= RESULT_FLUSH_SIZE:
+            self._results_ready.set()
+
+    async def _report_loop(self):
+        """定期批量回傳結果，失敗時保留到下次重試"""
+        while True:
+            try:
+                await asyncio.wait_for(self._results_ready.wait(), RESULT_FLUSH_INTERVAL)
+            except asyncio.TimeoutError:
+                pass
+            self._results_ready.clear()
+            if not self._results:
+                continue
+            results, self._results = self._results, []
+            try:
+                resp = await self._api.post("/api/jobs/results", json={"worker_id": self.worker_id, "results": results})
+                resp.raise_for_status()
+                body = resp.json()
+                self.completed += body["accepted"]
+                if body["dropped"]:
+                    logger.info(f"[worker] {body['dropped']} 個結果已過期（任務已由其他節點完成或網域已刪除）")
+            except Exception as e:
+                logger.warning(f"[worker] 回傳結果失敗，稍後重試: {e}")
+                self._results = results + self._results
+                await asyncio.sleep(RETRY_INTERVAL)
+
+    async def run(self):
+        reporter = asyncio.create_task(self._report_loop())
+        logger.info(f"[worker] 節點 {self.worker_id} 已啟動，批量={self.batch}，並發={self.concurrency}")
+        try:
+            while True:
+                free = self.concurrency - len(self._inflight)
+                if free <= 0:
+                    await asyncio.wait(self._inflight, return_when=asyncio.FIRST_COMPLETED)
+                    continue
+                try:
+                    # 仍有探測進行中時不長輪詢，以便及時補充任務
+                    jobs = await self._lease(min(free, self.batch), 0 if self._inflight else LEASE_WAIT)
+                except Exception as e:
+                    logger.warning(f"[worker] 領取任務失敗，{RETRY_INTERVAL} 秒後重試: {e}")
+                    await asyncio.sleep(RETRY_INTERVAL)
+                    continue
+                # 節點沒有探測循環，按探測間隔清空單跳緩存
+                hop_cache.clear_every(config.PROBE_INTERVAL)
+                for job in jobs:
+                    task = asyncio.create_task(self._probe(job))
+                    self._inflight.add(task)
+                    task.add_done_callback(self._inflight.discard)
+                if not jobs and self._inflight:
+                    await asyncio.wait(self._inflight, timeout=1, return_when=asyncio.FIRST_COMPLETED)
+        finally:
+            reporter.cancel()
+            await self._api.aclose()
+
+
+async def _main(args: argparse.Namespace, worker_id: str):
+    start_http_client()
+    worker = ProbeWorker(args.server, worker_id, args.token, args.batch, args.concurrency, args.lease_seconds)
+    try:
+        await worker.run()
+    finally:
+        await close_http_client()
+        dns_udp.close_all()
+
+
+def _run_process(args: argparse.Namespace, worker_id: str):
+    logging.basicConfig(level=logging.INFO, format=f"%(asctime)s [%(levelname)s] [{worker_id}] %(message)s")
+    # 每次領取/回傳的請求日誌過多
+    logging.getLogger("httpx").setLevel(logging.WARNING)
+    try:
+        asyncio.run(_main(args, worker_id))
+    except KeyboardInterrupt:
+        pass
+
+
+def main():
+    parser = argparse.ArgumentParser(description="分佈式探測節點")
+    parser.add_argument("server", help="協調節點地址，如 http://127.0.0.1:8000")
+    parser.add_argument("--worker-id", default=socket.gethostname(), help="節點 ID（預設為主機名）")
+    parser.add_argument("--token", default=config.WORKER_TOKEN, help="協調節點的 WORKER_TOKEN")
+    parser.add_argument("--batch", type=int, default=50, help="單次領取任務數")
+    parser.add_argument("--concurrency", type=int, default=config.MAX_CONCURRENCY, help="同時進行的探測數")
+    parser.add_argument("--lease-seconds", type=int, default=config.JOB_LEASE_SECONDS, help="租約時長（秒）")
+    parser.add_argument("--processes", type=int, default=1, help="本機啟動的節點進程數")
+    args = parser.parse_args()
+
+    if args.processes <= 1:
+        _run_process(args, args.worker_id)
+        return
+    ctx = multiprocessing.get_context("spawn")
+    processes = [
+        ctx.Process(target=_run_process, args=(args, f"{args.worker_id}-{i}"), name=f"probe-worker-{i}")
+        for i in range(1, args.processes + 1)
+    ]
+    for p in processes:
+        p.start()
+    try:
+        for p in processes:
+            p.join()
+    except KeyboardInterrupt:
+        for p in processes:
+            p.join()
+
+
+if __name__ == "__main__":
+    main()